@@ -1,4 +1,4 @@
-from .core import create_graph, dependencies, define_graph, GraphError, resolver
+from .core import create_graph, current_deadline, deadline, DeadlineExceededError, dependencies, define_graph, GraphError, resolver
 from .representations import Object
 from .resolvers import constant_object_resolver, create_object_builder, root_object_resolver
 from .schema import (
@@ -21,6 +21,9 @@ from .schema import (
 
 __all__ = [
     "create_graph",
+    "current_deadline",
+    "deadline",
+    "DeadlineExceededError",
     "dependencies",
     "define_graph",
     "GraphError",
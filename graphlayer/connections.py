@@ -1,17 +1,123 @@
 import base64
+import datetime
+import decimal
+from functools import reduce
+import time
 
 import graphlayer as g
 from graphlayer.core import Injector
 
 
-def forward_connection(*, connection_type_name, node_type, select_by_cursor, fetch_cursors, cursor_encoding):
+def forward_connection(*, connection_type_name, node_type, cursor_encoding, select_by_cursor=None, fetch_cursors=None, fetch_edges=None, total_count=None):
+    def read_args(args):
+        _check_count_is_non_negative("first", args.first)
+        return _ConnectionArgs(first=args.first, after=args.after, last=None, before=None)
+
+    def fetch_args(*, after_cursor, before_cursor, limit, reverse):
+        return dict(after_cursor=after_cursor, limit=limit)
+
+    return _connection(
+        connection_type_name=connection_type_name,
+        node_type=node_type,
+        cursor_encoding=cursor_encoding,
+        select_by_cursor=select_by_cursor,
+        fetch_cursors=fetch_cursors,
+        fetch_edges=fetch_edges,
+        total_count=total_count,
+        params=(
+            g.param("after", type=g.NullableType(g.String), default=None),
+            g.param("first", type=g.Int),
+        ),
+        read_args=read_args,
+        fetch_args=fetch_args,
+    )
+
+
+def backward_connection(*, connection_type_name, node_type, cursor_encoding, select_by_cursor=None, fetch_cursors=None, fetch_edges=None, total_count=None):
+    def read_args(args):
+        _check_count_is_non_negative("last", args.last)
+        return _ConnectionArgs(first=None, after=None, last=args.last, before=args.before)
+
+    def fetch_args(*, after_cursor, before_cursor, limit, reverse):
+        return dict(before_cursor=before_cursor, limit=limit)
+
+    return _connection(
+        connection_type_name=connection_type_name,
+        node_type=node_type,
+        cursor_encoding=cursor_encoding,
+        select_by_cursor=select_by_cursor,
+        fetch_cursors=fetch_cursors,
+        fetch_edges=fetch_edges,
+        total_count=total_count,
+        params=(
+            g.param("before", type=g.NullableType(g.String), default=None),
+            g.param("last", type=g.Int),
+        ),
+        read_args=read_args,
+        fetch_args=fetch_args,
+    )
+
+
+def bidirectional_connection(*, connection_type_name, node_type, cursor_encoding, select_by_cursor=None, fetch_cursors=None, fetch_edges=None, total_count=None):
+    def read_args(args):
+        if args.first is None and args.last is None:
+            raise g.GraphError("one of first or last must be set")
+        elif args.first is not None and args.last is not None:
+            raise g.GraphError("first and last cannot both be set")
+        elif args.first is not None:
+            _check_count_is_non_negative("first", args.first)
+        else:
+            _check_count_is_non_negative("last", args.last)
+
+        return _ConnectionArgs(first=args.first, after=args.after, last=args.last, before=args.before)
+
+    def fetch_args(*, after_cursor, before_cursor, limit, reverse):
+        return dict(after_cursor=after_cursor, before_cursor=before_cursor, limit=limit, reverse=reverse)
+
+    return _connection(
+        connection_type_name=connection_type_name,
+        node_type=node_type,
+        cursor_encoding=cursor_encoding,
+        select_by_cursor=select_by_cursor,
+        fetch_cursors=fetch_cursors,
+        fetch_edges=fetch_edges,
+        total_count=total_count,
+        params=(
+            g.param("after", type=g.NullableType(g.String), default=None),
+            g.param("before", type=g.NullableType(g.String), default=None),
+            g.param("first", type=g.NullableType(g.Int), default=None),
+            g.param("last", type=g.NullableType(g.Int), default=None),
+        ),
+        read_args=read_args,
+        fetch_args=fetch_args,
+    )
+
+
+def _check_count_is_non_negative(name, value):
+    if value < 0:
+        raise g.GraphError("{} must be non-negative integer, was {}".format(name, value))
+
+
+class _ConnectionArgs(object):
+    def __init__(self, *, first, after, last, before):
+        self.first = first
+        self.after = after
+        self.last = last
+        self.before = before
+
+
+def _connection(*, connection_type_name, node_type, cursor_encoding, select_by_cursor, fetch_cursors, fetch_edges, total_count, params, read_args, fetch_args):
+    def connection_fields():
+        yield g.field("edges", type=g.ListType(Edge))
+        yield g.field("nodes", type=g.ListType(node_type))
+        yield g.field("page_info", type=PageInfo)
+
+        if total_count is not None:
+            yield g.field("total_count", type=total_count.type)
+
     Connection = g.ObjectType(
         connection_type_name,
-        fields=lambda: (
-            g.field("edges", type=g.ListType(Edge)),
-            g.field("nodes", type=g.ListType(node_type)),
-            g.field("page_info", type=PageInfo),
-        ),
+        fields=lambda: tuple(connection_fields()),
     )
 
     Edge = g.ObjectType(
@@ -25,33 +131,92 @@ def forward_connection(*, connection_type_name, node_type, select_by_cursor, fet
     class ConnectionQuery(object):
         @staticmethod
         def select_field(query, *, args):
-            if args.first < 0:
-                raise g.GraphError("first must be non-negative integer, was {}".format(args.first))
-            else:
-                return ConnectionQuery(type_query=query, first=args.first, after=args.after)
+            return ConnectionQuery(type_query=query, args=read_args(args))
 
-        def __init__(self, *, type_query, first, after):
+        def __init__(self, *, type_query, args):
             self.type = ConnectionQuery
             self.type_query = type_query
-            self.first = first
-            self.after = after
+            self.first = args.first
+            self.after = args.after
+            self.last = args.last
+            self.before = args.before
+
+    def decode_cursor(cursor):
+        if cursor is None:
+            return None
+        else:
+            return cursor_encoding.decode(cursor)
 
     @g.dependencies(injector=Injector)
     @g.resolver(ConnectionQuery)
     def resolve_connection(graph, query, *, injector):
         build_connection = g.create_object_builder(query.type_query)
 
-        if query.after is None:
-            after_cursor = None
+        if query.last is None:
+            count = query.first
+            reverse = False
+        else:
+            count = query.last
+            reverse = True
+
+        hook_args = fetch_args(
+            after_cursor=decode_cursor(query.after),
+            before_cursor=decode_cursor(query.before),
+            limit=count + 1,
+            reverse=reverse,
+        )
+
+        count_with_page = (
+            total_count is not None and
+            total_count.count_with_page and
+            any(
+                field_query.field == Connection.fields.total_count
+                for field_query in query.type_query.field_queries
+            )
+        )
+        if count_with_page:
+            hook_args["with_total_count"] = True
+
+        node_queries = _NodeQueries(_find_node_queries(query.type_query, Connection=Connection, Edge=Edge))
+
+        if fetch_edges is None:
+            edge_cursors = injector.call_with_dependencies(fetch_cursors, **hook_args)
+            if count_with_page:
+                edge_cursors, page_total_count = edge_cursors
         else:
-            after_cursor = cursor_encoding.decode(query.after)
+            edges = injector.call_with_dependencies(
+                fetch_edges,
+                graph,
+                node_queries.merged_query,
+                **hook_args,
+            )
+            if count_with_page:
+                edges, page_total_count = edges
+            edge_cursors = [edge_cursor for edge_cursor, _ in edges]
+
+        if not count_with_page:
+            page_total_count = None
 
-        edge_cursors = injector.call_with_dependencies(fetch_cursors, after_cursor=after_cursor, limit=query.first + 1)
-        if len(edge_cursors) > query.first:
+        has_more_edges = len(edge_cursors) > count
+        if has_more_edges:
             edge_cursors = edge_cursors[:-1]
-            has_next_page = True
-        else:
-            has_next_page = False
+
+        if reverse:
+            edge_cursors = edge_cursors[::-1]
+
+        has_next_page = has_more_edges and not reverse
+        has_previous_page = has_more_edges and reverse
+
+        if fetch_edges is not None:
+            merged_nodes = dict(edges)
+        elif node_queries.merged_query is not None:
+            merged_nodes = graph.resolve(select_by_cursor(node_queries.merged_query, edge_cursors))
+
+        def select_nodes(node_query):
+            return dict(
+                (edge_cursor, node_queries.read_node(node_query, merged_nodes[edge_cursor]))
+                for edge_cursor in edge_cursors
+            )
 
         @build_connection.field(Connection.fields.edges)
         def field_edges(field_query):
@@ -63,11 +228,9 @@ def forward_connection(*, connection_type_name, node_type, select_by_cursor, fet
 
             @build_edge.field(Edge.fields.node)
             def field_node(field_query):
-                edges = graph.resolve(
-                    select_by_cursor(field_query.type_query, edge_cursors)
-                )
+                nodes = select_nodes(field_query.type_query)
 
-                return lambda edge_cursor: edges[edge_cursor]
+                return lambda edge_cursor: nodes[edge_cursor]
 
             return lambda _: [
                 build_edge(edge_cursor)
@@ -76,9 +239,7 @@ def forward_connection(*, connection_type_name, node_type, select_by_cursor, fet
 
         @build_connection.field(Connection.fields.nodes)
         def field_nodes(field_query):
-            nodes = graph.resolve(
-                select_by_cursor(field_query.type_query.element_query, edge_cursors)
-            )
+            nodes = select_nodes(field_query.type_query.element_query)
 
             result = [nodes[edge_cursor] for edge_cursor in edge_cursors]
 
@@ -92,6 +253,17 @@ def forward_connection(*, connection_type_name, node_type, select_by_cursor, fet
             def field_has_next_page(_):
                 return has_next_page
 
+            @build_page_info.getter(PageInfo.fields.has_previous_page)
+            def field_has_previous_page(_):
+                return has_previous_page
+
+            @build_page_info.getter(PageInfo.fields.start_cursor)
+            def field_start_cursor(_):
+                if edge_cursors:
+                    return cursor_encoding.encode(edge_cursors[0])
+                else:
+                    return None
+
             @build_page_info.getter(PageInfo.fields.end_cursor)
             def field_end_cursor(_):
                 if edge_cursors:
@@ -101,28 +273,168 @@ def forward_connection(*, connection_type_name, node_type, select_by_cursor, fet
 
             return lambda _: build_page_info(None)
 
+        if total_count is not None:
+            @build_connection.field(Connection.fields.total_count)
+            def field_total_count(field_query):
+                result = total_count.fetch(injector, page_total_count=page_total_count)
+
+                return lambda _: result
+
         return build_connection(None)
 
-    return ForwardConnection(
+    return ConnectionDefinition(
         Connection=Connection,
         Edge=Edge,
         resolver=resolve_connection,
         select_field=ConnectionQuery.select_field,
+        params=params,
     )
 
 
-class ForwardConnection(object):
-    def __init__(self, Connection, Edge, resolver, select_field):
+class exact_total_count(object):
+    type = g.Int
+    count_with_page = False
+
+    def __init__(self, count):
+        self._count = count
+
+    def fetch(self, injector, *, page_total_count):
+        return injector.call_with_dependencies(self._count)
+
+
+class capped_total_count(object):
+    type = g.String
+    count_with_page = False
+
+    def __init__(self, count, *, cap):
+        self._count = count
+        self._cap = cap
+
+    def fetch(self, injector, *, page_total_count):
+        count = injector.call_with_dependencies(self._count, limit=self._cap + 1)
+
+        if count > self._cap:
+            return "{}+".format(self._cap)
+        else:
+            return str(count)
+
+
+class folded_total_count(object):
+    # The fetch hooks are called with with_total_count=True, and return a pair
+    # of the page and the total count, or None if it cannot be computed
+    # alongside the page.
+    type = g.Int
+    count_with_page = True
+
+    def __init__(self, count):
+        self._count = count
+
+    def fetch(self, injector, *, page_total_count):
+        if page_total_count is None:
+            return injector.call_with_dependencies(self._count)
+        else:
+            return page_total_count
+
+
+class cached_total_count(object):
+    def __init__(self, total_count, *, ttl, clock=time.monotonic):
+        self._total_count = total_count
+        self._ttl = ttl
+        self._clock = clock
+        self._cached = None
+
+    @property
+    def type(self):
+        return self._total_count.type
+
+    @property
+    def count_with_page(self):
+        # The page does not need to include the total count when the cached
+        # count can be used instead.
+        cached = self._cached
+        is_fresh = cached is not None and self._clock() < cached[1]
+        return self._total_count.count_with_page and not is_fresh
+
+    def fetch(self, injector, *, page_total_count):
+        now = self._clock()
+        cached = self._cached
+
+        if cached is not None and now < cached[1]:
+            return cached[0]
+        else:
+            value = self._total_count.fetch(injector, page_total_count=page_total_count)
+            self._cached = (value, now + self._ttl)
+            return value
+
+
+def _find_node_queries(connection_query, *, Connection, Edge):
+    node_queries = []
+
+    for field_query in connection_query.field_queries:
+        if field_query.field == Connection.fields.edges:
+            for edge_field_query in field_query.type_query.element_query.field_queries:
+                if edge_field_query.field == Edge.fields.node:
+                    node_queries.append(edge_field_query.type_query)
+
+        elif field_query.field == Connection.fields.nodes:
+            node_queries.append(field_query.type_query.element_query)
+
+    return node_queries
+
+
+class _NodeQueries(object):
+    # Each selection of the node is re-keyed by its index so that selections
+    # with the same key but different arguments can share a single query.
+    def __init__(self, node_queries):
+        self._node_queries = node_queries
+
+        if len(node_queries) == 0:
+            self.merged_query = None
+        elif len(node_queries) == 1:
+            self.merged_query = node_queries[0]
+        else:
+            self.merged_query = reduce(
+                lambda left, right: left + right,
+                (
+                    node_query.type.query(
+                        field_queries=[
+                            g.key((index, field_query.key), field_query)
+                            for field_query in node_query.field_queries
+                        ],
+                        create_object=_values,
+                    )
+                    for index, node_query in enumerate(node_queries)
+                ),
+            )
+
+    def read_node(self, node_query, node):
+        if len(self._node_queries) == 1:
+            return node
+        else:
+            index = self._node_queries.index(node_query)
+            return node_query.create_object(dict(
+                (field_query.key, node[(index, field_query.key)])
+                for field_query in node_query.field_queries
+            ))
+
+
+def _values(values):
+    return values
+
+
+class ConnectionDefinition(object):
+    def __init__(self, Connection, Edge, resolver, select_field, params):
         self.Connection = Connection
         self.Edge = Edge
         self.resolvers = (resolver, )
         self.select_field = select_field
+        self._params = params
 
     def field(self, field_name):
-        return g.field(field_name, type=self.Connection, params=(
-            g.param("after", type=g.NullableType(g.String), default=None),
-            g.param("first", type=g.Int),
-        ))
+        return g.field(field_name, type=self.Connection, params=self._params)
+
+
+ForwardConnection = ConnectionDefinition
 
 
 PageInfo = g.ObjectType(
@@ -130,6 +442,8 @@ PageInfo = g.ObjectType(
     fields=lambda: (
         g.field("end_cursor", type=g.NullableType(g.String)),
         g.field("has_next_page", type=g.Boolean),
+        g.field("has_previous_page", type=g.Boolean),
+        g.field("start_cursor", type=g.NullableType(g.String)),
     ),
 )
 
@@ -143,3 +457,188 @@ class int_cursor_encoding(object):
     def decode(cursor):
         return int(base64.b64decode(cursor.encode("ascii")).decode("ascii"))
 
+
+def tuple_cursor_encoding(*element_types):
+    return _TupleCursorEncoding(tuple(
+        _cursor_element_encoding(element_type)
+        for element_type in element_types
+    ))
+
+
+class _TupleCursorEncoding(object):
+    def __init__(self, element_encodings):
+        self._element_encodings = element_encodings
+
+    def encode(self, cursor):
+        if len(cursor) != len(self._element_encodings):
+            raise ValueError("expected cursor with {} elements but got {!r}".format(len(self._element_encodings), cursor))
+
+        output = bytearray()
+
+        for element_encoding, value in zip(self._element_encodings, cursor):
+            element_encoding.write(output, value)
+
+        return base64.urlsafe_b64encode(bytes(output)).rstrip(b"=").decode("ascii")
+
+    def decode(self, cursor):
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            reader = _BytesReader(data)
+
+            result = tuple(
+                element_encoding.read(reader)
+                for element_encoding in self._element_encodings
+            )
+
+            if not reader.is_at_end():
+                raise ValueError("unexpected trailing data")
+
+            return result
+        except (ArithmeticError, IndexError, ValueError):
+            raise g.GraphError("invalid cursor: {}".format(cursor))
+
+
+def _cursor_element_encoding(element_type):
+    if element_type == int:
+        return _int_cursor_element
+    elif element_type == str:
+        return _str_cursor_element
+    elif element_type == datetime.datetime:
+        return _datetime_cursor_element
+    elif element_type == decimal.Decimal:
+        return _decimal_cursor_element
+    else:
+        raise ValueError("unsupported cursor element type: {}".format(element_type))
+
+
+class _int_cursor_element(object):
+    @staticmethod
+    def write(output, value):
+        _write_varint(output, _zigzag_encode(value))
+
+    @staticmethod
+    def read(reader):
+        return _zigzag_decode(_read_varint(reader))
+
+
+class _str_cursor_element(object):
+    @staticmethod
+    def write(output, value):
+        _write_bytes(output, value.encode("utf-8"))
+
+    @staticmethod
+    def read(reader):
+        return _read_bytes(reader).decode("utf-8")
+
+
+class _decimal_cursor_element(object):
+    @staticmethod
+    def write(output, value):
+        _write_bytes(output, str(value).encode("ascii"))
+
+    @staticmethod
+    def read(reader):
+        return decimal.Decimal(_read_bytes(reader).decode("ascii"))
+
+
+_naive_epoch = datetime.datetime(1970, 1, 1)
+_utc_epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class _datetime_cursor_element(object):
+    @staticmethod
+    def write(output, value):
+        offset = value.utcoffset()
+
+        if offset is None:
+            output.append(0)
+            _int_cursor_element.write(output, _to_microseconds(value - _naive_epoch))
+        else:
+            output.append(1)
+            _int_cursor_element.write(output, _to_microseconds(value - _utc_epoch))
+            _int_cursor_element.write(output, _to_microseconds(offset))
+
+    @staticmethod
+    def read(reader):
+        flag = reader.read_byte()
+        microseconds = datetime.timedelta(microseconds=_int_cursor_element.read(reader))
+
+        if flag == 0:
+            return _naive_epoch + microseconds
+        elif flag == 1:
+            offset = datetime.timedelta(microseconds=_int_cursor_element.read(reader))
+            return (_utc_epoch + microseconds).astimezone(datetime.timezone(offset))
+        else:
+            raise ValueError("invalid datetime flag: {}".format(flag))
+
+
+def _to_microseconds(delta):
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _zigzag_encode(value):
+    if value >= 0:
+        return value << 1
+    else:
+        return ((-value) << 1) - 1
+
+
+def _zigzag_decode(value):
+    if value & 1:
+        return -((value + 1) >> 1)
+    else:
+        return value >> 1
+
+
+def _write_varint(output, value):
+    while value >= 0x80:
+        output.append((value & 0x7f) | 0x80)
+        value >>= 7
+
+    output.append(value)
+
+
+def _read_varint(reader):
+    result = 0
+    shift = 0
+
+    while True:
+        byte = reader.read_byte()
+        result |= (byte & 0x7f) << shift
+        shift += 7
+
+        if byte < 0x80:
+            return result
+
+
+def _write_bytes(output, value):
+    _write_varint(output, len(value))
+    output += value
+
+
+def _read_bytes(reader):
+    return reader.read(_read_varint(reader))
+
+
+class _BytesReader(object):
+    def __init__(self, data):
+        self._data = data
+        self._position = 0
+
+    def read_byte(self):
+        byte = self._data[self._position]
+        self._position += 1
+        return byte
+
+    def read(self, length):
+        end = self._position + length
+
+        if end > len(self._data):
+            raise ValueError("unexpected end of data")
+
+        result = self._data[self._position:end]
+        self._position = end
+        return result
+
+    def is_at_end(self):
+        return self._position == len(self._data)
@@ -1,3 +1,7 @@
+import contextlib
+import contextvars
+import time
+
 from . import iterables
 
 
@@ -26,6 +30,10 @@ class Graph(object):
         self._injector = Injector(dependencies)
 
     def resolve(self, *args, type=None):
+        deadline = _current_deadline.get()
+        if deadline is not None:
+            deadline.check()
+
         if type is None:
             type = args[0].type
         resolver = self._resolvers.get(type)
@@ -81,3 +89,51 @@ def dependencies(**kwargs):
 
 class GraphError(Exception):
     pass
+
+
+class DeadlineExceededError(GraphError):
+    pass
+
+
+class Deadline(object):
+    def __init__(self, expires_at, *, clock):
+        self.expires_at = expires_at
+        self._clock = clock
+
+    def remaining(self):
+        return self.expires_at - self._clock()
+
+    def check(self):
+        if self.remaining() <= 0:
+            raise DeadlineExceededError("deadline exceeded")
+
+
+_current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+
+@contextlib.contextmanager
+def deadline(timeout, *, clock=time.monotonic):
+    current = _current_deadline.get()
+    new = Deadline(clock() + timeout, clock=clock)
+
+    if current is not None and current.remaining() <= new.remaining():
+        new = current
+
+    token = _current_deadline.set(new)
+    try:
+        yield new
+    finally:
+        _current_deadline.reset(token)
+
+
+@contextlib.contextmanager
+def no_deadline():
+    token = _current_deadline.set(None)
+    try:
+        yield
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline():
+    return _current_deadline.get()
@@ -0,0 +1,66 @@
+import threading
+import time
+
+from . import schema
+
+
+class EntityCache(object):
+    def __init__(self, *, ttl, clock=time.monotonic):
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entities = {}
+
+    def get(self, type, id, fields):
+        now = self._clock()
+
+        with self._lock:
+            entity = self._entities.get((type, id))
+            if entity is None:
+                return {}
+
+            values = {}
+            for field in fields:
+                cached = entity.get(field)
+                if cached is not None:
+                    value, expires_at = cached
+                    if expires_at > now:
+                        values[field] = value
+                    else:
+                        del entity[field]
+
+            return values
+
+    def set(self, type, id, values):
+        expires_at = self._clock() + self._ttl
+
+        with self._lock:
+            entity = self._entities.setdefault((type, id), {})
+            for field, value in values.items():
+                entity[field] = (value, expires_at)
+
+    def invalidate(self, type, id):
+        with self._lock:
+            self._entities.pop((type, id), None)
+
+    def invalidate_type(self, type):
+        with self._lock:
+            for key in [key for key in self._entities if key[0] == type]:
+                del self._entities[key]
+
+    def clear(self):
+        with self._lock:
+            self._entities.clear()
+
+
+def is_cacheable(field_query):
+    # Only leaf values are cached: the value of a field that selects objects
+    # depends on the rest of the query, not just the entity.
+    return not tuple(field_query.field.params) and _is_leaf_query(field_query.type_query)
+
+
+def _is_leaf_query(query):
+    if isinstance(query, (schema.ListQuery, schema.NullableQuery)):
+        return _is_leaf_query(query.element_query)
+    else:
+        return isinstance(query, (schema.ScalarQuery, schema.EnumQuery))
@@ -1,23 +1,50 @@
+import contextlib
+import json
+
 from graphql import GraphQLError
 from graphql.execution import execute as graphql_execute, ExecutionResult
 
-from .. import GraphError
-from . import parser
+from .. import deadline, GraphError
+from . import coalescing, parser
 from .schema import create_graphql_schema
 
 
-def execute(document_text, *, graph, query_type, mutation_type=None, types=None, variables=None):
+def execute(document_text, *, graph=None, create_graph=None, query_type, mutation_type=None, types=None, variables=None, timeout=None, limiter=None, cost=None, single_flight=None, single_flight_key=None, record_statements=False):
     return executor(
         query_type=query_type,
         mutation_type=mutation_type,
         types=types,
-    )(document_text, graph=graph, variables=variables)
+        limiter=limiter,
+        cost=cost,
+        single_flight=single_flight,
+        record_statements=record_statements,
+    )(document_text, graph=graph, create_graph=create_graph, variables=variables, timeout=timeout, single_flight_key=single_flight_key)
 
 
-def executor(*, query_type, mutation_type=None, types=None):
+def executor(*, query_type, mutation_type=None, types=None, limiter=None, cost=None, single_flight=None, record_statements=False):
     graphql_schema = create_graphql_schema(query_type=query_type, mutation_type=mutation_type, types=types)
 
-    def execute(document_text, *, graph, variables=None):
+    def execute(document_text, *, graph=None, create_graph=None, variables=None, timeout=None, single_flight_key=None):
+        if (graph is None) == (create_graph is None):
+            raise TypeError("exactly one of graph or create_graph must be set")
+
+        if not record_statements:
+            return execute_document(document_text, graph=graph, create_graph=create_graph, variables=variables, timeout=timeout, single_flight_key=single_flight_key)
+
+        # Imported here so that SQLAlchemy is only required when statements
+        # are recorded.
+        from .. import sqlalchemy as gsql
+
+        with gsql.record_statements() as statements:
+            result = execute_document(document_text, graph=graph, create_graph=create_graph, variables=variables, timeout=timeout, single_flight_key=single_flight_key)
+
+        return ExecutionResult(
+            data=result.data,
+            errors=result.errors,
+            extensions={"statements": [_statement_to_json(statement) for statement in statements]},
+        )
+
+    def execute_document(document_text, *, graph, create_graph, variables, timeout, single_flight_key):
         try:
             query = parser.document_text_to_query(
                 document_text=document_text,
@@ -25,10 +52,23 @@ def executor(*, query_type, mutation_type=None, types=None):
                 graphql_schema=graphql_schema,
             )
 
+            def resolve():
+                with admit(query.graph_query):
+                    if graph is None:
+                        with create_graph(query.operation_type) as operation_graph:
+                            return operation_graph.resolve(query.graph_query)
+                    else:
+                        return graph.resolve(query.graph_query)
+
             if query.graph_query is None:
                 result = {}
             else:
-                result = graph.resolve(query.graph_query)
+                with (contextlib.nullcontext() if timeout is None else deadline(timeout)):
+                    if single_flight is None or query.operation_type != "query":
+                        result = resolve()
+                    else:
+                        key = (coalescing.execution_key(document_text, variables), single_flight_key)
+                        result = single_flight.call(key, resolve)
 
             if query.graphql_schema_document is not None:
                 schema_result = _execute_graphql_schema(
@@ -52,9 +92,30 @@ def executor(*, query_type, mutation_type=None, types=None):
                 errors=[error],
             )
 
+    def admit(graph_query):
+        if limiter is None:
+            return contextlib.nullcontext()
+        elif cost is None:
+            return limiter.acquire()
+        else:
+            return limiter.acquire(cost(graph_query))
+
     return execute
 
 
+def _statement_to_json(statement):
+    # Extensions are sent to clients, so statements are converted to values
+    # that can be serialised as JSON.
+    return {
+        "sql": statement.sql,
+        "parameters": json.loads(json.dumps(statement.parameters, default=str)),
+        "durationMs": statement.duration * 1000,
+        "rowCount": statement.row_count,
+        "type": None if statement.type is None else statement.type.name,
+        "path": list(statement.path),
+    }
+
+
 def _execute_graphql_schema(graphql_schema_document, graphql_schema, variables):
     # TODO: handle errors
     result = graphql_execute(
@@ -0,0 +1,118 @@
+import contextlib
+import math
+import threading
+import time
+
+from .. import GraphError
+
+
+class OverloadedError(GraphError):
+    pass
+
+
+class AdaptiveConcurrencyLimiter(object):
+    # Latency is measured per unit of cost. The limit grows by one for every
+    # limit's worth of requests that complete within the latency tolerance of
+    # the baseline, and shrinks by the backoff ratio when a request is slower,
+    # at most once per limit's worth of requests.
+    def __init__(
+        self,
+        *,
+        initial_limit=10,
+        min_limit=1,
+        max_limit=1000,
+        max_queue_size=0,
+        queue_timeout=0,
+        latency_tolerance=2,
+        backoff_ratio=0.9,
+        baseline_decay=0.01,
+        clock=time.monotonic,
+    ):
+        self._limit = initial_limit
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._max_queue_size = max_queue_size
+        self._queue_timeout = queue_timeout
+        self._latency_tolerance = latency_tolerance
+        self._backoff_ratio = backoff_ratio
+        self._baseline_decay = baseline_decay
+        self._clock = clock
+        self._baseline_latency = None
+        self._samples_since_backoff = math.inf
+        self._in_flight = 0
+        self._queue_size = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        return self._limit
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @contextlib.contextmanager
+    def acquire(self, cost=1):
+        self._admit(cost)
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self._release(cost, self._clock() - start)
+
+    def _admit(self, cost):
+        with self._condition:
+            if self._can_admit(cost):
+                self._in_flight += cost
+                return
+
+            if self._queue_size >= self._max_queue_size:
+                raise OverloadedError("server is overloaded")
+
+            self._queue_size += 1
+            try:
+                admitted = self._condition.wait_for(lambda: self._can_admit(cost), timeout=self._queue_timeout)
+            finally:
+                self._queue_size -= 1
+
+            if not admitted:
+                raise OverloadedError("server is overloaded")
+
+            self._in_flight += cost
+
+    def _can_admit(self, cost):
+        # A request that costs more than the whole limit is still admitted
+        # when nothing else is running, so that it cannot wait forever.
+        return self._in_flight == 0 or self._in_flight + cost <= self._limit
+
+    def _release(self, cost, latency):
+        with self._condition:
+            self._in_flight -= cost
+            self._samples_since_backoff += 1
+            latency /= max(cost, 1)
+
+            if self._baseline_latency is None or latency < self._baseline_latency:
+                self._baseline_latency = latency
+            else:
+                self._baseline_latency += (latency - self._baseline_latency) * self._baseline_decay
+
+            if latency > self._baseline_latency * self._latency_tolerance:
+                if self._samples_since_backoff >= self._limit:
+                    self._limit = max(self._min_limit, self._limit * self._backoff_ratio)
+                    self._samples_since_backoff = 0
+            else:
+                self._limit = min(self._max_limit, self._limit + 1 / self._limit)
+
+            self._condition.notify_all()
+
+
+def query_cost(query):
+    if hasattr(query, "field_queries"):
+        return 1 + sum(
+            query_cost(field_query.type_query)
+            for field_query in query.field_queries
+        )
+    elif hasattr(query, "element_query"):
+        return query_cost(query.element_query)
+    else:
+        return 0
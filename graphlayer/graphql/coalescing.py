@@ -0,0 +1,99 @@
+import asyncio
+import contextvars
+import json
+import threading
+
+from .. import current_deadline, DeadlineExceededError
+from ..core import no_deadline
+
+
+class SingleFlight(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+
+    def call(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        deadline = current_deadline()
+
+        if is_leader and deadline is None:
+            self._run(key, call, func)
+        elif is_leader:
+            # The execution is shared, so it runs in its own thread outside
+            # of the leader's deadline, and the leader waits like any other
+            # caller.
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(self._run, key, call, func), daemon=True).start()
+
+        # Each caller stops waiting at its own deadline, while the execution
+        # continues for the other callers.
+        if not call.done.wait(timeout=None if deadline is None else max(deadline.remaining(), 0)):
+            raise DeadlineExceededError("deadline exceeded")
+
+        if call.error is None:
+            return call.result
+        else:
+            raise call.error
+
+    def _run(self, key, call, func):
+        try:
+            with no_deadline():
+                call.result = func()
+        except BaseException as error:
+            call.error = error
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def call_async(self, key, func):
+        # Tasks are bound to the event loop that created them, so executions
+        # are only shared within a loop.
+        task_key = (asyncio.get_running_loop(), key)
+
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = self._tasks[task_key] = asyncio.ensure_future(_call_without_deadline(func))
+                task.add_done_callback(lambda task: self._forget_task(task_key))
+
+        # A caller being cancelled or reaching its deadline must not cancel
+        # the execution shared with the other callers.
+        deadline = current_deadline()
+        if deadline is None:
+            return await asyncio.shield(task)
+
+        done, _ = await asyncio.wait((task, ), timeout=max(deadline.remaining(), 0))
+        if not done:
+            raise DeadlineExceededError("deadline exceeded")
+
+        return task.result()
+
+    def _forget_task(self, task_key):
+        with self._lock:
+            del self._tasks[task_key]
+
+
+async def _call_without_deadline(func):
+    with no_deadline():
+        return await func()
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+def execution_key(document_text, variables):
+    return (document_text, json.dumps(variables, sort_keys=True, default=str))
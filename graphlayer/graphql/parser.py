@@ -16,10 +16,11 @@ from .naming import snake_case_to_camel_case
 
 
 class GraphQLQuery(object):
-    def __init__(self, graph_query, graphql_schema_document, variables):
+    def __init__(self, graph_query, graphql_schema_document, variables, operation_type):
         self.graph_query = graph_query
         self.graphql_schema_document = graphql_schema_document
         self.variables = variables
+        self.operation_type = operation_type
 
 
 def document_text_to_query(document_text, graphql_schema, variables=None):
@@ -108,6 +109,7 @@ def document_text_to_query(document_text, graphql_schema, variables=None):
         graph_query,
         graphql_schema_document=schema_document,
         variables=variable_values,
+        operation_type=operation.operation.value,
     )
 
 
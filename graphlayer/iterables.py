@@ -3,6 +3,19 @@ import collections
 _undefined = object()
 
 
+def chunks(iterable, size):
+    chunk = []
+
+    for element in iterable:
+        chunk.append(element)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
 def find(predicate, iterable, default=_undefined):
     for element in iterable:
         if predicate(element):
@@ -1,7 +1,8 @@
-from . import core, iterables, schema
+from . import core, entities, iterables, schema
+from .memo import memoize
 
 
-def create_object_builder(object_query):
+def create_object_builder(object_query, *, entity_cache=None, entity_id=None):
     def default_field_resolver(field):
         def resolve(value):
             raise core.GraphError("Resolver missing for field {}".format(field.name))
@@ -14,21 +15,62 @@ def create_object_builder(object_query):
     ]
 
     def create_object(value):
-        return object_query.create_object(iterables.to_dict(
-            (key, resolve_field(value))
-            for key, resolve_field in field_resolvers
-        ))
+        if entity_cache is None:
+            return object_query.create_object(iterables.to_dict(
+                (key, resolve_field(value))
+                for key, resolve_field in field_resolvers
+            ))
+        else:
+            return create_cached_object(value)
+
+    cacheable_fields = [
+        field_query.field if entities.is_cacheable(field_query) else None
+        for field_query in object_query.field_queries
+    ]
+
+    def create_cached_object(value):
+        id = entity_id(value)
+        cached_values = entity_cache.get(object_query.type, id, filter(None, cacheable_fields))
+        resolved_values = {}
+        object_values = {}
+
+        for field, (key, resolve_field) in zip(cacheable_fields, field_resolvers):
+            if field in cached_values:
+                object_values[key] = cached_values[field]
+            else:
+                object_values[key] = resolve_field(value)
+                if field is not None:
+                    resolved_values[field] = object_values[key]
+
+        if resolved_values:
+            entity_cache.set(object_query.type, id, resolved_values)
+
+        return object_query.create_object(object_values)
 
     def field_resolver(field):
         def add_field_resolver(build_field_resolver):
             for field_index, field_query in enumerate(object_query.field_queries):
                 if field_query.field == field or field_query.field.name == field:
-                    field_resolvers[field_index][1] = build_field_resolver(field_query)
+                    if entity_cache is None or cacheable_fields[field_index] is None:
+                        field_resolvers[field_index][1] = build_field_resolver(field_query)
+                    else:
+                        field_resolvers[field_index][1] = deferred_field_resolver(build_field_resolver, field_query)
 
             return build_field_resolver
 
         return add_field_resolver
 
+    def deferred_field_resolver(build_field_resolver, field_query):
+        # Building a field resolver may fetch the values of the field, so
+        # cacheable fields are only built once a value is missing from the
+        # cache.
+        get_field_resolver = memoize(lambda: build_field_resolver(field_query))
+
+        def resolve(value):
+            return get_field_resolver()(value)
+
+        return resolve
+
     create_object.field = field_resolver
 
     def getter(field):
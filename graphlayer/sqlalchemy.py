@@ -1,9 +1,22 @@
+import asyncio
 import collections.abc
-
+import contextlib
+import contextvars
+import inspect
+import itertools
+import json
+import math
+import operator
+import threading
+import time
+
+import sqlalchemy.dialects.postgresql
+import sqlalchemy.dialects.sqlite
+import sqlalchemy.ext.asyncio
 import sqlalchemy.orm
 
 import graphlayer as g
-from . import connections, iterables, schema
+from . import connections, entities, iterables, schema
 from .core import Injector
 from .memo import memoize
 
@@ -19,7 +32,7 @@ class _ConstantField(object):
     def expressions(self):
         return ()
 
-    def create_reader(self, base_query, field_query, injector):
+    def create_reader(self, base_query, field_query, injector, columns):
         def read(row):
             return self._value
 
@@ -37,11 +50,9 @@ class _ExpressionField(object):
     def expressions(self):
         return (self._expression, )
 
-    def create_reader(self, base_query, field_query, injector):
-        def read(row):
-            return row[0]
-
-        return read
+    def create_reader(self, base_query, field_query, injector, columns):
+        column, = columns
+        return operator.itemgetter(column)
 
     def map_value(self, func):
         return _DecoratedReadField(self, func)
@@ -59,9 +70,12 @@ class _CompositeExpressionField(object):
     def expressions(self):
         return self._expressions
 
-    def create_reader(self, base_query, field_query, injector):
+    def create_reader(self, base_query, field_query, injector, columns):
+        get_values = _columns_getter(columns)
+        func = self._func
+
         def read(row):
-            return self._func(*row)
+            return func(*get_values(row))
 
         return read
 
@@ -71,16 +85,20 @@ def join(*, key, resolve, association=None):
 
 
 class _Association(object):
-    def __init__(self, table, left_key, right_key, distinct, filtered_by_left_key, order_by):
+    def __init__(self, table, left_key, right_key, distinct, filtered_by_left_key, order_by, fused):
         self.table = table
         self.left_key = left_key
         self.right_key = right_key
         self.distinct = distinct
         self.filtered_by_left_key = filtered_by_left_key
         self.order_by = order_by
+        self.fused = fused
+
 
+def association(table, *, left_key, right_key, distinct=False, filtered_by_left_key=False, order_by=None, fused=False):
+    if fused and isinstance(table, (sqlalchemy.orm.Query, sqlalchemy.sql.Select)):
+        raise ValueError("fused associations must use a table")
 
-def association(table, *, left_key, right_key, distinct=False, filtered_by_left_key=False, order_by=None):
     return _Association(
         table=table,
         left_key=_to_key(left_key),
@@ -88,11 +106,143 @@ def association(table, *, left_key, right_key, distinct=False, filtered_by_left_
         distinct=distinct,
         filtered_by_left_key=filtered_by_left_key,
         order_by=order_by,
+        fused=fused,
+    )
+
+
+class _AssociationKeys(object):
+    def __init__(self, association, left_keys):
+        self._association = association
+        self._left_keys = left_keys
+
+    def select(self, query, right_key):
+        association = self._association
+
+        onclause = sqlalchemy.and_(*(
+            association_expression == right_expression
+            for association_expression, right_expression in zip(association.right_key.expressions(), right_key.expressions())
+        ))
+
+        query = query \
+            .join(association.table, onclause) \
+            .index_by(association.left_key)
+
+        if not association.filtered_by_left_key:
+            query = query.where(association.left_key.expression().in_(self._left_keys))
+
+        if association.order_by is not None:
+            query = query.order_by(association.order_by, *(query.order or ()))
+
+        if association.distinct:
+            query = query.distinct()
+
+        return query
+
+
+def relationship(attribute):
+    get_join = memoize(lambda: _relationship_join(attribute.property))
+
+    return lambda graph, field_query: get_join()(graph, field_query)
+
+
+def _relationship_join(prop):
+    sqlalchemy.orm.configure_mappers()
+
+    if not _is_column_equalities(prop.primaryjoin) or (prop.secondary is not None and not _is_column_equalities(prop.secondaryjoin)):
+        raise ValueError("relationship joins must be equalities between columns: {}".format(prop))
+
+    if prop.secondary is None:
+        local_columns, remote_columns = zip(*prop.local_remote_pairs)
+        join_association = None
+        # Key lookups on an index are cheap, so pass the keys that have
+        # already been read rather than re-running the parent query.
+        materialize_keys = _has_index(remote_columns)
+    else:
+        local_columns, left_columns = zip(*prop.synchronize_pairs)
+        remote_columns, right_columns = zip(*prop.secondary_synchronize_pairs)
+        join_association = association(
+            prop.secondary,
+            left_key=_columns_key(left_columns),
+            right_key=_columns_key(right_columns),
+            fused=isinstance(prop.secondary, sqlalchemy.Table),
+        )
+        materialize_keys = False
+
+    order_by = prop.order_by or ()
+
+    def create_join(graph, field_query):
+        def resolve(keys):
+            if materialize_keys and isinstance(keys, _JoinKeys):
+                keys = keys.values()
+
+            query = select(field_query.type_query)
+            if order_by:
+                query = query.order_by(*order_by)
+
+            return graph.resolve(query.by(_columns_key(remote_columns), keys))
+
+        return join(key=_columns_key(local_columns), association=join_association, resolve=resolve)
+
+    return create_join
+
+
+def _is_column_equalities(clause):
+    if isinstance(clause, sqlalchemy.sql.elements.BooleanClauseList) and clause.operator is sqlalchemy.sql.operators.and_:
+        return all(_is_column_equalities(element) for element in clause.clauses)
+    else:
+        return (
+            isinstance(clause, sqlalchemy.sql.elements.BinaryExpression) and
+            clause.operator is sqlalchemy.sql.operators.eq and
+            isinstance(clause.left, sqlalchemy.Column) and
+            isinstance(clause.right, sqlalchemy.Column)
+        )
+
+
+def _has_index(columns):
+    table = columns[0].table
+    indexed_columns = [tuple(table.primary_key.columns)] + [
+        tuple(index.columns)
+        for index in table.indexes
+    ] + [
+        tuple(constraint.columns)
+        for constraint in table.constraints
+        if isinstance(constraint, sqlalchemy.UniqueConstraint)
+    ]
+
+    return any(
+        set(index_columns[:len(columns)]) == set(columns)
+        for index_columns in indexed_columns
     )
 
 
+def _columns_key(columns):
+    if len(columns) == 1:
+        return columns[0]
+    else:
+        return columns
+
+
+def _with_relationship_fields(type, model, fields):
+    get_fields = memoize(fields)
+
+    def get():
+        relationship_fields = {}
+
+        for prop in sqlalchemy.inspect(model).relationships:
+            field = iterables.find(lambda field: field.name == prop.key, type.fields, default=None)
+            if field is not None:
+                relationship_fields[field] = relationship(getattr(model, prop.key))
+
+        relationship_fields.update(get_fields())
+        return relationship_fields
+
+    return get
+
+
 def _to_key(key):
-    if isinstance(key, collections.abc.Iterable):
+    if isinstance(key, (_SingleExpressionKey, _MultipleExpressionKey)):
+        return key
+    elif isinstance(key, collections.abc.Iterable):
         return _MultipleExpressionKey(key)
     else:
         return _SingleExpressionKey(key)
@@ -111,6 +261,10 @@ class _SingleExpressionKey(object):
     def read(self, row):
         return row[0]
 
+    def reader(self, columns):
+        column, = columns
+        return operator.itemgetter(column)
+
 
 class _MultipleExpressionKey(object):
     def __init__(self, expressions):
@@ -124,6 +278,23 @@ class _MultipleExpressionKey(object):
 
     read = tuple
 
+    def reader(self, columns):
+        return _columns_getter(columns)
+
+
+def _columns_getter(columns):
+    if len(columns) == 1:
+        column, = columns
+
+        def get_values(row):
+            return (row[column], )
+
+        return get_values
+    elif len(columns) == 0:
+        return lambda row: ()
+    else:
+        return operator.itemgetter(*columns)
+
 
 class _JoinField(object):
     def __init__(self, key, resolve, association):
@@ -134,57 +305,215 @@ class _JoinField(object):
     def expressions(self):
         return self._key.expressions()
 
-    def create_reader(self, base_query, field_query, injector):
-        key_sql_query = base_query.add_columns(*self._key.expressions())
+    def create_reader_for_rows(self, rows, field_query, injector, columns, base_query):
+        read_key = self._key.reader(columns)
 
-        if self._association is None:
-            result = injector.call_with_dependencies(self._resolve, key_sql_query)
+        if base_query is None:
+            keys = list(dict.fromkeys(read_key(row) for row in rows))
         else:
-            if callable(self._association):
-                association = injector.call_with_dependencies(self._association, key_sql_query)
-            else:
-                association = self._association
+            keys = _JoinKeys(base_query.add_columns(*self._key.expressions()), rows, read_key)
 
-            session = injector.get(sqlalchemy.orm.Session)
+        return self._create_reader(keys, field_query, injector, columns)
 
-            if isinstance(association.table, sqlalchemy.orm.Query):
-                base_association_query = association.table
-            else:
-                base_association_query = sqlalchemy.orm.Query([]) \
-                    .select_from(association.table)
+    def nested(self, *, field_query, injector, dialect, model):
+        if self._association is not None:
+            raise g.GraphError("nested queries do not support joins through associations")
 
-            if not association.filtered_by_left_key:
-                base_association_query = base_association_query.filter(association.left_key.expression().in_(key_sql_query))
+        result = injector.call_with_dependencies(self._resolve, _CorrelatedKeys(self._key, model=model))
 
-            association_query = base_association_query \
-                .add_columns(*association.left_key.expressions()) \
-                .add_columns(*association.right_key.expressions())
+        if not isinstance(result, _NestedResult):
+            raise g.GraphError("nested joins must resolve a select(...).by(...) query using the join keys")
 
-            if association.order_by is not None:
-                association_query = association_query.order_by(association.order_by)
+        return _NestedJoinField(result)
 
-            if association.distinct:
-                association_query = association_query.distinct()
+    def _create_reader(self, keys, field_query, injector, columns):
+        with _statement_origin(key=field_query.key):
+            result = self._resolve_result(keys, field_query, injector)
 
-            associations = [
-                (
-                    association.left_key.read(row[:len(association.left_key.expressions())]),
-                    association.right_key.read(row[len(association.left_key.expressions()):]),
-                )
-                for row in association_query.with_session(session).all()
-            ]
+        return self._result_reader(result, columns)
 
-            right_result = injector.call_with_dependencies(self._resolve, base_association_query.add_columns(*association.right_key.expressions()))
+    async def create_reader_async(self, base_query, field_query, injector, columns, concurrent_reads):
+        with _statement_origin(key=field_query.key):
+            result = await self._resolve_result_async(base_query, field_query, injector, concurrent_reads=concurrent_reads)
 
-            result = _result_reader(field_query.type_query).join_associations(associations, right_result)
+        return self._result_reader(result, columns)
 
-        read_key = self._key.read
+    def _result_reader(self, result, columns):
+        read_key = self._key.reader(columns)
 
         def read(row):
             return result[read_key(row)]
 
         return read
 
+    def _resolve_result(self, keys, field_query, injector):
+        if self._association is None:
+            return injector.call_with_dependencies(self._resolve, keys)
+
+        association = self._get_association(keys, injector)
+
+        if association.fused:
+            return injector.call_with_dependencies(self._resolve, _AssociationKeys(association, keys))
+        else:
+            association_query, right_query = self._association_queries(association, keys)
+            rows = _fetch_all(association_query, injector.get(sqlalchemy.orm.Session))
+            right_result = injector.call_with_dependencies(self._resolve, right_query)
+            return self._join_associations(field_query, association, rows, right_result)
+
+    async def _resolve_result_async(self, base_query, field_query, injector, *, concurrent_reads):
+        key_sql_query = base_query.add_columns(*self._key.expressions())
+
+        if self._association is None:
+            return await _maybe_await(injector.call_with_dependencies(self._resolve, key_sql_query))
+
+        association = self._get_association(key_sql_query, injector)
+
+        if association.fused:
+            return await _maybe_await(injector.call_with_dependencies(self._resolve, _AssociationKeys(association, key_sql_query)))
+        else:
+            association_query, right_query = self._association_queries(association, key_sql_query)
+            rows, right_result = await asyncio.gather(
+                _fetch_all_async(association_query, injector.get(sqlalchemy.ext.asyncio.AsyncSession), concurrent_reads=concurrent_reads),
+                _maybe_await(injector.call_with_dependencies(self._resolve, right_query)),
+            )
+            return self._join_associations(field_query, association, rows, right_result)
+
+    def _get_association(self, keys, injector):
+        if callable(self._association):
+            return injector.call_with_dependencies(self._association, keys)
+        else:
+            return self._association
+
+    def _association_queries(self, association, keys):
+        if isinstance(association.table, sqlalchemy.orm.Query):
+            base_association_query = association.table.statement
+        elif isinstance(association.table, sqlalchemy.sql.Select):
+            base_association_query = association.table
+        else:
+            base_association_query = sqlalchemy.select() \
+                .select_from(association.table)
+
+        if not association.filtered_by_left_key:
+            base_association_query = base_association_query.where(association.left_key.expression().in_(keys))
+
+        association_query = base_association_query \
+            .add_columns(*association.left_key.expressions()) \
+            .add_columns(*association.right_key.expressions())
+
+        if association.order_by is not None:
+            association_query = association_query.order_by(association.order_by)
+
+        if association.distinct:
+            association_query = association_query.distinct()
+
+        right_query = base_association_query.add_columns(*association.right_key.expressions())
+
+        return association_query, right_query
+
+    def _join_associations(self, field_query, association, rows, right_result):
+        left_key_length = len(association.left_key.expressions())
+        right_key_length = len(association.right_key.expressions())
+        read_left_key = association.left_key.reader(range(0, left_key_length))
+        read_right_key = association.right_key.reader(range(left_key_length, left_key_length + right_key_length))
+
+        associations = [
+            (read_left_key(row), read_right_key(row))
+            for row in rows
+        ]
+
+        return _result_reader(field_query.type_query).join_associations(associations, right_result)
+
+
+def _clause_element(expression):
+    if hasattr(expression, "__clause_element__"):
+        return expression.__clause_element__()
+    else:
+        return expression
+
+
+def _nested_field(field, *, field_query, injector, dialect, model):
+    nested = getattr(field, "nested", None)
+
+    if nested is None:
+        return field
+    else:
+        return nested(field_query=field_query, injector=injector, dialect=dialect, model=model)
+
+
+class _CorrelatedKeys(object):
+    def __init__(self, key, *, model):
+        self._key = key
+        self.model = model
+
+    def where_clauses(self, index_key):
+        return [
+            index_expression == key_expression
+            for index_expression, key_expression in zip(index_key.expressions(), self._key.expressions())
+        ]
+
+
+class _NestedResult(object):
+    def __init__(self, expression, read):
+        self.expression = expression
+        self.read = read
+
+
+class _NestedJoinField(object):
+    def __init__(self, result):
+        self._result = result
+
+    def expressions(self):
+        return (self._result.expression, )
+
+    def create_reader(self, base_query, field_query, injector, columns):
+        column, = columns
+        read = self._result.read
+
+        def read_row(row):
+            return read(row[column])
+
+        return read_row
+
+
+class _JsonFunctions(object):
+    def __init__(self, array_agg, array, nested):
+        self.array_agg = array_agg
+        self.array = array
+        self.nested = nested
+
+
+def _json_functions(dialect):
+    if dialect.name == "sqlite":
+        return _JsonFunctions(
+            array_agg=sqlalchemy.func.json_group_array,
+            array=sqlalchemy.func.json_array,
+            nested=sqlalchemy.func.json,
+        )
+    else:
+        raise g.GraphError("nested queries are not supported by dialect: {}".format(dialect.name))
+
+
+class _JoinKeys(object):
+    # Selects the keys of a join in SQL, while keeping the rows the keys were
+    # read from so that the values can be used without another statement.
+    def __init__(self, sql_query, rows, read_key):
+        self._sql_query = sql_query
+        self._rows = rows
+        self._read_key = read_key
+
+    def __clause_element__(self):
+        return self._sql_query
+
+    def values(self):
+        return list(dict.fromkeys(self._read_key(row) for row in self._rows))
+
+
+async def _maybe_await(value):
+    if inspect.isawaitable(value):
+        return await value
+    else:
+        return value
+
 
 class _DecoratedReadField(object):
     def __init__(self, field, func):
@@ -195,10 +524,11 @@ class _DecoratedReadField(object):
         return self._field.expressions()
 
     def create_reader(self, *args, **kwargs):
-        read_many = self._field.create_reader(*args, **kwargs)
+        read_value = self._field.create_reader(*args, **kwargs)
+        func = self._func
 
-        def read(*args, **kwargs):
-            return self._func(read_many(*args, **kwargs))
+        def read(row):
+            return func(read_value(row))
 
         return read
 
@@ -297,8 +627,10 @@ def _read_results(query, results):
     return _result_reader(query).read_results(results)
 
 
-def select(query, tag=None):
-    if isinstance(query, _SqlQuery):
+def select(query, tag=None, *, args=None):
+    if isinstance(query, schema.FieldQuery):
+        return select(query.type_query, tag=tag, args=query.args)
+    elif isinstance(query, _SqlQuery):
         return query
     else:
         result_reader = _result_reader(query)
@@ -318,9 +650,88 @@ def select(query, tag=None):
             order=None,
             limit=None,
             group_by=None,
+            args=args,
         )
 
 
+def mutate(statement, query, tag=None):
+    return select(query, tag=tag)._copy(write_statement=statement)
+
+
+def filters(filters):
+    return _Filters(filters)
+
+
+class _Filters(object):
+    def __init__(self, filters):
+        self._filters = filters
+
+    def apply(self, query, value):
+        for input_field, create_where in self._filters.items():
+            field_value = getattr(value, input_field.name)
+            if field_value is not None:
+                query = query.where(create_where(field_value))
+
+        return query
+
+
+def eq(expression):
+    return lambda value: expression == value
+
+
+def in_(expression):
+    return lambda value: expression.in_(value)
+
+
+def prefix(expression):
+    return lambda value: expression.startswith(value, autoescape=True)
+
+
+_bound_operators = (
+    ("gt", operator.gt),
+    ("gte", operator.ge),
+    ("lt", operator.lt),
+    ("lte", operator.le),
+)
+
+
+def between(expression):
+    def where(value):
+        return sqlalchemy.and_(sqlalchemy.true(), *(
+            compare(expression, getattr(value, name))
+            for name, compare in _bound_operators
+            if getattr(value, name, None) is not None
+        ))
+
+    return where
+
+
+def orderings(orderings):
+    return _Orderings(orderings)
+
+
+class _Orderings(object):
+    def __init__(self, orderings):
+        self._orderings = orderings
+
+    def apply(self, query, value):
+        if not isinstance(value, (list, tuple)):
+            value = (value, )
+
+        return query.order_by(*(
+            expression
+            for element in value
+            for expression in self._expressions(element)
+        ))
+
+    def _expressions(self, value):
+        ordering = self._orderings[value]
+        if isinstance(ordering, tuple):
+            return ordering
+        else:
+            return (ordering, )
+
+
 class _SqlQueryTypeKey(object):
     def __repr__(self):
         return __name__ + "." + select.__name__
@@ -334,7 +745,7 @@ def _sql_query_type(t):
 
 
 class _SqlQuery(object):
-    def __init__(self, type, element_query, type_query, where_clauses, index_key, order, limit, group_by):
+    def __init__(self, type, element_query, type_query, where_clauses, index_key, order, limit, group_by, batch_size=None, joins=(), distinct=False, by=None, nested=False, write_statement=None, args=None):
         self.type = type
         self.element_query = element_query
         self.type_query = type_query
@@ -343,204 +754,1433 @@ class _SqlQuery(object):
         self.order = order
         self.limit_ = limit
         self.group_by_ = group_by
+        self.batch_size = batch_size
+        self.joins = joins
+        self.distinct_ = distinct
+        self.by_ = by
+        self.nested_ = nested
+        self.write_statement = write_statement
+        self.args = args
 
     def by(self, index_key, index_values):
-        return self.index_by(index_key).where(_to_key(index_key).expression().in_(index_values))
+        index_key = _to_key(index_key)
+
+        if isinstance(index_values, _AssociationKeys):
+            return index_values.select(self, index_key)
+        elif self.by_ is None:
+            return self._copy(index_key=index_key, by=(index_key, index_values))
+        else:
+            return self.index_by(index_key).where(index_key.expression().in_(index_values))
+
+    def distinct(self):
+        return self._copy(distinct=True)
 
     def group_by(self, *group_by):
-        return _SqlQuery(
-            type=self.type,
-            element_query=self.element_query,
-            type_query=self.type_query,
-            where_clauses=self.where_clauses,
-            index_key=self.index_key,
-            order=self.order,
-            limit=self.limit_,
-            group_by=group_by,
-        )
+        return self._copy(group_by=group_by)
 
     def index_by(self, index_key):
-        return _SqlQuery(
-            type=self.type,
-            element_query=self.element_query,
-            type_query=self.type_query,
-            where_clauses=self.where_clauses,
-            index_key=_to_key(index_key),
-            order=self.order,
-            limit=self.limit_,
-            group_by=self.group_by_,
-        )
+        return self._copy(index_key=_to_key(index_key))
+
+    def join(self, target, onclause):
+        return self._copy(joins=self.joins + ((target, onclause), ))
 
     def limit(self, limit):
-        return _SqlQuery(
-            type=self.type,
-            element_query=self.element_query,
-            type_query=self.type_query,
-            where_clauses=self.where_clauses,
-            index_key=self.index_key,
-            order=self.order,
-            limit=limit,
-            group_by=self.group_by_,
-        )
+        return self._copy(limit=limit)
+
+    def nested(self):
+        return self._copy(nested=True)
 
     def order_by(self, *order):
-        return _SqlQuery(
-            type=self.type,
-            element_query=self.element_query,
-            type_query=self.type_query,
-            where_clauses=self.where_clauses,
-            index_key=self.index_key,
-            order=order,
-            limit=self.limit_,
-            group_by=self.group_by_,
-        )
+        return self._copy(order=order)
+
+    def stream(self, batch_size):
+        return self._copy(batch_size=batch_size)
 
     def where(self, where):
-        return _SqlQuery(
+        return self._copy(where_clauses=self.where_clauses + (where, ))
+
+    def with_args(self, args, params):
+        query = self
+
+        for param, pushdown in params.items():
+            value = getattr(args, param.name)
+            if value is not None:
+                query = pushdown.apply(query, value)
+
+        return query
+
+    def _copy(self, **kwargs):
+        attributes = dict(
             type=self.type,
             element_query=self.element_query,
             type_query=self.type_query,
-            where_clauses=self.where_clauses + (where, ),
+            where_clauses=self.where_clauses,
             index_key=self.index_key,
             order=self.order,
             limit=self.limit_,
             group_by=self.group_by_,
+            batch_size=self.batch_size,
+            joins=self.joins,
+            distinct=self.distinct_,
+            by=self.by_,
+            nested=self.nested_,
+            write_statement=self.write_statement,
+            args=self.args,
         )
+        attributes.update(kwargs)
+        return _SqlQuery(**attributes)
 
 
-def sql_table_resolver(type, model, fields):
+def sql_table_resolver(type, model, fields, *, identity_map=False, relationships=False, entity_cache=None, entity_id=None, pushdown=None):
+    if relationships:
+        fields = _with_relationship_fields(type, model, fields)
     fields = memoize(fields)
 
+    return _table_resolver(
+        type,
+        model,
+        lambda: dict(fields=fields()),
+        identity_map=identity_map,
+        entity_cache=entity_cache,
+        entity_id=entity_id,
+        pushdown=pushdown,
+    )
+
+
+def polymorphic_table_resolver(type, model, *, discriminator, types, identity_map=False):
+    types = memoize(types)
+
+    return _table_resolver(type, model, lambda: dict(types=types(), discriminator=discriminator), identity_map=identity_map)
+
+
+def _table_resolver(type, model, plan_fields, *, identity_map, entity_cache=None, entity_id=None, pushdown=None):
+    if (entity_cache is None) != (entity_id is None):
+        raise ValueError("entity_cache and entity_id must be set together")
+
+    if entity_id is not None:
+        entity_id = _to_key(entity_id)
+
+    dependencies = dict(injector=Injector, session=sqlalchemy.orm.Session)
+    if identity_map:
+        dependencies["request_identity_map"] = IdentityMap
+
     @g.resolver(_sql_query_type(type))
-    @g.dependencies(injector=Injector, session=sqlalchemy.orm.Session)
-    def resolve_sql_query(graph, query, *, injector, session):
-        where = sqlalchemy.and_(*query.where_clauses)
+    @g.dependencies(**dependencies)
+    @_statement_origin(type=type)
+    def resolve_sql_query(graph, query, *, injector, session, request_identity_map=None):
+        def create_plan(query):
+            return _SqlQueryPlan(graph, query, model=model, injector=injector, dialect=session.get_bind(mapper=model).dialect, **plan_fields())
+
+        def fetch(query):
+            plan = create_plan(query)
+
+            if query.write_statement is not None:
+                if not session.get_bind(mapper=model).dialect.full_returning:
+                    raise g.GraphError("mutations require a dialect that supports RETURNING")
+
+                rows = _fetch_all(plan.row_query, session)
+                _record_write(session, query.write_statement)
+                return plan.read_batch(rows, injector=injector)
+
+            if query.batch_size is not None:
+                return _stream_objects(plan, session=session, injector=injector, batch_size=query.batch_size)
+
+            rows = _fetch_all(plan.row_query, session)
+            return plan.read_objects(rows, plan.create_readers(rows, injector=injector, base_query=plan.base_query))
+
+        if pushdown is not None and query.args is not None:
+            query = _apply_pushdown(query, pushdown)
+
+        if query.write_statement is not None and _has_read_modifiers(query):
+            raise g.GraphError("mutations can only be indexed: where, by, order_by, limit, group_by, join, distinct, stream and nested are not supported")
+
+        if query.by_ is not None and isinstance(query.by_[1], _CorrelatedKeys):
+            return create_plan(query).nested_result()
+        elif entity_cache is not None and _can_use_entity_cache(query, entity_id):
+            is_pending = _is_pending_invalidation(session, entity_cache, type, model)
+            return _resolve_cached_entities(type, query, fetch, entity_cache, is_pending=is_pending)
+        elif request_identity_map is None or not request_identity_map.can_resolve(query):
+            return _read_objects(query, fetch(query))
+        else:
+            return request_identity_map.resolve(type, query, fetch)
 
-        if query.index_key is None:
-            return _read_result(query.type_query, resolve(
-                graph,
-                query=query.element_query,
-                where=where,
-                limit=query.limit_,
-                order=query.order,
-                group_by=query.group_by_,
-                extra_expressions=(),
-                process_row=lambda row, result: result,
-                session=session,
-                injector=injector,
-            ))
+    resolve_sql_query.entity_cache = entity_cache
+    resolve_sql_query.entity_source = (type, model, entity_id)
+
+    return resolve_sql_query
+
+
+def _apply_pushdown(query, pushdown):
+    # Args only have values for the params of their own field, so pushdowns
+    # for the params of other fields are skipped.
+    return query.with_args(query.args, {
+        param: param_pushdown
+        for param, param_pushdown in pushdown.items()
+        if hasattr(query.args, param.name)
+    })._copy(args=None)
+
+
+def _has_read_modifiers(query):
+    # The rows of a mutation are the rows returned by the write statement,
+    # so modifiers that would otherwise restrict the rows cannot be applied.
+    return (
+        query.where_clauses != () or
+        query.by_ is not None or
+        query.order is not None or
+        query.limit_ is not None or
+        query.group_by_ is not None or
+        query.joins != () or
+        query.distinct_ or
+        query.batch_size is not None or
+        query.nested_
+    )
+
+
+class IdentityMap(object):
+    def __init__(self):
+        self._entries = {}
+
+    def can_resolve(self, query):
+        return _is_by_query(query)
+
+    def resolve(self, type, query, fetch):
+        by_key, by_values = query.by_
+        entries = self._entries.setdefault(
+            (type, str(query.element_query), query.element_query.create_object, tuple(by_key.expressions())),
+            {},
+        )
+
+        if isinstance(by_values, _JoinKeys):
+            values = by_values.values()
+        elif isinstance(by_values, (list, tuple)):
+            values = by_values
         else:
-            return _read_results(query.type_query, resolve(
-                graph,
-                query=query.element_query,
-                where=where,
-                limit=query.limit_,
-                order=query.order,
-                group_by=query.group_by_,
-                extra_expressions=query.index_key.expressions(),
-                process_row=lambda row, result: (query.index_key.read(row), result),
-                session=session,
-                injector=injector,
-            ))
+            values = None
 
-    def resolve(graph, query, where, limit, order, group_by, extra_expressions, process_row, session, injector):
-        def get_field(field_query):
-            if field_query.field == schema.typename_field and isinstance(query.type, schema.ObjectType):
-                return _ConstantField(query.type.name)
-            else:
-                field = fields().get(field_query.field)
-                if field is None:
-                    raise g.GraphError("Resolver missing for field {}".format(field_query.field.name))
-                elif callable(field):
-                    # TODO: test dependencies are injected
-                    return injector.call_with_dependencies(field, graph, field_query)
-                else:
-                    return field
+        if values is None:
+            results = fetch(query)
+            fetched_keys = set()
 
-        query_expressions = []
+            for key, value in results:
+                if key not in fetched_keys:
+                    fetched_keys.add(key)
+                    entries[key] = []
+                entries[key].append(value)
 
-        base_query = sqlalchemy.orm.Query([]).select_from(model)
+            return _read_objects(query, results)
 
-        if where is not None:
-            base_query = base_query.filter(where)
+        keys = list(dict.fromkeys(values))
+        missing_keys = [key for key in keys if key not in entries]
 
-        if group_by is not None:
-            base_query = base_query.group_by(*group_by)
+        if missing_keys:
+            if len(missing_keys) == len(keys):
+                fetch_query = query
+            else:
+                fetch_query = query._copy(by=(by_key, missing_keys))
+
+            for key in missing_keys:
+                entries[key] = []
+
+            for key, value in fetch(fetch_query):
+                entries[key].append(value)
+
+        return _read_objects(query, [
+            (key, value)
+            for key in keys
+            for value in entries[key]
+        ])
+
+
+def _is_by_query(query):
+    return (
+        query.by_ is not None and
+        not isinstance(query.by_[1], _CorrelatedKeys) and
+        query.index_key is query.by_[0] and
+        query.where_clauses == () and
+        query.order is None and
+        query.limit_ is None and
+        query.group_by_ is None and
+        query.batch_size is None and
+        query.joins == () and
+        not query.distinct_
+    )
 
-        if order is not None:
-            base_query = base_query.order_by(*order)
 
-        if limit is not None:
-            base_query = base_query.limit(limit)
+def _can_use_entity_cache(query, entity_id):
+    return (
+        _is_by_query(query) and
+        isinstance(query.by_[1], (_JoinKeys, list, tuple)) and
+        len(query.by_[0].expressions()) == len(entity_id.expressions()) and
+        all(
+            _clause_element(by_expression).compare(_clause_element(id_expression))
+            for by_expression, id_expression in zip(query.by_[0].expressions(), entity_id.expressions())
+        )
+    )
 
-        row_slices = []
 
-        for field_query in query.field_queries:
-            expressions = get_field(field_query).expressions()
-            row_slices.append(slice(len(query_expressions), len(query_expressions) + len(expressions)))
-            query_expressions += expressions
+def _resolve_cached_entities(type, query, fetch, entity_cache, *, is_pending):
+    # Only the entities and fields that are missing from the cache are
+    # fetched, grouping entities that are missing the same fields.
+    by_key, by_values = query.by_
+    element_query = query.element_query
 
-        readers = None
+    if isinstance(by_values, _JoinKeys):
+        by_values = by_values.values()
 
-        def generate_readers():
-            readers = []
+    ids = list(dict.fromkeys(by_values))
 
-            for field_query, row_slice in zip(query.field_queries, row_slices):
-                reader = get_field(field_query).create_reader(base_query, field_query=field_query, injector=injector)
-                readers.append((field_query.key, row_slice, reader))
+    cacheable_fields = [
+        field_query.field if entities.is_cacheable(field_query) else None
+        for field_query in element_query.field_queries
+    ]
 
-            return readers
+    # Entities changed by the session's uncommitted writes bypass the cache:
+    # cached values are stale for the session, and values read from the
+    # session are not yet visible to other sessions.
+    cached_values = {
+        id: {} if is_pending(id) else entity_cache.get(type, id, filter(None, cacheable_fields))
+        for id in ids
+    }
 
-        def read_row(row):
-            nonlocal readers
-            nonlocal read_row
+    def missing_indices(id):
+        return tuple(
+            index
+            for index, field in enumerate(cacheable_fields)
+            if field not in cached_values[id]
+        )
 
-            if readers is None:
-                readers = generate_readers()
+    # Entities without any cached values are always fetched, since the cache
+    # is then no evidence that the entity exists.
+    missing_ids = iterables.to_multidict(
+        (missing_indices(id), id)
+        for id in ids
+        if not cached_values[id] or missing_indices(id)
+    )
 
-            read_row = read_row_with_readers
-            return read_row(row)
+    fetched_values = {}
 
-        def read_row_with_readers(row):
-            fields = {
-                key: read(row[row_slice])
-                for key, row_slice, read in readers
-            }
-            obj = query.create_object(fields)
-            return process_row(row[remainder_slice], obj)
+    for indices, group_ids in missing_ids.items():
+        fetch_element_query = schema.ObjectQuery(
+            element_query.type,
+            field_queries=[element_query.field_queries[index] for index in indices],
+            create_object=lambda values: values,
+        )
+        fetch_query = query._copy(element_query=fetch_element_query, by=(by_key, group_ids))
+
+        for id, values in fetch(fetch_query):
+            fetched_values[id] = values
+            if not is_pending(id):
+                entity_cache.set(type, id, {
+                    cacheable_fields[index]: values[element_query.field_queries[index].key]
+                    for index in indices
+                    if cacheable_fields[index] is not None
+                })
+
+    fetched_ids = frozenset(
+        id
+        for group_ids in missing_ids.values()
+        for id in group_ids
+    )
 
-        remainder_slice = slice(len(query_expressions), None)
+    objects = []
 
-        if len(query_expressions) == 0:
-            query_expressions.append(sqlalchemy.literal(None))
+    for id in ids:
+        values = fetched_values.get(id)
 
-        row_query = base_query.add_columns(*query_expressions).add_columns(*extra_expressions)
-        rows = row_query.with_session(session)
+        if values is None and id in fetched_ids:
+            continue
 
-        return [
-            read_row(row)
-            for row in rows
-        ]
+        objects.append((id, element_query.create_object({
+            field_query.key: cached_values[id][field] if field in cached_values[id] else values[field_query.key]
+            for field_query, field in zip(element_query.field_queries, cacheable_fields)
+        })))
 
-    return resolve_sql_query
+    return _read_objects(query, objects)
 
 
-def forward_connection(*, connection_type_name, node_type, key, select_by_key):
-    @g.dependencies(session=sqlalchemy.orm.Session)
-    def fetch_keys(*, after_cursor, limit, session):
-        query = session.query(key).order_by(key)
+_pending_invalidations_key = object()
 
-        if after_cursor is not None:
-            query = query.filter(key > after_cursor)
 
-        query = query.limit(limit)
+def _is_pending_invalidation(session, entity_cache, type, model):
+    if session.autoflush:
+        session.flush()
 
-        return [value for value, in query]
+    invalidations = session.info.get(_pending_invalidations_key, {}).get(entity_cache)
 
-    return connections.forward_connection(
-        connection_type_name=connection_type_name,
+    if invalidations is None:
+        return lambda id: False
+    elif any(table in invalidations.tables for table in sqlalchemy.inspect(model).tables):
+        return lambda id: True
+    else:
+        return lambda id: (type, id) in invalidations.entities
+
+
+def invalidate_entity_cache_on_commit(target, entity_cache, resolvers):
+    sources = []
+    for resolver in resolvers:
+        if getattr(resolver, "entity_cache", None) is not entity_cache:
+            raise ValueError("resolvers must be SQL table resolvers using the entity cache")
+        sources.append(resolver.entity_source)
+
+    # Changes are only evicted once they are visible to other sessions: an
+    # entity evicted on flush could be cached again with its old values before
+    # the transaction commits.
+    def pending(session):
+        return session.info.setdefault(_pending_invalidations_key, {}).setdefault(entity_cache, _PendingInvalidations())
+
+    def after_begin(session, transaction, connection):
+        pending(session)
+
+    def after_flush(session, flush_context):
+        invalidations = pending(session)
+
+        for instance in itertools.chain(session.dirty, session.deleted):
+            for type, model, entity_id in sources:
+                if isinstance(instance, model):
+                    invalidations.entities.update(
+                        (type, id)
+                        for id in _instance_ids(instance, entity_id)
+                    )
+
+    def do_orm_execute(orm_execute_state):
+        if orm_execute_state.is_update or orm_execute_state.is_delete:
+            pending(orm_execute_state.session).tables.add(orm_execute_state.statement.table)
+
+    def after_commit(session):
+        invalidate(pending(session))
+        session.info[_pending_invalidations_key].pop(entity_cache)
+
+    def after_soft_rollback(session, previous_transaction):
+        # Values read from uncommitted changes may have been cached, so
+        # changes are evicted when rolled back as well as when committed.
+        invalidations = session.info.get(_pending_invalidations_key, {}).get(entity_cache)
+        if invalidations is not None:
+            invalidate(invalidations)
+            if previous_transaction.parent is None:
+                session.info[_pending_invalidations_key].pop(entity_cache)
+
+    def invalidate(invalidations):
+        for type, id in invalidations.entities:
+            entity_cache.invalidate(type, id)
+
+        for type, model, entity_id in sources:
+            if any(table in invalidations.tables for table in sqlalchemy.inspect(model).tables):
+                entity_cache.invalidate_type(type)
+
+    sqlalchemy.event.listen(target, "after_begin", after_begin)
+    sqlalchemy.event.listen(target, "after_flush", after_flush)
+    sqlalchemy.event.listen(target, "do_orm_execute", do_orm_execute)
+    sqlalchemy.event.listen(target, "after_commit", after_commit)
+    sqlalchemy.event.listen(target, "after_soft_rollback", after_soft_rollback)
+
+
+class _PendingInvalidations(object):
+    def __init__(self):
+        self.entities = set()
+        self.tables = set()
+
+
+def _instance_ids(instance, entity_id):
+    state = sqlalchemy.inspect(instance)
+    attributes = [
+        state.attrs[state.mapper.get_property_by_column(_clause_element(expression)).key]
+        for expression in entity_id.expressions()
+    ]
+    values = tuple(attribute.value for attribute in attributes)
+    # The entity is also evicted under its previous id when the id changes.
+    previous_values = tuple(
+        attribute.history.deleted[0] if attribute.history.deleted else value
+        for attribute, value in zip(attributes, values)
+    )
+
+    return {entity_id.read(values), entity_id.read(previous_values)}
+
+
+def _record_write(session, statement):
+    # Inserts only change existing rows when they are upserts.
+    is_upsert = isinstance(statement, (sqlalchemy.dialects.postgresql.Insert, sqlalchemy.dialects.sqlite.Insert))
+    if isinstance(statement, sqlalchemy.sql.Insert) and not is_upsert:
+        return
+
+    for invalidations in session.info.get(_pending_invalidations_key, {}).values():
+        invalidations.tables.add(statement.table)
+
+
+def _read_objects(query, objects):
+    if query.index_key is None:
+        return _read_result(query.type_query, objects)
+    else:
+        return _read_results(query.type_query, objects)
+
+
+def async_sql_table_resolver(type, model, fields, *, relationships=False, concurrent_reads=False):
+    if relationships:
+        fields = _with_relationship_fields(type, model, fields)
+    fields = memoize(fields)
+
+    @g.resolver(_sql_query_type(type))
+    @g.dependencies(injector=Injector, session=sqlalchemy.ext.asyncio.AsyncSession)
+    async def resolve_sql_query(graph, query, *, injector, session):
+        with _statement_origin(type=type):
+            if query.batch_size is not None:
+                raise g.GraphError("streaming is not supported by async_sql_table_resolver")
+
+            if query.nested_ or (query.by_ is not None and isinstance(query.by_[1], _CorrelatedKeys)):
+                raise g.GraphError("nested queries are not supported by async_sql_table_resolver")
+
+            if query.write_statement is not None:
+                raise g.GraphError("mutations are not supported by async_sql_table_resolver")
+
+            plan = _SqlQueryPlan(graph, query, model=model, fields=fields(), injector=injector)
+            rows = await _fetch_all_async(plan.row_query, session, concurrent_reads=concurrent_reads)
+
+            if rows:
+                readers = await asyncio.gather(*(
+                    _create_reader_async(field, plan.base_query, field_query=field_query, injector=injector, columns=columns, concurrent_reads=concurrent_reads)
+                    for field_query, field, columns in plan.fields
+                ))
+            else:
+                readers = None
+
+            return _read_objects(query, plan.read_objects(rows, readers))
+
+    return resolve_sql_query
+
+
+async def _create_reader_async(field, base_query, *, field_query, injector, columns, concurrent_reads):
+    create_reader_async = getattr(field, "create_reader_async", None)
+
+    if create_reader_async is None:
+        return field.create_reader(base_query, field_query=field_query, injector=injector, columns=columns)
+    else:
+        return await create_reader_async(base_query, field_query=field_query, injector=injector, columns=columns, concurrent_reads=concurrent_reads)
+
+
+def _stream_objects(plan, *, session, injector, batch_size):
+    # Each batch is read in the context the query was resolved in so that
+    # statements issued by joins keep their origin.
+    context = contextvars.copy_context()
+    batches = context.run(_fetch_batches, plan.row_query, session, batch_size=batch_size)
+
+    def read_objects():
+        while True:
+            rows = context.run(next, batches, None)
+            if rows is None:
+                return
+
+            yield from context.run(plan.read_batch, rows, injector=injector)
+
+    return read_objects()
+
+
+class _SqlQueryPlan(object):
+    def __init__(self, graph, query, *, model, injector, fields=None, types=None, discriminator=None, dialect=None):
+        def get_field(element_query, fields, field_query):
+            if field_query.field == schema.typename_field and isinstance(element_query.type, schema.ObjectType):
+                return _ConstantField(element_query.type.name)
+            else:
+                field = fields.get(field_query.field)
+                if field is None:
+                    raise g.GraphError("Resolver missing for field {}".format(field_query.field.name))
+                elif callable(field):
+                    # TODO: test dependencies are injected
+                    return injector.call_with_dependencies(field, graph, field_query)
+                else:
+                    return field
+
+        if query.by_ is None or not isinstance(query.by_[1], _CorrelatedKeys):
+            correlated_keys = None
+        else:
+            correlated_keys = query.by_[1]
+
+        if discriminator is None:
+            variants = [(None, query.element_query, fields)]
+        elif query.nested_ or correlated_keys is not None:
+            raise g.GraphError("nested queries are not supported by polymorphic_table_resolver")
+        else:
+            variants = [
+                (value, query.element_query.for_type(object_type), object_type_fields)
+                for value, (object_type, object_type_fields) in types.items()
+            ]
+
+        fields = []
+        variant_fields = []
+
+        for value, element_query, element_fields in variants:
+            start = len(fields)
+            fields += [
+                (field_query, get_field(element_query, element_fields, field_query))
+                for field_query in element_query.field_queries
+            ]
+            variant_fields.append((value, element_query.create_object, slice(start, len(fields))))
+
+        if query.nested_ or correlated_keys is not None:
+            fields = [
+                (field_query, _nested_field(field, field_query=field_query, injector=injector, dialect=dialect, model=model))
+                for field_query, field in fields
+            ]
+
+        base_query = sqlalchemy.select().select_from(model)
+
+        for target, onclause in query.joins:
+            base_query = base_query.join(target, onclause)
+
+        base_query = base_query.where(*query.where_clauses)
+
+        if discriminator is not None:
+            base_query = base_query.where(discriminator.in_([value for value, _, _ in variants]))
+
+        if correlated_keys is not None:
+            base_query = base_query.where(*correlated_keys.where_clauses(query.by_[0]))
+        elif query.by_ is not None:
+            by_key, by_values = query.by_
+            base_query = base_query.where(by_key.expression().in_(by_values))
+
+        if query.distinct_:
+            base_query = base_query.distinct()
+
+        if query.group_by_ is not None:
+            base_query = base_query.group_by(*query.group_by_)
+
+        if query.order is not None:
+            base_query = base_query.order_by(*query.order)
+
+        if query.limit_ is not None:
+            base_query = base_query.limit(query.limit_)
+
+        query_expressions = []
+
+        def add_expression(expression):
+            for index, query_expression in enumerate(query_expressions):
+                if _clause_element(query_expression).compare(_clause_element(expression)):
+                    return index
+
+            query_expressions.append(expression)
+            return len(query_expressions) - 1
+
+        self.fields = [
+            (field_query, field, tuple(add_expression(expression) for expression in field.expressions()))
+            for field_query, field in fields
+        ]
+
+        if discriminator is None:
+            self._read_discriminator = None
+        else:
+            self._read_discriminator = operator.itemgetter(add_expression(discriminator))
+
+        if query.index_key is None:
+            self._read_index_key = None
+        else:
+            self._read_index_key = query.index_key.reader(tuple(
+                add_expression(expression)
+                for expression in query.index_key.expressions()
+            ))
+
+        if len(query_expressions) == 0:
+            query_expressions.append(sqlalchemy.literal(None))
+
+        if query.batch_size is not None and (query.index_key is not None or not isinstance(query.type_query, schema.ListQuery)):
+            raise g.GraphError("only lists can be streamed")
+
+        self._query = query
+        self._discriminator = discriminator
+        self._variant_fields = variant_fields
+        self._injector = injector
+        self._dialect = dialect
+        self._correlated_keys = correlated_keys
+        self._row_expressions = tuple(query_expressions)
+        self.base_query = base_query
+
+        if query.write_statement is None:
+            self.row_query = base_query.add_columns(*query_expressions)
+        else:
+            self.row_query = query.write_statement.returning(*query_expressions)
+
+    def nested_result(self):
+        json_functions = _json_functions(self._dialect)
+
+        nested_columns = set(
+            column
+            for _, field, columns in self.fields
+            if isinstance(field, _NestedJoinField)
+            for column in columns
+        )
+
+        element_query = self.base_query \
+            .add_columns(*(
+                row_expression.label("c{}".format(index))
+                for index, row_expression in enumerate(self._row_expressions)
+            )) \
+            .correlate(self._correlated_keys.model) \
+            .subquery()
+
+        element = json_functions.array(*(
+            json_functions.nested(column) if index in nested_columns else column
+            for index, column in enumerate(element_query.c)
+        ))
+
+        array_expression = sqlalchemy.select(json_functions.array_agg(element)) \
+            .select_from(element_query) \
+            .scalar_subquery()
+
+        processors = [
+            None if index in nested_columns else row_expression.type.dialect_impl(self._dialect).result_processor(self._dialect, None)
+            for index, row_expression in enumerate(self._row_expressions)
+        ]
+
+        readers = [
+            field.create_reader(self.base_query, field_query=field_query, injector=self._injector, columns=columns)
+            for field_query, field, columns in self.fields
+        ]
+        read_object = self._object_reader(readers)
+        type_query = self._query.type_query
+
+        def read(value):
+            if isinstance(value, str):
+                value = json.loads(value)
+
+            objects = [
+                read_object([
+                    element if processor is None else processor(element)
+                    for processor, element in zip(processors, row)
+                ])
+                for row in (value or ())
+            ]
+
+            return _read_result(type_query, objects)
+
+        return _NestedResult(array_expression, read)
+
+    def read_batch(self, rows, *, injector):
+        return self.read_objects(rows, self.create_readers(rows, injector=injector, base_query=None))
+
+    def create_readers(self, rows, *, injector, base_query):
+        if not rows:
+            return None
+
+        readers = []
+
+        for value, _, fields in self._variant_fields:
+            if self._read_discriminator is None:
+                variant_rows = rows
+                variant_base_query = base_query
+            else:
+                variant_rows = [row for row in rows if self._read_discriminator(row) == value]
+                variant_base_query = None if base_query is None else base_query.where(self._discriminator == value)
+
+            for field_query, field, columns in self.fields[fields]:
+                create_reader_for_rows = getattr(field, "create_reader_for_rows", None)
+
+                if not variant_rows:
+                    readers.append(None)
+                elif create_reader_for_rows is None:
+                    readers.append(field.create_reader(self.base_query, field_query=field_query, injector=injector, columns=columns))
+                else:
+                    readers.append(create_reader_for_rows(variant_rows, field_query=field_query, injector=injector, columns=columns, base_query=variant_base_query))
+
+        return readers
+
+    def read_objects(self, rows, readers):
+        if not rows:
+            return []
+
+        read_object = self._object_reader(readers)
+
+        if self._read_index_key is None:
+            return [
+                read_object(row)
+                for row in rows
+            ]
+        else:
+            read_index_key = self._read_index_key
+
+            return [
+                (read_index_key(row), read_object(row))
+                for row in rows
+            ]
+
+    def _object_reader(self, readers):
+        object_readers = {
+            value: _object_reader(create_object, tuple(
+                (field_query.key, reader)
+                for (field_query, _, _), reader in zip(self.fields[fields], readers[fields])
+            ))
+            for value, create_object, fields in self._variant_fields
+        }
+
+        if self._read_discriminator is None:
+            return object_readers[None]
+        else:
+            read_discriminator = self._read_discriminator
+
+            def read_object(row):
+                return object_readers[read_discriminator(row)](row)
+
+            return read_object
+
+
+def _object_reader(create_object, key_readers):
+    def read_object(row):
+        return create_object({
+            key: read(row)
+            for key, read in key_readers
+        })
+
+    return read_object
+
+
+def forward_connection(*, connection_type_name, node_type, key, select_by_key=None, fused=False, cursor_encoding=None, total_count=None):
+    return _keyset_connection(
+        connections.forward_connection,
+        connection_type_name=connection_type_name,
+        node_type=node_type,
+        key=key,
+        select_by_key=select_by_key,
+        fused=fused,
+        cursor_encoding=cursor_encoding,
+        total_count=total_count,
+        reverse=False,
+    )
+
+
+def backward_connection(*, connection_type_name, node_type, key, select_by_key=None, fused=False, cursor_encoding=None, total_count=None):
+    return _keyset_connection(
+        connections.backward_connection,
+        connection_type_name=connection_type_name,
         node_type=node_type,
-        select_by_cursor=select_by_key,
-        fetch_cursors=fetch_keys,
-        cursor_encoding=connections.int_cursor_encoding,
+        key=key,
+        select_by_key=select_by_key,
+        fused=fused,
+        cursor_encoding=cursor_encoding,
+        total_count=total_count,
+        reverse=True,
     )
+
+
+def bidirectional_connection(*, connection_type_name, node_type, key, select_by_key=None, fused=False, cursor_encoding=None, total_count=None):
+    return _keyset_connection(
+        connections.bidirectional_connection,
+        connection_type_name=connection_type_name,
+        node_type=node_type,
+        key=key,
+        select_by_key=select_by_key,
+        fused=fused,
+        cursor_encoding=cursor_encoding,
+        total_count=total_count,
+        reverse=None,
+    )
+
+
+def _keyset_connection(create_connection, *, connection_type_name, node_type, key, select_by_key, fused, cursor_encoding, total_count, reverse):
+    # reverse is the default direction for connections that only page one way:
+    # bidirectional connections always pass the direction explicitly.
+    key_expressions = key
+    key = _to_key(key)
+
+    if cursor_encoding is None:
+        if isinstance(key, _SingleExpressionKey):
+            cursor_encoding = connections.int_cursor_encoding
+        else:
+            cursor_encoding = connections.tuple_cursor_encoding(*(
+                expression.type.python_type
+                for expression in key.expressions()
+            ))
+
+    def where_clauses(after_cursor, before_cursor):
+        if after_cursor is not None:
+            yield key.expression() > after_cursor
+
+        if before_cursor is not None:
+            yield key.expression() < before_cursor
+
+    def order_by(reverse):
+        if reverse:
+            return [expression.desc() for expression in key.expressions()]
+        else:
+            return key.expressions()
+
+    @g.dependencies(session=sqlalchemy.orm.Session)
+    @_statement_origin(type=node_type)
+    def count_keys(*, limit=None, session):
+        query = sqlalchemy.select(*key.expressions())
+
+        if limit is not None:
+            query = query.limit(limit)
+
+        (count, ), = _fetch_all(sqlalchemy.select(sqlalchemy.func.count()).select_from(query.subquery()), session)
+        return count
+
+    def window_count_expression(after_cursor, before_cursor):
+        # A window count only covers the rows that pass the filters, so can
+        # only be used for the total when the page is unbounded.
+        if after_cursor is None and before_cursor is None:
+            return sqlalchemy.func.count().over()
+        else:
+            return None
+
+    @g.dependencies(session=sqlalchemy.orm.Session)
+    @_statement_origin(type=node_type)
+    def fetch_keys(*, after_cursor=None, before_cursor=None, limit, reverse=reverse, with_total_count=False, session):
+        total_count_expression = window_count_expression(after_cursor, before_cursor) if with_total_count else None
+
+        query = sqlalchemy.select(*key.expressions()) \
+            .where(*where_clauses(after_cursor, before_cursor)) \
+            .order_by(*order_by(reverse)) \
+            .limit(limit)
+
+        if total_count_expression is None:
+            keys = [key.read(row) for row in _fetch_all(query, session)]
+            page_total_count = None
+        else:
+            rows = _fetch_all(query.add_columns(total_count_expression), session)
+            keys = [key.read(row[:-1]) for row in rows]
+            page_total_count = rows[0][-1] if rows else 0
+
+        if with_total_count:
+            return keys, page_total_count
+        else:
+            return keys
+
+    @g.dependencies(session=sqlalchemy.orm.Session)
+    def fetch_edges(graph, node_query, *, after_cursor=None, before_cursor=None, limit, reverse=reverse, with_total_count=False, session):
+        if node_query is None:
+            keys = fetch_keys(
+                after_cursor=after_cursor,
+                before_cursor=before_cursor,
+                limit=limit,
+                reverse=reverse,
+                with_total_count=with_total_count,
+                session=session,
+            )
+
+            if with_total_count:
+                keys, page_total_count = keys
+                return [(value, None) for value in keys], page_total_count
+            else:
+                return [(value, None) for value in keys]
+
+        total_count_expression = window_count_expression(after_cursor, before_cursor) if with_total_count else None
+
+        if total_count_expression is None:
+            index_key = key_expressions
+        else:
+            index_key = tuple(key.expressions()) + (total_count_expression, )
+
+        sql_query = select(schema.ListQuery(g.ListType(node_query.type), node_query)) \
+            .index_by(index_key) \
+            .order_by(*order_by(reverse)) \
+            .limit(limit)
+
+        for where_clause in where_clauses(after_cursor, before_cursor):
+            sql_query = sql_query.where(where_clause)
+
+        nodes = graph.resolve(sql_query)
+
+        if total_count_expression is None:
+            edges = [
+                (value, node)
+                for value, (node, ) in nodes.items()
+            ]
+            page_total_count = None
+        else:
+            edges = [
+                (key.read(value[:-1]), node)
+                for value, (node, ) in nodes.items()
+            ]
+            page_total_count = next(iter(nodes))[-1] if nodes else 0
+
+        if with_total_count:
+            return edges, page_total_count
+        else:
+            return edges
+
+    if total_count is not None:
+        total_count = total_count(count_keys)
+
+    if fused:
+        return create_connection(
+            connection_type_name=connection_type_name,
+            node_type=node_type,
+            fetch_edges=fetch_edges,
+            cursor_encoding=cursor_encoding,
+            total_count=total_count,
+        )
+    else:
+        return create_connection(
+            connection_type_name=connection_type_name,
+            node_type=node_type,
+            select_by_cursor=select_by_key,
+            fetch_cursors=fetch_keys,
+            cursor_encoding=cursor_encoding,
+            total_count=total_count,
+        )
+
+
+def exact_total_count():
+    return connections.exact_total_count
+
+
+def capped_total_count(cap):
+    return lambda count: connections.capped_total_count(count, cap=cap)
+
+
+def window_total_count():
+    return connections.folded_total_count
+
+
+def cached_total_count(total_count, *, ttl):
+    return lambda count: connections.cached_total_count(total_count(count), ttl=ttl)
+
+
+def bulk_insert(session, model, values, *, columns, key, chunk_size=1000):
+    key = _to_key(key)
+    rows = _write_rows(values, columns)
+
+    if session.get_bind(mapper=model).dialect.full_returning:
+        read_key = key.reader(range(len(key.expressions())))
+
+        return [
+            read_key(row)
+            for chunk in iterables.chunks(rows, chunk_size)
+            for row in _fetch_all(sqlalchemy.insert(model).values(chunk).returning(*key.expressions()), session)
+        ]
+    elif _has_key_columns(rows, key):
+        for chunk in iterables.chunks(rows, chunk_size):
+            _execute_many(sqlalchemy.insert(model), chunk, session)
+
+        return _read_row_keys(rows, key)
+    else:
+        # Without RETURNING, generated keys are only available one row at a
+        # time, so rather than executing a statement per row, keys must be
+        # mapped from input fields.
+        raise ValueError("bulk inserts require key columns mapped from input fields or a dialect that supports RETURNING")
+
+
+def bulk_update(session, model, values, *, columns, key, chunk_size=1000):
+    key = _to_key(key)
+    rows = _write_rows(values, columns)
+    key_column_keys = _key_column_keys(key)
+
+    if not _has_key_columns(rows, key):
+        raise ValueError("key columns must be mapped from input fields")
+
+    statement = sqlalchemy.update(model) \
+        .where(*(
+            expression == sqlalchemy.bindparam("key_" + column_key)
+            for expression, column_key in zip(key.expressions(), key_column_keys)
+        )) \
+        .values({
+            column_key: sqlalchemy.bindparam("value_" + column_key)
+            for column_key in _column_keys(columns)
+            if column_key not in key_column_keys
+        })
+
+    for chunk in iterables.chunks(rows, chunk_size):
+        _execute_many(
+            statement,
+            [
+                dict(
+                    [("key_" + column_key, row[column_key]) for column_key in key_column_keys] +
+                    [("value_" + column_key, value) for column_key, value in row.items() if column_key not in key_column_keys]
+                )
+                for row in chunk
+            ],
+            session,
+        )
+
+    return _read_row_keys(rows, key)
+
+
+def bulk_upsert(session, model, values, *, columns, key, chunk_size=1000):
+    key = _to_key(key)
+    rows = _write_rows(values, columns)
+    key_column_keys = _key_column_keys(key)
+
+    if not _has_key_columns(rows, key):
+        raise ValueError("key columns must be mapped from input fields")
+
+    dialect_name = session.get_bind(mapper=model).dialect.name
+    if dialect_name == "postgresql":
+        insert = sqlalchemy.dialects.postgresql.insert(model)
+    elif dialect_name == "sqlite":
+        insert = sqlalchemy.dialects.sqlite.insert(model)
+    else:
+        raise g.GraphError("upserts are not supported by dialect: {}".format(dialect_name))
+
+    update_column_keys = [
+        column_key
+        for column_key in _column_keys(columns)
+        if column_key not in key_column_keys
+    ]
+
+    if update_column_keys:
+        statement = insert.on_conflict_do_update(
+            index_elements=key.expressions(),
+            set_={
+                column_key: insert.excluded[column_key]
+                for column_key in update_column_keys
+            },
+        )
+    else:
+        statement = insert.on_conflict_do_nothing(index_elements=key.expressions())
+
+    for chunk in iterables.chunks(rows, chunk_size):
+        _execute_many(statement, chunk, session)
+
+    return _read_row_keys(rows, key)
+
+
+def _column_keys(columns):
+    return [_clause_element(column).key for column in columns.values()]
+
+
+def _write_rows(values, columns):
+    field_column_keys = [
+        (field.name, _clause_element(column).key)
+        for field, column in columns.items()
+    ]
+
+    return [
+        {
+            column_key: getattr(value, field_name)
+            for field_name, column_key in field_column_keys
+        }
+        for value in values
+    ]
+
+
+def _key_column_keys(key):
+    return [_clause_element(expression).key for expression in key.expressions()]
+
+
+def _has_key_columns(rows, key):
+    return len(rows) == 0 or all(column_key in rows[0] for column_key in _key_column_keys(key))
+
+
+def _read_row_keys(rows, key):
+    key_column_keys = _key_column_keys(key)
+
+    return [
+        key.read([row[column_key] for column_key in key_column_keys])
+        for row in rows
+    ]
+
+
+class SessionRouter(object):
+    def __init__(self, *, primary, replicas, strategy="round_robin", read_your_writes=0, clock=time.monotonic):
+        if strategy not in ("least_loaded", "round_robin"):
+            raise ValueError("unknown strategy: {}".format(strategy))
+
+        self._primary = primary
+        self._replicas = tuple(replicas)
+        self._strategy = strategy
+        self._read_your_writes = read_your_writes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._next_replica_index = 0
+        self._replica_loads = [0] * len(self._replicas)
+        # Ordered by time of last write, so expired entries are at the start.
+        self._last_writes = {}
+
+    @contextlib.contextmanager
+    def session(self, operation_type, client_key=None):
+        with self._lock:
+            replica_index = self._select_replica_index(operation_type, client_key)
+            if replica_index is not None:
+                self._replica_loads[replica_index] += 1
+
+        if replica_index is None:
+            session = self._primary()
+        else:
+            session = self._replicas[replica_index]()
+
+        succeeded = False
+        try:
+            yield session
+            succeeded = True
+        finally:
+            session.close()
+
+            with self._lock:
+                if replica_index is not None:
+                    self._replica_loads[replica_index] -= 1
+                elif succeeded and operation_type != "query" and client_key is not None:
+                    self._record_write(client_key)
+
+    def _record_write(self, client_key):
+        now = self._clock()
+        self._last_writes.pop(client_key, None)
+        self._last_writes[client_key] = now
+
+        while self._last_writes:
+            key, last_write = next(iter(self._last_writes.items()))
+            if now - last_write < self._read_your_writes:
+                break
+            del self._last_writes[key]
+
+    def _select_replica_index(self, operation_type, client_key):
+        last_write = self._last_writes.get(client_key)
+
+        if operation_type != "query" or len(self._replicas) == 0:
+            return None
+        elif last_write is not None and self._clock() - last_write < self._read_your_writes:
+            return None
+        elif self._strategy == "round_robin":
+            replica_index = self._next_replica_index
+            self._next_replica_index = (replica_index + 1) % len(self._replicas)
+            return replica_index
+        else:
+            return min(range(len(self._replicas)), key=lambda replica_index: self._replica_loads[replica_index])
+
+
+class Statement(object):
+    def __init__(self, *, sql, parameters, duration, row_count, type, path):
+        self.sql = sql
+        self.parameters = parameters
+        self.duration = duration
+        self.row_count = row_count
+        self.type = type
+        self.path = path
+
+    def __repr__(self):
+        return "Statement(type={!r}, path={!r}, sql={!r})".format(self.type, self.path, self.sql)
+
+
+_statement_log = contextvars.ContextVar("statement_log", default=None)
+_current_statement_origin = contextvars.ContextVar("statement_origin", default=(None, ()))
+
+
+@contextlib.contextmanager
+def record_statements():
+    statements = []
+    token = _statement_log.set(statements)
+    try:
+        yield statements
+    finally:
+        _statement_log.reset(token)
+
+
+@contextlib.contextmanager
+def assert_max_statements(max_statements):
+    with record_statements() as statements:
+        yield statements
+
+    if len(statements) > max_statements:
+        raise AssertionError("expected at most {} statements but {} were executed:{}".format(
+            max_statements,
+            len(statements),
+            "".join(
+                "\n{} {}: {}".format(statement.type, ".".join(map(str, statement.path)), statement.sql)
+                for statement in statements
+            ),
+        ))
+
+
+@contextlib.contextmanager
+def _statement_origin(*, type=None, key=None):
+    current_type, current_path = _current_statement_origin.get()
+
+    if type is None:
+        type = current_type
+
+    if key is not None:
+        current_path += (key, )
+
+    token = _current_statement_origin.set((type, current_path))
+    try:
+        yield
+    finally:
+        _current_statement_origin.reset(token)
+
+
+def _fetch_all(statement, session):
+    connection = _session_connection(session, statement)
+    statements = _statement_log.get()
+
+    with _statement_timeout(connection):
+        if statements is None:
+            return connection.execute(statement).all()
+        else:
+            start = time.perf_counter()
+            rows = connection.execute(statement).all()
+            duration = time.perf_counter() - start
+            _record_statement(statements, statement, row_count=len(rows), duration=duration, dialect=connection.dialect)
+            return rows
+
+
+def _execute_many(statement, parameters, session):
+    connection = _session_connection(session, statement)
+    statements = _statement_log.get()
+
+    with _statement_timeout(connection):
+        start = time.perf_counter()
+        result = connection.execute(statement, parameters)
+        duration = time.perf_counter() - start
+
+    _record_write(session, statement)
+
+    if statements is not None:
+        _record_statement(statements, statement, row_count=result.rowcount, duration=duration, dialect=connection.dialect)
+
+    return result
+
+
+def _session_connection(session, statement):
+    # Statements are executed directly on the session's connection, so
+    # pending changes are flushed as they would be for an ORM query. The
+    # connection is chosen by the tables in the statement, so sessions with
+    # binds for individual models or tables use the right engine.
+    if session.autoflush:
+        session.flush()
+
+    return session.connection(bind_arguments=dict(clause=statement))
+
+
+@contextlib.contextmanager
+def _statement_timeout(connection):
+    # Statements are stopped by the database once the deadline passes, rather
+    # than continuing to run after the result can no longer be used.
+    deadline = g.current_deadline()
+
+    if deadline is None:
+        yield
+        return
+
+    deadline.check()
+
+    try:
+        timeout_sql = _statement_timeout_sql(connection.dialect, deadline)
+
+        if timeout_sql is not None:
+            # The timeout is discarded with the transaction if the statement
+            # fails, so it only needs resetting after success.
+            connection.exec_driver_sql(timeout_sql)
+            yield
+            connection.exec_driver_sql(_reset_statement_timeout_sql)
+        elif connection.dialect.name == "sqlite" and hasattr(connection.connection, "set_progress_handler"):
+            connection.connection.set_progress_handler(lambda: deadline.remaining() <= 0, _sqlite_progress_instructions)
+            try:
+                yield
+            finally:
+                connection.connection.set_progress_handler(None, _sqlite_progress_instructions)
+        else:
+            yield
+    except sqlalchemy.exc.DBAPIError as error:
+        if deadline.remaining() <= 0:
+            raise g.DeadlineExceededError("deadline exceeded") from error
+        else:
+            raise
+
+
+_sqlite_progress_instructions = 1000
+
+_reset_statement_timeout_sql = "SET LOCAL statement_timeout TO DEFAULT"
+
+
+def _statement_timeout_sql(dialect, deadline):
+    if dialect.name == "postgresql":
+        return "SET LOCAL statement_timeout = {}".format(max(1, math.ceil(deadline.remaining() * 1000)))
+    else:
+        return None
+
+
+def _fetch_batches(statement, session, *, batch_size):
+    connection = _session_connection(session, statement)
+    statements = _statement_log.get()
+
+    start = time.perf_counter()
+    with _statement_timeout(connection):
+        result = connection.execute(statement.execution_options(stream_results=True))
+    partitions = result.partitions(batch_size)
+    duration = time.perf_counter() - start
+    row_count = 0
+
+    try:
+        while True:
+            start = time.perf_counter()
+            with _statement_timeout(connection):
+                rows = next(partitions, None)
+            duration += time.perf_counter() - start
+
+            if rows is None:
+                return
+
+            row_count += len(rows)
+            yield rows
+    finally:
+        result.close()
+
+        if statements is not None:
+            _record_statement(statements, statement, row_count=row_count, duration=duration, dialect=connection.dialect)
+
+
+async def _fetch_all_async(statement, session, *, concurrent_reads=False):
+    statements = _statement_log.get()
+
+    if concurrent_reads:
+        # Each statement runs on its own connection, so concurrent statements
+        # neither wait for each other nor see the session's transaction.
+        async with session.bind.connect() as connection:
+            rows, duration = await _execute_async(statement, connection)
+    else:
+        # AsyncSession does not allow concurrent operations, so statements
+        # issued by sibling fields are serialised on the session.
+        lock = session.info.get(_async_session_lock_key)
+        if lock is None:
+            lock = session.info[_async_session_lock_key] = asyncio.Lock()
+
+        async with lock:
+            if session.sync_session.autoflush:
+                await session.flush()
+
+            connection = await session.connection(bind_arguments=dict(clause=statement))
+            rows, duration = await _execute_async(statement, connection)
+
+    if statements is not None:
+        _record_statement(statements, statement, row_count=len(rows), duration=duration, dialect=connection.dialect)
+
+    return rows
+
+
+async def _execute_async(statement, connection):
+    deadline = g.current_deadline()
+
+    if deadline is None:
+        timeout_sql = None
+    else:
+        deadline.check()
+        timeout_sql = _statement_timeout_sql(connection.dialect, deadline)
+
+    if timeout_sql is not None:
+        await connection.exec_driver_sql(timeout_sql)
+
+    try:
+        start = time.perf_counter()
+        rows = (await connection.execute(statement)).all()
+        duration = time.perf_counter() - start
+    except sqlalchemy.exc.DBAPIError as error:
+        if deadline is not None and deadline.remaining() <= 0:
+            raise g.DeadlineExceededError("deadline exceeded") from error
+        else:
+            raise
+
+    if timeout_sql is not None:
+        await connection.exec_driver_sql(_reset_statement_timeout_sql)
+
+    return rows, duration
+
+
+_async_session_lock_key = object()
+
+
+def _record_statement(statements, statement, *, row_count, duration, dialect):
+    compiled = statement.compile(dialect=dialect)
+    type, path = _current_statement_origin.get()
+    statements.append(Statement(
+        sql=str(compiled),
+        parameters=compiled.params,
+        duration=duration,
+        row_count=row_count,
+        type=type,
+        path=path,
+    ))
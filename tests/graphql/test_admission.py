@@ -0,0 +1,164 @@
+import threading
+
+from precisely import assert_that, contains_exactly, equal_to
+import pytest
+
+import graphlayer as g
+from graphlayer.graphql.admission import AdaptiveConcurrencyLimiter, OverloadedError, query_cost
+
+
+def test_requests_within_limit_are_admitted():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2)
+
+    with limiter.acquire():
+        with limiter.acquire():
+            assert_that(limiter.in_flight, equal_to(2))
+
+    assert_that(limiter.in_flight, equal_to(0))
+
+
+def test_when_limit_is_reached_and_queue_is_full_then_request_is_rejected():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_queue_size=0)
+
+    with limiter.acquire():
+        error = pytest.raises(OverloadedError, lambda: limiter.acquire().__enter__())
+
+    assert_that(str(error.value), equal_to("server is overloaded"))
+    assert_that(limiter.in_flight, equal_to(0))
+
+
+def test_when_queued_request_is_not_admitted_before_timeout_then_request_is_rejected():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_queue_size=1, queue_timeout=0.01)
+
+    with limiter.acquire():
+        pytest.raises(OverloadedError, lambda: limiter.acquire().__enter__())
+
+
+def test_queued_request_is_admitted_when_running_request_completes():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_queue_size=1, queue_timeout=10)
+    events = []
+
+    def run_queued():
+        with limiter.acquire():
+            events.append("queued")
+
+    with limiter.acquire():
+        thread = threading.Thread(target=run_queued)
+        thread.start()
+        while limiter._queue_size == 0:
+            pass
+        events.append("running")
+
+    thread.join()
+
+    assert_that(events, contains_exactly("running", "queued"))
+
+
+def test_cheap_requests_are_admitted_while_expensive_requests_are_rejected():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=3)
+
+    with limiter.acquire(2):
+        pytest.raises(OverloadedError, lambda: limiter.acquire(2).__enter__())
+
+        with limiter.acquire(1):
+            assert_that(limiter.in_flight, equal_to(3))
+
+
+def test_request_costing_more_than_limit_is_admitted_when_nothing_is_running():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2)
+
+    with limiter.acquire(5):
+        assert_that(limiter.in_flight, equal_to(5))
+
+
+def test_limit_increases_while_latency_is_close_to_baseline():
+    clock = FakeClock()
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, clock=clock)
+
+    for _ in range(4):
+        with limiter.acquire():
+            clock.advance(1)
+
+    assert_that(limiter.limit > 3, equal_to(True))
+
+
+def test_limit_decreases_when_latency_exceeds_tolerance_of_baseline():
+    clock = FakeClock()
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=10, latency_tolerance=2, backoff_ratio=0.5, clock=clock)
+
+    with limiter.acquire():
+        clock.advance(1)
+    limit = limiter.limit
+
+    with limiter.acquire():
+        clock.advance(3)
+
+    assert_that(limiter.limit, equal_to(limit * 0.5))
+
+
+def test_limit_does_not_decrease_below_min_limit():
+    clock = FakeClock()
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, min_limit=2, backoff_ratio=0.5, clock=clock)
+
+    with limiter.acquire():
+        clock.advance(1)
+
+    with limiter.acquire():
+        clock.advance(10)
+
+    assert_that(limiter.limit, equal_to(2))
+
+
+def test_limit_decreases_at_most_once_per_limit_of_requests():
+    clock = FakeClock()
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=10, backoff_ratio=0.5, clock=clock)
+
+    with limiter.acquire():
+        clock.advance(1)
+
+    for _ in range(3):
+        with limiter.acquire():
+            clock.advance(3)
+
+    assert_that(limiter.limit, equal_to((10 + 1 / 10) * 0.5))
+
+
+def test_latency_of_mixed_workload_is_normalized_by_cost():
+    clock = FakeClock()
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=100, max_limit=100, clock=clock)
+
+    for index in range(1000):
+        cost = 10 if index % 10 == 0 else 1
+        with limiter.acquire(cost):
+            clock.advance(cost * 1.5 if index % 2 == 0 else cost)
+
+    assert_that(limiter.limit, equal_to(100))
+
+def test_query_cost_is_number_of_object_queries():
+    Author = g.ObjectType("Author", fields=lambda: (
+        g.field("name", type=g.String),
+    ))
+    Book = g.ObjectType("Book", fields=lambda: (
+        g.field("author", type=Author),
+        g.field("title", type=g.String),
+    ))
+
+    query = g.ListType(Book)(
+        g.key("title", Book.fields.title()),
+        g.key("author", Book.fields.author(
+            g.key("name", Author.fields.name()),
+        )),
+    )
+
+    assert_that(query_cost(query), equal_to(2))
+
+
+class FakeClock(object):
+    def __init__(self):
+        self._now = 0
+
+    def __call__(self):
+        return self._now
+
+    def advance(self, seconds):
+        self._now += seconds
@@ -0,0 +1,305 @@
+import asyncio
+import threading
+import time
+
+from precisely import assert_that, contains_exactly, equal_to, has_attrs, is_instance, not_
+import pytest
+
+import graphlayer as g
+from graphlayer import graphql
+from graphlayer.graphql.coalescing import execution_key, SingleFlight
+
+
+def test_concurrent_calls_with_same_key_share_one_execution():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def func():
+        calls.append(None)
+        started.set()
+        release.wait()
+        return calls
+
+    results = []
+
+    def call():
+        results.append(single_flight.call("key", func))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    wait_for_waiters(single_flight, 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert_that(len(calls), equal_to(1))
+    assert_that(results, contains_exactly(calls, calls, calls))
+
+
+def test_when_execution_raises_error_then_error_is_raised_to_caller():
+    single_flight = SingleFlight()
+
+    def func():
+        raise g.GraphError("failed")
+
+    error = pytest.raises(g.GraphError, lambda: single_flight.call("key", func))
+
+    assert_that(str(error.value), equal_to("failed"))
+
+
+def test_calls_after_execution_has_completed_execute_again():
+    single_flight = SingleFlight()
+    calls = []
+
+    def func():
+        calls.append(None)
+        return len(calls)
+
+    assert_that(single_flight.call("key", func), equal_to(1))
+    assert_that(single_flight.call("key", func), equal_to(2))
+
+
+def test_when_deadline_of_waiter_passes_then_waiter_stops_waiting():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def func():
+        started.set()
+        release.wait()
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(single_flight.call("key", func)))
+    leader.start()
+    started.wait()
+
+    start = time.monotonic()
+    with g.deadline(0.05):
+        pytest.raises(g.DeadlineExceededError, lambda: single_flight.call("key", func))
+    duration = time.monotonic() - start
+
+    release.set()
+    leader.join()
+
+    assert_that(duration < 1, equal_to(True))
+    assert_that(results, contains_exactly("result"))
+
+def test_when_deadline_of_leader_passes_then_execution_continues_for_waiters():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    deadlines = []
+
+    def func():
+        deadlines.append(g.current_deadline())
+        release.wait()
+        return "result"
+
+    with g.deadline(0.05):
+        pytest.raises(g.DeadlineExceededError, lambda: single_flight.call("key", func))
+
+    results = []
+
+    def wait():
+        with g.deadline(10):
+            results.append(single_flight.call("key", func))
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    wait_for_waiters(single_flight, 1)
+    release.set()
+    waiter.join()
+
+    assert_that(results, contains_exactly("result"))
+    assert_that(deadlines, contains_exactly(None))
+
+def test_concurrent_async_calls_with_same_key_share_one_execution():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def func():
+        calls.append(None)
+        call_count = len(calls)
+        await asyncio.sleep(0)
+        return call_count
+
+    async def run():
+        return await asyncio.gather(
+            single_flight.call_async("key", func),
+            single_flight.call_async("key", func),
+            single_flight.call_async("other", func),
+        )
+
+    results = asyncio.run(run())
+
+    assert_that(results, contains_exactly(1, 1, 2))
+    assert_that(single_flight._tasks, equal_to({}))
+
+
+def test_cancelling_async_waiter_does_not_cancel_shared_execution():
+    single_flight = SingleFlight()
+
+    async def func():
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        cancelled = asyncio.ensure_future(single_flight.call_async("key", func))
+        waiter = asyncio.ensure_future(single_flight.call_async("key", func))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await waiter
+
+    assert_that(asyncio.run(run()), equal_to("result"))
+
+
+def test_when_deadline_of_async_waiter_passes_then_waiter_stops_waiting():
+    single_flight = SingleFlight()
+
+    async def func():
+        await asyncio.sleep(0.2)
+        return "result"
+
+    async def wait_with_deadline():
+        with g.deadline(0.01):
+            await single_flight.call_async("key", func)
+
+    async def run():
+        leader = asyncio.ensure_future(single_flight.call_async("key", func))
+        await asyncio.sleep(0)
+        error = await asyncio.gather(wait_with_deadline(), return_exceptions=True)
+        return error, await leader
+
+    (error, ), result = asyncio.run(run())
+
+    assert_that(error, is_instance(g.DeadlineExceededError))
+    assert_that(result, equal_to("result"))
+
+def test_when_deadline_of_async_leader_passes_then_execution_continues_for_waiters():
+    single_flight = SingleFlight()
+
+    async def func():
+        await asyncio.sleep(0.05)
+        return g.current_deadline()
+
+    async def call(timeout):
+        with g.deadline(timeout):
+            return await single_flight.call_async("key", func)
+
+    async def run():
+        return await asyncio.gather(call(0.01), call(10), return_exceptions=True)
+
+    leader_result, waiter_result = asyncio.run(run())
+
+    assert_that(leader_result, is_instance(g.DeadlineExceededError))
+    assert_that(waiter_result, equal_to(None))
+
+def test_execution_key_normalizes_order_of_variables():
+    assert_that(
+        execution_key("{ value }", {"a": 1, "b": 2}),
+        equal_to(execution_key("{ value }", {"b": 2, "a": 1})),
+    )
+    assert_that(
+        execution_key("{ value }", {"a": 1}),
+        not_(equal_to(execution_key("{ value }", {"a": 2}))),
+    )
+
+
+def test_executor_shares_resolution_of_concurrent_identical_queries():
+    Root = g.ObjectType("Root", fields=(
+        g.field("value", g.Int),
+    ))
+    Mutation = g.ObjectType("Mutation", fields=(
+        g.field("value", g.Int),
+    ))
+
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    root_resolver = g.root_object_resolver(Root)
+
+    @root_resolver.field(Root.fields.value)
+    def root_resolve_value(graph, query, args):
+        calls.append("query")
+        started.set()
+        release.wait()
+        return 42
+
+    mutation_resolver = g.root_object_resolver(Mutation)
+
+    @mutation_resolver.field(Mutation.fields.value)
+    def mutation_resolve_value(graph, query, args):
+        calls.append("mutation")
+        return 1
+
+    graph = g.define_graph(resolvers=(root_resolver, mutation_resolver)).create_graph({})
+    single_flight = SingleFlight()
+    execute = graphql.executor(query_type=Root, mutation_type=Mutation, single_flight=single_flight)
+    results = []
+
+    def run():
+        results.append(execute(graph=graph, document_text="query { value }"))
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    wait_for_waiters(single_flight, 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    execute(graph=graph, document_text="mutation { value }")
+    execute(graph=graph, document_text="mutation { value }")
+
+    assert_that(calls, contains_exactly("query", "mutation", "mutation"))
+    assert_that(results, contains_exactly(
+        has_attrs(data={"value": 42}, errors=None),
+        has_attrs(data={"value": 42}, errors=None),
+        has_attrs(data={"value": 42}, errors=None),
+    ))
+
+
+def test_executor_does_not_wait_for_shared_resolution_beyond_timeout_of_caller():
+    Root = g.ObjectType("Root", fields=(
+        g.field("value", g.Int),
+    ))
+
+    started = threading.Event()
+    release = threading.Event()
+
+    root_resolver = g.root_object_resolver(Root)
+
+    @root_resolver.field(Root.fields.value)
+    def root_resolve_value(graph, query, args):
+        started.set()
+        release.wait()
+        return 42
+
+    graph = g.define_graph(resolvers=(root_resolver, )).create_graph({})
+    execute = graphql.executor(query_type=Root, single_flight=SingleFlight())
+    results = []
+
+    leader = threading.Thread(target=lambda: results.append(execute(graph=graph, document_text="query { value }")))
+    leader.start()
+    started.wait()
+
+    waiter_result = execute(graph=graph, document_text="query { value }", timeout=0.05)
+
+    release.set()
+    leader.join()
+
+    assert_that(waiter_result, has_attrs(data=None, errors=contains_exactly(has_attrs(message="deadline exceeded"))))
+    assert_that(results, contains_exactly(has_attrs(data={"value": 42}, errors=None)))
+
+
+def wait_for_waiters(single_flight, count):
+    while sum(call.waiters for call in list(single_flight._calls.values())) < count:
+        time.sleep(0.001)
@@ -1,7 +1,14 @@
-from precisely import all_of, assert_that, contains_exactly, equal_to, has_attrs, has_feature, is_instance
+import contextlib
+import json
+
+from precisely import all_of, assert_that, contains_exactly, equal_to, has_attrs, has_feature, is_instance, is_mapping, starts_with
+import sqlalchemy.ext.declarative
+import sqlalchemy.orm
 
 import graphlayer as g
 from graphlayer import graphql
+import graphlayer.sqlalchemy as gsql
+from graphlayer.graphql.admission import AdaptiveConcurrencyLimiter, query_cost
 from graphql import GraphQLError
 
 
@@ -227,6 +234,180 @@ def test_when_resolution_raises_graph_error_then_result_is_invalid():
     )))
 
 
+def test_graph_can_be_created_for_operation_type():
+    QueryRoot = g.ObjectType("Query", fields=(
+        g.field("value", g.String),
+    ))
+    MutationRoot = g.ObjectType("Mutation", fields=(
+        g.field("value", g.String),
+    ))
+
+    query_root_resolver = g.root_object_resolver(QueryRoot)
+
+    @query_root_resolver.field(QueryRoot.fields.value)
+    @g.dependencies(operation_type="operation_type")
+    def query_root_resolve_value(graph, query, args, *, operation_type):
+        return operation_type
+
+    mutation_root_resolver = g.root_object_resolver(MutationRoot)
+
+    @mutation_root_resolver.field(MutationRoot.fields.value)
+    @g.dependencies(operation_type="operation_type")
+    def mutation_root_resolve_value(graph, query, args, *, operation_type):
+        return operation_type
+
+    graph_definition = g.define_graph(resolvers=(query_root_resolver, mutation_root_resolver))
+    closed_operation_types = []
+
+    @contextlib.contextmanager
+    def create_graph(operation_type):
+        yield graph_definition.create_graph({"operation_type": operation_type})
+        closed_operation_types.append(operation_type)
+
+    execute = graphql.executor(query_type=QueryRoot, mutation_type=MutationRoot)
+    query_result = execute(create_graph=create_graph, document_text="query { value }")
+    mutation_result = execute(create_graph=create_graph, document_text="mutation { value }")
+
+    assert_that(query_result, is_success(data=equal_to({"value": "query"})))
+    assert_that(mutation_result, is_success(data=equal_to({"value": "mutation"})))
+    assert_that(closed_operation_types, contains_exactly("query", "mutation"))
+
+
+def test_when_timeout_has_passed_then_error_is_returned():
+    Root = g.ObjectType("Root", fields=(
+        g.field("value", g.String),
+    ))
+
+    root_resolver = g.root_object_resolver(Root)
+
+    @root_resolver.field(Root.fields.value)
+    def root_resolve_value(graph, query, args):
+        return "resolved"
+
+    graph_definition = g.define_graph(resolvers=(root_resolver, ))
+    graph = graph_definition.create_graph({})
+
+    execute = graphql.executor(query_type=Root)
+
+    assert_that(
+        execute(graph=graph, document_text="{ value }", timeout=10),
+        is_success(data=equal_to({"value": "resolved"})),
+    )
+    assert_that(
+        execute(graph=graph, document_text="{ value }", timeout=0),
+        is_invalid(errors=contains_exactly(
+            all_of(
+                is_instance(GraphQLError),
+                has_str("deadline exceeded"),
+            ),
+        )),
+    )
+
+
+def test_when_statements_are_recorded_then_statements_are_added_to_result_extensions():
+    Base = sqlalchemy.ext.declarative.declarative_base()
+
+    class BookRow(Base):
+        __tablename__ = "book"
+
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+    Base.metadata.create_all(engine)
+
+    session = sqlalchemy.orm.Session(engine)
+    session.add(BookRow(c_id=1, c_title="Leave it to Psmith"))
+    session.commit()
+
+    Book = g.ObjectType("Book", fields=lambda: (
+        g.field("title", type=g.String),
+    ))
+
+    Root = g.ObjectType("Root", fields=lambda: (
+        g.field("books", type=g.ListType(Book)),
+    ))
+
+    root_resolver = g.root_object_resolver(Root)
+
+    @root_resolver.field(Root.fields.books)
+    def root_resolve_books(graph, query, args):
+        return graph.resolve(gsql.select(query).where(BookRow.c_id == 1))
+
+    book_resolver = gsql.sql_table_resolver(
+        Book,
+        BookRow,
+        fields={
+            Book.fields.title: gsql.expression(BookRow.c_title),
+        },
+    )
+
+    graph_definition = g.define_graph(resolvers=(root_resolver, book_resolver))
+    graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
+
+    result = graphql.execute(graph=graph, document_text="{ books { title } }", query_type=Root, record_statements=True)
+
+    assert_that(result, is_success(data=equal_to({"books": [{"title": "Leave it to Psmith"}]})))
+    assert_that(json.loads(json.dumps(result.formatted)), is_mapping({
+        "data": equal_to({"books": [{"title": "Leave it to Psmith"}]}),
+        "extensions": is_mapping({"statements": contains_exactly(
+            is_mapping({
+                "sql": starts_with("SELECT book.c_title"),
+                "parameters": equal_to({"c_id_1": 1}),
+                "durationMs": is_instance(float),
+                "rowCount": equal_to(1),
+                "type": equal_to("Book"),
+                "path": equal_to([]),
+            }),
+        )}),
+    }))
+
+    result = graphql.execute(graph=graph, document_text="{ books { title } }", query_type=Root)
+
+    assert_that(result.extensions, equal_to(None))
+
+
+def test_when_limiter_rejects_request_then_error_is_returned():
+    Root = g.ObjectType("Root", fields=(
+        g.field("value", g.String),
+    ))
+
+    root_resolver = g.root_object_resolver(Root)
+
+    @root_resolver.field(Root.fields.value)
+    def root_resolve_value(graph, query, args):
+        return "resolved"
+
+    graph_definition = g.define_graph(resolvers=(root_resolver, ))
+    graph = graph_definition.create_graph({})
+
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2)
+    costs = []
+
+    def cost(query):
+        costs.append(query_cost(query))
+        return query_cost(query)
+
+    execute = graphql.executor(query_type=Root, limiter=limiter, cost=cost)
+
+    assert_that(
+        execute(graph=graph, document_text="{ value }"),
+        is_success(data=equal_to({"value": "resolved"})),
+    )
+
+    with limiter.acquire(2):
+        result = execute(graph=graph, document_text="{ value }")
+
+    assert_that(result, is_invalid(errors=contains_exactly(
+        all_of(
+            is_instance(GraphQLError),
+            has_str("server is overloaded"),
+        ),
+    )))
+    assert_that(costs, contains_exactly(1, 1))
+
+
 def is_invalid(*, errors):
     return has_attrs(errors=errors, data=None)
 
@@ -63,6 +63,33 @@ def test_simple_mutation_is_converted_to_object_query():
     ))
 
 
+@pytest.mark.parametrize("operation", ["query", "mutation"])
+def test_operation_type_is_read_from_operation(operation):
+    QueryRoot = g.ObjectType(
+        "Query",
+        (
+            g.field("value", type=g.Int),
+        ),
+    )
+    MutationRoot = g.ObjectType(
+        "Mutation",
+        (
+            g.field("value", type=g.Int),
+        ),
+    )
+
+    graphql_query = """
+        %s {
+            value
+        }
+    """ % operation
+
+    schema = create_graphql_schema(query_type=QueryRoot, mutation_type=MutationRoot)
+    query = document_text_to_query(graphql_query, graphql_schema=schema)
+
+    assert_that(query.operation_type, equal_to(operation))
+
+
 def test_given_no_mutation_type_is_defined_when_operation_is_mutation_then_error_is_raised():
     QueryRoot = g.ObjectType(
         "Query",
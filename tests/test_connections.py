@@ -1,8 +1,12 @@
+import datetime
+import decimal
+
 from precisely import assert_that, contains_exactly, equal_to, has_attrs
 import pytest
 
 import graphlayer as g
 import graphlayer.connections
+from graphlayer.core import Injector
 
 
 Book = g.ObjectType(
@@ -60,10 +64,81 @@ BooksConnection = books_connection.Connection
 BookEdge = books_connection.Edge
 PageInfo = graphlayer.connections.PageInfo
 
+
+@g.dependencies(books="all_books")
+def fetch_book_edges(graph, node_query, *, after_cursor, limit, books):
+    book_cursors = fetch_book_cursors(after_cursor=after_cursor, limit=limit, books=books)
+
+    if node_query is None:
+        return [(book_cursor, None) for book_cursor in book_cursors]
+    else:
+        nodes = graph.resolve(select_books_by_id(node_query, book_cursors))
+        return [(book_cursor, nodes[book_cursor]) for book_cursor in book_cursors]
+
+
+books_edges_connection = graphlayer.connections.forward_connection(
+    connection_type_name="BooksEdgesConnection",
+    node_type=Book,
+    fetch_edges=fetch_book_edges,
+    cursor_encoding=graphlayer.connections.int_cursor_encoding,
+)
+
+BooksEdgesConnection = books_edges_connection.Connection
+BooksEdgesEdge = books_edges_connection.Edge
+
+
+@g.dependencies(books="all_books")
+def fetch_book_cursors_before(*, before_cursor, limit, books):
+    return [
+        book_id
+        for book_id in reversed(list(books))
+        if before_cursor is None or book_id < before_cursor
+    ][:limit]
+
+
+books_backward_connection = graphlayer.connections.backward_connection(
+    connection_type_name="BooksBackwardConnection",
+    node_type=Book,
+    select_by_cursor=select_books_by_id,
+    cursor_encoding=graphlayer.connections.int_cursor_encoding,
+    fetch_cursors=fetch_book_cursors_before,
+)
+
+BooksBackwardConnection = books_backward_connection.Connection
+
+
+@g.dependencies(books="all_books")
+def fetch_book_cursors_between(*, after_cursor, before_cursor, limit, reverse, books):
+    book_ids = [
+        book_id
+        for book_id in books
+        if (after_cursor is None or book_id > after_cursor) and (before_cursor is None or book_id < before_cursor)
+    ]
+
+    if reverse:
+        book_ids.reverse()
+
+    return book_ids[:limit]
+
+
+books_bidirectional_connection = graphlayer.connections.bidirectional_connection(
+    connection_type_name="BooksBidirectionalConnection",
+    node_type=Book,
+    select_by_cursor=select_books_by_id,
+    cursor_encoding=graphlayer.connections.int_cursor_encoding,
+    fetch_cursors=fetch_book_cursors_between,
+)
+
+BooksBidirectionalConnection = books_bidirectional_connection.Connection
+BooksBidirectionalEdge = books_bidirectional_connection.Edge
+
 Query = g.ObjectType(
     "Query",
     fields=lambda: (
         books_connection.field("books_connection"),
+        books_edges_connection.field("books_edges_connection"),
+        books_backward_connection.field("books_backward_connection"),
+        books_bidirectional_connection.field("books_bidirectional_connection"),
     ),
 )
 
@@ -73,7 +148,26 @@ resolve_query = g.root_object_resolver(Query)
 def resolve_query_field_books_connection(graph, query, args):
     return graph.resolve(books_connection.select_field(query, args=args))
 
-resolvers = (resolve_books, books_connection.resolvers, resolve_query)
+@resolve_query.field(Query.fields.books_edges_connection)
+def resolve_query_field_books_edges_connection(graph, query, args):
+    return graph.resolve(books_edges_connection.select_field(query, args=args))
+
+@resolve_query.field(Query.fields.books_backward_connection)
+def resolve_query_field_books_backward_connection(graph, query, args):
+    return graph.resolve(books_backward_connection.select_field(query, args=args))
+
+@resolve_query.field(Query.fields.books_bidirectional_connection)
+def resolve_query_field_books_bidirectional_connection(graph, query, args):
+    return graph.resolve(books_bidirectional_connection.select_field(query, args=args))
+
+resolvers = (
+    resolve_books,
+    books_connection.resolvers,
+    books_edges_connection.resolvers,
+    books_backward_connection.resolvers,
+    books_bidirectional_connection.resolvers,
+    resolve_query,
+)
 
 graph_definition = g.define_graph(resolvers)
 
@@ -350,3 +444,298 @@ def test_when_first_is_negative_then_error_is_raised():
     error = pytest.raises(g.GraphError, lambda: graph.resolve(query))
 
     assert_that(str(error.value), equal_to("first must be non-negative integer, was -1"))
+
+
+def test_when_fetch_edges_is_set_then_edges_and_nodes_are_fetched_together():
+    graph = create_graph({
+        42: "Leave it to Psmith",
+        43: "The Gentleman's Guide to Vice and Virtue",
+        44: "Catch-22",
+    })
+
+    result = graph.resolve(
+        Query(
+            g.key("books", Query.fields.books_edges_connection(
+                Query.fields.books_edges_connection.params.first(2),
+
+                g.key("edges", BooksEdgesConnection.fields.edges(
+                    g.key("node", BooksEdgesEdge.fields.node(
+                        g.key("name", Book.fields.title()),
+                    )),
+                )),
+                g.key("nodes", BooksEdgesConnection.fields.nodes(
+                    g.key("title", Book.fields.title()),
+                )),
+                g.key("page_info", BooksEdgesConnection.fields.page_info(
+                    g.key("has_next_page", PageInfo.fields.has_next_page()),
+                )),
+            )),
+        )
+    )
+
+    assert_that(result.books, has_attrs(
+        edges=contains_exactly(
+            has_attrs(node=equal_to(g.Object({"name": "Leave it to Psmith"}))),
+            has_attrs(node=equal_to(g.Object({"name": "The Gentleman's Guide to Vice and Virtue"}))),
+        ),
+        nodes=contains_exactly(
+            equal_to(g.Object({"title": "Leave it to Psmith"})),
+            equal_to(g.Object({"title": "The Gentleman's Guide to Vice and Virtue"})),
+        ),
+        page_info=has_attrs(has_next_page=True),
+    ))
+
+
+def test_when_edges_and_nodes_are_both_selected_then_nodes_are_resolved_once():
+    book_queries = []
+
+    @g.resolver(BookQuery)
+    @g.dependencies(books="all_books")
+    def resolve_books_and_record_query(graph, query, books):
+        book_queries.append(query)
+        return resolve_books(graph, query, books=books)
+
+    graph = g.define_graph((resolve_books_and_record_query, books_connection.resolvers, resolve_query)).create_graph({
+        "all_books": {
+            42: "Leave it to Psmith",
+            43: "The Gentleman's Guide to Vice and Virtue",
+            44: "Catch-22",
+        },
+    })
+
+    result = graph.resolve(
+        Query(
+            g.key("books", Query.fields.books_connection(
+                Query.fields.books_connection.params.first(2),
+
+                g.key("edges", BooksConnection.fields.edges(
+                    g.key("node", BookEdge.fields.node(
+                        g.key("name", Book.fields.title()),
+                    )),
+                )),
+                g.key("nodes", BooksConnection.fields.nodes(
+                    g.key("title", Book.fields.title()),
+                )),
+            )),
+        )
+    )
+
+    assert_that(result.books, has_attrs(
+        edges=contains_exactly(
+            has_attrs(node=equal_to(g.Object({"name": "Leave it to Psmith"}))),
+            has_attrs(node=equal_to(g.Object({"name": "The Gentleman's Guide to Vice and Virtue"}))),
+        ),
+        nodes=contains_exactly(
+            equal_to(g.Object({"title": "Leave it to Psmith"})),
+            equal_to(g.Object({"title": "The Gentleman's Guide to Vice and Virtue"})),
+        ),
+    ))
+    assert_that(book_queries, contains_exactly(has_attrs(ids=[42, 43])))
+
+
+def test_backward_connection_fetches_last_edges_in_order():
+    graph = create_graph({
+        42: "Leave it to Psmith",
+        43: "The Gentleman's Guide to Vice and Virtue",
+        44: "Catch-22",
+    })
+
+    def fetch(*, before):
+        return graph.resolve(
+            Query(
+                g.key("books", Query.fields.books_backward_connection(
+                    Query.fields.books_backward_connection.params.last(2),
+                    Query.fields.books_backward_connection.params.before(before),
+
+                    g.key("nodes", BooksBackwardConnection.fields.nodes(
+                        g.key("title", Book.fields.title()),
+                    )),
+                    g.key("page_info", BooksBackwardConnection.fields.page_info(
+                        g.key("start_cursor", PageInfo.fields.start_cursor()),
+                        g.key("has_next_page", PageInfo.fields.has_next_page()),
+                        g.key("has_previous_page", PageInfo.fields.has_previous_page()),
+                    )),
+                )),
+            )
+        )
+
+    result = fetch(before=None)
+    assert_that(result.books, has_attrs(
+        nodes=contains_exactly(
+            has_attrs(title="The Gentleman's Guide to Vice and Virtue"),
+            has_attrs(title="Catch-22"),
+        ),
+        page_info=has_attrs(has_next_page=False, has_previous_page=True),
+    ))
+
+    result = fetch(before=result.books.page_info.start_cursor)
+    assert_that(result.books, has_attrs(
+        nodes=contains_exactly(
+            has_attrs(title="Leave it to Psmith"),
+        ),
+        page_info=has_attrs(has_next_page=False, has_previous_page=False),
+    ))
+
+
+def test_when_last_is_negative_then_error_is_raised():
+    graph = create_graph({})
+
+    query = Query(
+        g.key("books", Query.fields.books_backward_connection(
+            Query.fields.books_backward_connection.params.last(-1),
+            g.key("page_info", BooksBackwardConnection.fields.page_info(
+                g.key("has_previous_page", PageInfo.fields.has_previous_page()),
+            )),
+        )),
+    )
+
+    error = pytest.raises(g.GraphError, lambda: graph.resolve(query))
+
+    assert_that(str(error.value), equal_to("last must be non-negative integer, was -1"))
+
+
+class TestBidirectionalConnection(object):
+    books = {
+        42: "Leave it to Psmith",
+        43: "The Gentleman's Guide to Vice and Virtue",
+        44: "Catch-22",
+        45: "Pericles, Prince of Tyre",
+    }
+
+    def fetch(self, *args):
+        graph = create_graph(self.books)
+
+        return graph.resolve(
+            Query(
+                g.key("books", Query.fields.books_bidirectional_connection(
+                    *args,
+
+                    g.key("edges", BooksBidirectionalConnection.fields.edges(
+                        g.key("cursor", BooksBidirectionalEdge.fields.cursor()),
+                    )),
+                    g.key("nodes", BooksBidirectionalConnection.fields.nodes(
+                        g.key("title", Book.fields.title()),
+                    )),
+                    g.key("page_info", BooksBidirectionalConnection.fields.page_info(
+                        g.key("has_next_page", PageInfo.fields.has_next_page()),
+                        g.key("has_previous_page", PageInfo.fields.has_previous_page()),
+                    )),
+                )),
+            )
+        )
+
+    def test_first_and_after_page_forwards(self):
+        params = Query.fields.books_bidirectional_connection.params
+
+        result = self.fetch(params.first(2))
+        result = self.fetch(params.first(2), params.after(result.books.edges[0].cursor))
+
+        assert_that(result.books, has_attrs(
+            nodes=contains_exactly(
+                has_attrs(title="The Gentleman's Guide to Vice and Virtue"),
+                has_attrs(title="Catch-22"),
+            ),
+            page_info=has_attrs(has_next_page=True, has_previous_page=False),
+        ))
+
+    def test_last_and_before_page_backwards(self):
+        params = Query.fields.books_bidirectional_connection.params
+
+        result = self.fetch(params.last(2))
+        result = self.fetch(params.last(2), params.before(result.books.edges[-1].cursor))
+
+        assert_that(result.books, has_attrs(
+            nodes=contains_exactly(
+                has_attrs(title="The Gentleman's Guide to Vice and Virtue"),
+                has_attrs(title="Catch-22"),
+            ),
+            page_info=has_attrs(has_next_page=False, has_previous_page=True),
+        ))
+
+    def test_after_and_before_can_be_combined(self):
+        params = Query.fields.books_bidirectional_connection.params
+
+        edges = self.fetch(params.first(4)).books.edges
+        result = self.fetch(params.last(4), params.after(edges[0].cursor), params.before(edges[3].cursor))
+
+        assert_that(result.books, has_attrs(
+            nodes=contains_exactly(
+                has_attrs(title="The Gentleman's Guide to Vice and Virtue"),
+                has_attrs(title="Catch-22"),
+            ),
+            page_info=has_attrs(has_next_page=False, has_previous_page=False),
+        ))
+
+    def test_when_neither_first_nor_last_is_set_then_error_is_raised(self):
+        error = pytest.raises(g.GraphError, lambda: self.fetch())
+
+        assert_that(str(error.value), equal_to("one of first or last must be set"))
+
+    def test_when_first_and_last_are_both_set_then_error_is_raised(self):
+        params = Query.fields.books_bidirectional_connection.params
+
+        error = pytest.raises(g.GraphError, lambda: self.fetch(params.first(1), params.last(1)))
+
+        assert_that(str(error.value), equal_to("first and last cannot both be set"))
+
+
+class TestTupleCursorEncoding(object):
+    @pytest.mark.parametrize("element_types, cursor", [
+        ((int, ), (42, )),
+        ((int, int), (-1, 2 ** 70)),
+        ((str, int), ("Leave it to Psmith", 42)),
+        ((str, ), ("été", )),
+        ((datetime.datetime, int), (datetime.datetime(1923, 6, 30, 12, 1, 2, 345), 42)),
+        ((datetime.datetime, ), (datetime.datetime(2001, 2, 3, 4, 5, 6, tzinfo=datetime.timezone(datetime.timedelta(hours=-5))), )),
+        ((decimal.Decimal, int), (decimal.Decimal("-12.340"), 1)),
+    ])
+    def test_decoding_encoded_cursor_returns_original_cursor(self, element_types, cursor):
+        cursor_encoding = graphlayer.connections.tuple_cursor_encoding(*element_types)
+
+        result = cursor_encoding.decode(cursor_encoding.encode(cursor))
+
+        assert_that(result, equal_to(cursor))
+
+    def test_timezone_offset_of_datetime_is_preserved(self):
+        cursor_encoding = graphlayer.connections.tuple_cursor_encoding(datetime.datetime)
+        offset = datetime.timedelta(hours=5, minutes=30)
+        value = datetime.datetime(2001, 2, 3, 4, 5, 6, tzinfo=datetime.timezone(offset))
+
+        result, = cursor_encoding.decode(cursor_encoding.encode((value, )))
+
+        assert_that(result.utcoffset(), equal_to(offset))
+
+    def test_when_cursor_is_invalid_then_error_is_raised(self):
+        cursor_encoding = graphlayer.connections.tuple_cursor_encoding(str, int)
+
+        error = pytest.raises(g.GraphError, lambda: cursor_encoding.decode("AAAA"))
+
+        assert_that(str(error.value), equal_to("invalid cursor: AAAA"))
+
+    def test_when_cursor_has_trailing_data_then_error_is_raised(self):
+        cursor_encoding = graphlayer.connections.tuple_cursor_encoding(int)
+        cursor = graphlayer.connections.tuple_cursor_encoding(int, int).encode((1, 2))
+
+        pytest.raises(g.GraphError, lambda: cursor_encoding.decode(cursor))
+
+
+class TestCachedTotalCount(object):
+    def test_count_is_reused_until_ttl_expires(self):
+        counts = [3, 4]
+        now = [0]
+
+        def count():
+            return counts.pop(0)
+
+        total_count = graphlayer.connections.cached_total_count(
+            graphlayer.connections.exact_total_count(count),
+            ttl=10,
+            clock=lambda: now[0],
+        )
+        injector = Injector({})
+
+        assert_that(total_count.fetch(injector, page_total_count=None), equal_to(3))
+        now[0] = 9
+        assert_that(total_count.fetch(injector, page_total_count=None), equal_to(3))
+        now[0] = 10
+        assert_that(total_count.fetch(injector, page_total_count=None), equal_to(4))
@@ -51,3 +51,72 @@ def test_when_resolve_cannot_be_found_then_error_is_raised():
     error = pytest.raises(g.GraphError, lambda: graph.resolve(Query))
 
     assert_that(str(error.value), equal_to("could not find resolver for query of type: one"))
+
+
+class TestDeadline(object):
+    def test_resolvers_can_read_current_deadline(self):
+        clock = FakeClock()
+
+        @g.resolver("root")
+        def resolve_root(graph, query):
+            return g.current_deadline().remaining()
+
+        class Query(object):
+            type = "root"
+
+        graph = g.create_graph([resolve_root])
+
+        with g.deadline(5, clock=clock):
+            clock.advance(2)
+            result = graph.resolve(Query)
+
+        assert_that(result, equal_to(3))
+        assert_that(g.current_deadline(), equal_to(None))
+
+    def test_when_deadline_has_passed_then_remaining_resolution_is_stopped(self):
+        clock = FakeClock()
+        resolved = []
+
+        @g.resolver("root")
+        def resolve_root(graph, query):
+            resolved.append("root")
+            clock.advance(2)
+            return graph.resolve(Query("leaf"))
+
+        @g.resolver("leaf")
+        def resolve_leaf(graph, query):
+            resolved.append("leaf")
+            return 42
+
+        class Query(object):
+            def __init__(self, type):
+                self.type = type
+
+        graph = g.create_graph([resolve_root, resolve_leaf])
+
+        with g.deadline(1, clock=clock):
+            error = pytest.raises(g.DeadlineExceededError, lambda: graph.resolve(Query("root")))
+
+        assert_that(str(error.value), equal_to("deadline exceeded"))
+        assert_that(resolved, equal_to(["root"]))
+
+    def test_nested_deadline_cannot_extend_current_deadline(self):
+        clock = FakeClock()
+
+        with g.deadline(1, clock=clock) as outer:
+            with g.deadline(5, clock=clock) as inner:
+                assert_that(inner, equal_to(outer))
+
+            with g.deadline(0.5, clock=clock) as inner:
+                assert_that(inner.remaining(), equal_to(0.5))
+
+
+class FakeClock(object):
+    def __init__(self):
+        self._now = 0
+
+    def __call__(self):
+        return self._now
+
+    def advance(self, seconds):
+        self._now += seconds
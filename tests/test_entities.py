@@ -0,0 +1,85 @@
+from precisely import assert_that, equal_to
+
+import graphlayer as g
+from graphlayer.entities import EntityCache, is_cacheable
+
+
+def test_values_are_cached_by_type_and_id():
+    User = g.ObjectType("User", fields=(
+        g.field("name", type=g.String),
+    ))
+    Book = g.ObjectType("Book", fields=(
+        g.field("title", type=g.String),
+    ))
+    cache = EntityCache(ttl=60)
+
+    cache.set(User, 1, {User.fields.name: "Bob"})
+
+    assert_that(cache.get(User, 1, [User.fields.name]), equal_to({User.fields.name: "Bob"}))
+    assert_that(cache.get(User, 2, [User.fields.name]), equal_to({}))
+    assert_that(cache.get(Book, 1, [Book.fields.title]), equal_to({}))
+
+
+def test_only_requested_fields_are_returned():
+    User = g.ObjectType("User", fields=(
+        g.field("name", type=g.String),
+        g.field("email_address", type=g.String),
+    ))
+    cache = EntityCache(ttl=60)
+
+    cache.set(User, 1, {User.fields.name: "Bob", User.fields.email_address: "bob@example.com"})
+
+    assert_that(cache.get(User, 1, [User.fields.name]), equal_to({User.fields.name: "Bob"}))
+
+
+def test_values_expire_after_ttl():
+    User = g.ObjectType("User", fields=(
+        g.field("name", type=g.String),
+        g.field("email_address", type=g.String),
+    ))
+    now = [0]
+    cache = EntityCache(ttl=60, clock=lambda: now[0])
+
+    cache.set(User, 1, {User.fields.name: "Bob"})
+    now[0] = 30
+    cache.set(User, 1, {User.fields.email_address: "bob@example.com"})
+    now[0] = 61
+
+    assert_that(
+        cache.get(User, 1, [User.fields.name, User.fields.email_address]),
+        equal_to({User.fields.email_address: "bob@example.com"}),
+    )
+
+
+def test_entities_can_be_invalidated():
+    User = g.ObjectType("User", fields=(
+        g.field("name", type=g.String),
+    ))
+    cache = EntityCache(ttl=60)
+    cache.set(User, 1, {User.fields.name: "Bob"})
+    cache.set(User, 2, {User.fields.name: "Jim"})
+
+    cache.invalidate(User, 1)
+
+    assert_that(cache.get(User, 1, [User.fields.name]), equal_to({}))
+    assert_that(cache.get(User, 2, [User.fields.name]), equal_to({User.fields.name: "Jim"}))
+
+    cache.invalidate_type(User)
+
+    assert_that(cache.get(User, 2, [User.fields.name]), equal_to({}))
+
+
+def test_only_leaf_fields_without_params_are_cacheable():
+    User = g.ObjectType("User", fields=lambda: (
+        g.field("name", type=g.String),
+        g.field("nicknames", type=g.ListType(g.String)),
+        g.field("initials", type=g.String, params=(
+            g.param("length", type=g.Int, default=1),
+        )),
+        g.field("friend", type=User),
+    ))
+
+    assert_that(is_cacheable(User.fields.name()), equal_to(True))
+    assert_that(is_cacheable(User.fields.nicknames()), equal_to(True))
+    assert_that(is_cacheable(User.fields.initials()), equal_to(False))
+    assert_that(is_cacheable(User.fields.friend(User.fields.name())), equal_to(False))
@@ -5,6 +5,7 @@ import pytest
 
 import graphlayer as g
 from graphlayer import schema
+from graphlayer.entities import EntityCache
 
 
 class TestObjectBuilder(object):
@@ -33,6 +34,75 @@ class TestObjectBuilder(object):
             initial="B",
         ))
 
+    def test_when_entity_cache_is_set_then_cached_field_values_are_reused(self):
+        User = g.ObjectType("User", fields=(
+            g.field("id", type=g.Int),
+            g.field("name", type=g.String),
+        ))
+
+        entity_cache = EntityCache(ttl=60)
+        resolved = []
+
+        def create_builder(*field_queries):
+            object_builder = g.create_object_builder(
+                User(*field_queries),
+                entity_cache=entity_cache,
+                entity_id=lambda user: user["id"],
+            )
+
+            @object_builder.getter(User.fields.id)
+            def resolve_id(user):
+                resolved.append("id")
+                return user["id"]
+
+            @object_builder.getter(User.fields.name)
+            def resolve_name(user):
+                resolved.append("name")
+                return user["name"]
+
+            return object_builder
+
+        first = create_builder(g.key("name", User.fields.name()))({"id": 1, "name": "Bob"})
+        second = create_builder(
+            g.key("id", User.fields.id()),
+            g.key("user_name", User.fields.name()),
+        )({"id": 1, "name": "Jim"})
+
+        assert_that(first, has_attrs(name="Bob"))
+        assert_that(second, has_attrs(id=1, user_name="Bob"))
+        assert_that(resolved, equal_to(["name", "id"]))
+
+    def test_when_entity_cache_is_set_then_cacheable_fields_are_only_built_when_value_is_missing(self):
+        User = g.ObjectType("User", fields=(
+            g.field("name", type=g.String),
+        ))
+
+        entity_cache = EntityCache(ttl=60)
+        built = []
+
+        def create_builder(names):
+            object_builder = g.create_object_builder(
+                User(g.key("name", User.fields.name())),
+                entity_cache=entity_cache,
+                entity_id=lambda user_id: user_id,
+            )
+
+            @object_builder.field(User.fields.name)
+            def resolve_name(field_query):
+                built.append(field_query.key)
+                return lambda user_id: names[user_id]
+
+            return object_builder
+
+        first = create_builder({1: "Bob"})(1)
+        second = create_builder({1: "Jim"})(1)
+        third = create_builder({2: "Jim"})(2)
+
+        assert_that(first, has_attrs(name="Bob"))
+        assert_that(second, has_attrs(name="Bob"))
+        assert_that(third, has_attrs(name="Jim"))
+        assert_that(built, equal_to(["name", "name"]))
+
     def test_object_builder_getters_access_value_directly(self):
         User = g.ObjectType("User", fields=(
             g.field("name", type=g.String),
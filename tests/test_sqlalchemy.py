@@ -1,6 +1,14 @@
 from __future__ import unicode_literals
 
-from precisely import assert_that, contains_exactly, equal_to, has_attrs, is_mapping, is_sequence
+import asyncio
+import datetime
+import enum
+import time
+
+from precisely import assert_that, contains_exactly, contains_string, equal_to, has_attrs, is_instance, is_mapping, is_sequence, not_, starts_with
+import sqlalchemy.dialects.postgresql.base
+import sqlalchemy.dialects.sqlite.base
+import sqlalchemy.ext.asyncio
 import sqlalchemy.ext.declarative
 import sqlalchemy.orm
 import pytest
@@ -8,6 +16,7 @@ import pytest
 import graphlayer as g
 from graphlayer import schema, sqlalchemy as gsql
 import graphlayer.connections
+from graphlayer.entities import EntityCache
 from graphlayer.resolvers import root_object_resolver
 
 
@@ -722,6 +731,299 @@ class TestSqlQueryBy(object):
             ),
         }))
 
+    def test_when_no_fields_have_expressions_then_results_are_indexed_by_expression(self):
+        query = gsql.select(self.Book(
+            g.key("type", schema.typename_field()),
+        )).by(self.BookRow.c_id, (1, 3))
+
+        result = self.graph.resolve(query)
+
+        assert_that(result, is_mapping({
+            1: has_attrs(type="Book"),
+            3: has_attrs(type="Book"),
+        }))
+
+
+class TestArgumentPushdown(object):
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+            c_year = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+
+        engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+        Base.metadata.create_all(engine)
+
+        session = sqlalchemy.orm.Session(engine)
+        session.add(BookRow(c_id=1, c_title="Right Ho, Jeeves", c_year=1934))
+        session.add(BookRow(c_id=2, c_title="Leave it to Psmith", c_year=1923))
+        session.add(BookRow(c_id=3, c_title="Pericles, Prince of Tyre", c_year=1609))
+        session.add(BookRow(c_id=4, c_title="Right Ho, 100%", c_year=2000))
+        session.commit()
+
+        class BookOrder(enum.Enum):
+            title = "title"
+            year_descending = "year_descending"
+
+        BookOrderType = g.EnumType(BookOrder)
+
+        YearRange = g.InputObjectType(
+            "YearRange",
+            fields=lambda: [
+                g.input_field("gte", type=g.NullableType(g.Int), default=None),
+                g.input_field("lt", type=g.NullableType(g.Int), default=None),
+            ],
+        )
+
+        BookFilter = g.InputObjectType(
+            "BookFilter",
+            fields=lambda: [
+                g.input_field("title", type=g.NullableType(g.String), default=None),
+                g.input_field("title_prefix", type=g.NullableType(g.String), default=None),
+                g.input_field("ids", type=g.NullableType(g.ListType(g.Int)), default=None),
+                g.input_field("year", type=g.NullableType(YearRange), default=None),
+            ],
+        )
+
+        Book = g.ObjectType(
+            "Book",
+            fields=lambda: [
+                g.field("title", type=g.String),
+            ],
+        )
+
+        Root = g.ObjectType(
+            "Root",
+            fields=lambda: [
+                g.field("books", type=g.ListType(Book), params=[
+                    g.param("filter", type=g.NullableType(BookFilter), default=None),
+                    g.param("order_by", type=g.NullableType(g.ListType(BookOrderType)), default=None),
+                ]),
+            ],
+        )
+
+        book_params = {
+            Root.fields.books.params.filter: gsql.filters({
+                BookFilter.fields.title: gsql.eq(BookRow.c_title),
+                BookFilter.fields.title_prefix: gsql.prefix(BookRow.c_title),
+                BookFilter.fields.ids: gsql.in_(BookRow.c_id),
+                BookFilter.fields.year: gsql.between(BookRow.c_year),
+            }),
+            Root.fields.books.params.order_by: gsql.orderings({
+                BookOrder.title: BookRow.c_title,
+                BookOrder.year_descending: (BookRow.c_year.desc(), BookRow.c_id),
+            }),
+        }
+
+        resolve_root = root_object_resolver(Root)
+
+        @resolve_root.field(Root.fields.books)
+        def resolve_root_field_books(graph, query, args):
+            return graph.resolve(gsql.select(query, args=args).order_by(BookRow.c_id))
+
+        book_resolver = gsql.sql_table_resolver(
+            Book,
+            BookRow,
+            fields={
+                Book.fields.title: gsql.expression(BookRow.c_title),
+            },
+            pushdown=book_params,
+        )
+
+        graph_definition = g.define_graph([resolve_root, book_resolver])
+        self.graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
+        self.Root = Root
+        self.Book = Book
+        self.BookFilter = BookFilter
+        self.BookOrder = BookOrder
+        self.YearRange = YearRange
+
+    def resolve_titles(self, *args):
+        Root = self.Root
+        Book = self.Book
+
+        with gsql.record_statements() as statements:
+            result = self.graph.resolve(Root(
+                g.key("books", Root.fields.books(
+                    *args,
+                    g.key("title", Book.fields.title()),
+                )),
+            ))
+
+        return [book.title for book in result.books], statements
+
+    def test_when_args_are_unset_then_query_is_unchanged(self):
+        titles, statements = self.resolve_titles()
+
+        assert_that(titles, contains_exactly(
+            "Right Ho, Jeeves",
+            "Leave it to Psmith",
+            "Pericles, Prince of Tyre",
+            "Right Ho, 100%",
+        ))
+        assert_that(statements, contains_exactly(
+            has_attrs(sql="SELECT book.c_title \nFROM book ORDER BY book.c_id"),
+        ))
+
+    def test_filter_fields_are_translated_to_where_clauses(self):
+        Root = self.Root
+        BookFilter = self.BookFilter
+
+        titles, statements = self.resolve_titles(
+            Root.fields.books.params.filter(BookFilter(title="Right Ho, Jeeves", ids=[1, 2])),
+        )
+
+        assert_that(titles, contains_exactly("Right Ho, Jeeves"))
+        assert_that(statements, contains_exactly(
+            has_attrs(sql=contains_string("WHERE book.c_title = ? AND book.c_id IN (__[POSTCOMPILE_c_id_1])")),
+        ))
+
+    def test_prefix_filter_matches_start_of_value_with_wildcards_escaped(self):
+        Root = self.Root
+        BookFilter = self.BookFilter
+
+        titles, _ = self.resolve_titles(
+            Root.fields.books.params.filter(BookFilter(title_prefix="Right Ho, 1")),
+        )
+        assert_that(titles, contains_exactly("Right Ho, 100%"))
+
+        titles, _ = self.resolve_titles(
+            Root.fields.books.params.filter(BookFilter(title_prefix="%Ho")),
+        )
+        assert_that(titles, contains_exactly())
+
+    def test_between_filter_uses_set_bounds(self):
+        Root = self.Root
+        BookFilter = self.BookFilter
+        YearRange = self.YearRange
+
+        titles, statements = self.resolve_titles(
+            Root.fields.books.params.filter(BookFilter(year=YearRange(gte=1923, lt=2000))),
+        )
+        assert_that(titles, contains_exactly("Right Ho, Jeeves", "Leave it to Psmith"))
+        assert_that(statements, contains_exactly(
+            has_attrs(sql=contains_string("WHERE book.c_year >= ? AND book.c_year < ?")),
+        ))
+
+        titles, _ = self.resolve_titles(
+            Root.fields.books.params.filter(BookFilter(year=YearRange(lt=1923))),
+        )
+        assert_that(titles, contains_exactly("Pericles, Prince of Tyre"))
+
+    def test_orderings_replace_order_of_query(self):
+        Root = self.Root
+        BookOrder = self.BookOrder
+
+        titles, statements = self.resolve_titles(
+            Root.fields.books.params.order_by([BookOrder.year_descending]),
+        )
+
+        assert_that(titles, contains_exactly(
+            "Right Ho, 100%",
+            "Right Ho, Jeeves",
+            "Leave it to Psmith",
+            "Pericles, Prince of Tyre",
+        ))
+        assert_that(statements, contains_exactly(
+            has_attrs(sql=contains_string("ORDER BY book.c_year DESC, book.c_id")),
+        ))
+
+
+def test_pushdown_is_applied_to_args_of_field_query_selected_by_join():
+    Base = sqlalchemy.ext.declarative.declarative_base()
+
+    class AuthorRow(Base):
+        __tablename__ = "author"
+
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+    class BookRow(Base):
+        __tablename__ = "book"
+
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+        c_author_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(AuthorRow.c_id))
+
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+    Base.metadata.create_all(engine)
+
+    session = sqlalchemy.orm.Session(engine)
+    session.add(AuthorRow(c_id=1, c_name="PG Wodehouse"))
+    session.add(BookRow(c_id=1, c_title="Leave it to Psmith", c_author_id=1))
+    session.add(BookRow(c_id=2, c_title="Right Ho, Jeeves", c_author_id=1))
+    session.commit()
+
+    BookFilter = g.InputObjectType(
+        "BookFilter",
+        fields=lambda: [
+            g.input_field("title_prefix", type=g.NullableType(g.String), default=None),
+        ],
+    )
+
+    Author = g.ObjectType(
+        "Author",
+        fields=lambda: [
+            g.field("books", type=g.ListType(Book), params=[
+                g.param("filter", type=g.NullableType(BookFilter), default=None),
+            ]),
+        ],
+    )
+
+    Book = g.ObjectType(
+        "Book",
+        fields=lambda: [
+            g.field("title", type=g.String),
+        ],
+    )
+
+    author_resolver = gsql.sql_table_resolver(
+        Author,
+        AuthorRow,
+        fields={
+            Author.fields.books: lambda graph, field_query: gsql.join(
+                key=AuthorRow.c_id,
+                resolve=lambda author_ids: graph.resolve(
+                    gsql.select(field_query).by(BookRow.c_author_id, author_ids),
+                ),
+            ),
+        },
+    )
+
+    book_resolver = gsql.sql_table_resolver(
+        Book,
+        BookRow,
+        fields={
+            Book.fields.title: gsql.expression(BookRow.c_title),
+        },
+        pushdown={
+            Author.fields.books.params.filter: gsql.filters({
+                BookFilter.fields.title_prefix: gsql.prefix(BookRow.c_title),
+            }),
+        },
+    )
+
+    query = gsql.select(g.ListType(Author)(
+        g.key("books", Author.fields.books(
+            Author.fields.books.params.filter(BookFilter(title_prefix="Right")),
+            g.key("title", Book.fields.title()),
+        )),
+    ))
+
+    graph_definition = g.define_graph([author_resolver, book_resolver])
+    graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
+    result = graph.resolve(query)
+
+    assert_that(result, contains_exactly(
+        has_attrs(books=contains_exactly(has_attrs(title="Right Ho, Jeeves"))),
+    ))
 
 def test_can_recursively_resolve_selected_fields():
     Base = sqlalchemy.ext.declarative.declarative_base()
@@ -1927,21 +2229,26 @@ def test_association_can_have_explicit_order():
     ))
 
 
-def test_can_join_tables_using_multi_column_key():
+def test_fused_association_is_joined_to_target_in_single_statement():
     Base = sqlalchemy.ext.declarative.declarative_base()
 
     class LeftRow(Base):
         __tablename__ = "left"
 
-        c_id_1 = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
-        c_id_2 = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
         c_value = sqlalchemy.Column(sqlalchemy.Unicode)
 
+    class AssociationRow(Base):
+        __tablename__ = "association"
+
+        c_left_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_right_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        index = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+
     class RightRow(Base):
         __tablename__ = "right"
 
-        c_id_1 = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
-        c_id_2 = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
         c_value = sqlalchemy.Column(sqlalchemy.Unicode)
 
     engine = sqlalchemy.create_engine("sqlite:///:memory:")
@@ -1949,17 +2256,32 @@ def test_can_join_tables_using_multi_column_key():
     Base.metadata.create_all(engine)
 
     session = sqlalchemy.orm.Session(engine)
-    session.add(LeftRow(c_id_1=1, c_id_2=2, c_value="one"))
-    session.add(RightRow(c_id_1=1, c_id_2=2, c_value="two"))
-    session.add(LeftRow(c_id_1=1, c_id_2=3, c_value="three"))
-    session.add(RightRow(c_id_1=1, c_id_2=3, c_value="four"))
+
+    session.add(LeftRow(c_id=1, c_value="left 1"))
+    session.add(RightRow(c_id=101, c_value="right 1a"))
+    session.add(RightRow(c_id=102, c_value="right 1c"))
+    session.add(RightRow(c_id=103, c_value="right 1b"))
+    session.add(AssociationRow(c_left_id=1, c_right_id=101, index=1))
+    session.add(AssociationRow(c_left_id=1, c_right_id=102, index=3))
+    session.add(AssociationRow(c_left_id=1, c_right_id=103, index=2))
+
+    session.add(LeftRow(c_id=2, c_value="left 2"))
+    session.add(RightRow(c_id=104, c_value="right 2c"))
+    session.add(RightRow(c_id=105, c_value="right 2a"))
+    session.add(RightRow(c_id=106, c_value="right 2b"))
+    session.add(AssociationRow(c_left_id=2, c_right_id=104, index=3))
+    session.add(AssociationRow(c_left_id=2, c_right_id=105, index=1))
+    session.add(AssociationRow(c_left_id=2, c_right_id=106, index=2))
+
+    session.add(LeftRow(c_id=3, c_value="left 3"))
+
     session.commit()
 
     Left = g.ObjectType(
         "Left",
         fields=lambda: [
             g.field("value", type=g.String),
-            g.field("right", type=Right),
+            g.field("rights", type=g.ListType(Right)),
         ],
     )
     Right = g.ObjectType(
@@ -1974,10 +2296,17 @@ def test_can_join_tables_using_multi_column_key():
         LeftRow,
         fields={
             Left.fields.value: gsql.expression(LeftRow.c_value),
-            Left.fields.right: lambda graph, field_query: gsql.join(
-                key=(LeftRow.c_id_1, LeftRow.c_id_2),
-                resolve=lambda left_ids: graph.resolve(
-                    gsql.select(field_query.type_query).by((RightRow.c_id_1, RightRow.c_id_2), left_ids),
+            Left.fields.rights: lambda graph, field_query: gsql.join(
+                key=LeftRow.c_id,
+                association=gsql.association(
+                    AssociationRow,
+                    left_key=AssociationRow.c_left_id,
+                    right_key=AssociationRow.c_right_id,
+                    order_by=AssociationRow.index,
+                    fused=True,
+                ),
+                resolve=lambda right_ids: graph.resolve(
+                    gsql.select(field_query.type_query).by(RightRow.c_id, right_ids),
                 ),
             ),
         },
@@ -1995,93 +2324,177 @@ def test_can_join_tables_using_multi_column_key():
 
     query = gsql.select(g.ListType(Left)(
         g.key("value", Left.fields.value()),
-        g.key("right", Left.fields.right(
+        g.key("rights", Left.fields.rights(
             g.key("value", Right.fields.value()),
         )),
     ))
 
     graph_definition = g.define_graph(resolvers)
     graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
-    result = graph.resolve(query)
+    with gsql.record_statements() as statements:
+        result = graph.resolve(query)
 
     assert_that(result, contains_exactly(
         has_attrs(
-            value="one",
-            right=has_attrs(
-                value="two",
+            value="left 1",
+            rights=is_sequence(
+                has_attrs(value="right 1a"),
+                has_attrs(value="right 1b"),
+                has_attrs(value="right 1c"),
             ),
         ),
         has_attrs(
-            value="three",
-            right=has_attrs(
-                value="four",
+            value="left 2",
+            rights=is_sequence(
+                has_attrs(value="right 2a"),
+                has_attrs(value="right 2b"),
+                has_attrs(value="right 2c"),
             ),
         ),
+        has_attrs(
+            value="left 3",
+            rights=is_sequence(),
+        ),
+    ))
+    assert_that(statements, contains_exactly(
+        has_attrs(type=Left, path=()),
+        has_attrs(type=Right, path=("rights", ), sql=contains_string("JOIN association")),
     ))
 
 
-def test_can_map_values_from_sql_expression():
+def test_can_join_tables_using_multi_column_key():
     Base = sqlalchemy.ext.declarative.declarative_base()
 
-    class BookRow(Base):
-        __tablename__ = "book"
+    class LeftRow(Base):
+        __tablename__ = "left"
 
-        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
-        c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+        c_id_1 = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_id_2 = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_value = sqlalchemy.Column(sqlalchemy.Unicode)
+
+    class RightRow(Base):
+        __tablename__ = "right"
+
+        c_id_1 = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_id_2 = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_value = sqlalchemy.Column(sqlalchemy.Unicode)
 
     engine = sqlalchemy.create_engine("sqlite:///:memory:")
 
     Base.metadata.create_all(engine)
 
     session = sqlalchemy.orm.Session(engine)
-    session.add(BookRow(c_title="Leave it to Psmith"))
-    session.add(BookRow(c_title="Pericles, Prince of Tyre"))
+    session.add(LeftRow(c_id_1=1, c_id_2=2, c_value="one"))
+    session.add(RightRow(c_id_1=1, c_id_2=2, c_value="two"))
+    session.add(LeftRow(c_id_1=1, c_id_2=3, c_value="three"))
+    session.add(RightRow(c_id_1=1, c_id_2=3, c_value="four"))
     session.commit()
 
-    Book = g.ObjectType(
-        "Book",
+    Left = g.ObjectType(
+        "Left",
         fields=lambda: [
-            g.field("initial", type=g.String),
+            g.field("value", type=g.String),
+            g.field("right", type=Right),
+        ],
+    )
+    Right = g.ObjectType(
+        "Right",
+        fields=lambda: [
+            g.field("value", type=g.String),
         ],
     )
 
-    book_resolver = gsql.sql_table_resolver(
-        Book,
-        BookRow,
+    left_resolver = gsql.sql_table_resolver(
+        Left,
+        LeftRow,
         fields={
-            Book.fields.initial: gsql.expression(BookRow.c_title).map_value(lambda title: title[0]),
+            Left.fields.value: gsql.expression(LeftRow.c_value),
+            Left.fields.right: lambda graph, field_query: gsql.join(
+                key=(LeftRow.c_id_1, LeftRow.c_id_2),
+                resolve=lambda left_ids: graph.resolve(
+                    gsql.select(field_query.type_query).by((RightRow.c_id_1, RightRow.c_id_2), left_ids),
+                ),
+            ),
         },
     )
 
-    resolvers = [book_resolver]
+    right_resolver = gsql.sql_table_resolver(
+        Right,
+        RightRow,
+        fields={
+            Right.fields.value: gsql.expression(RightRow.c_value),
+        },
+    )
 
-    query = gsql.select(g.ListType(Book)(
-        g.key("initial", Book.fields.initial()),
+    resolvers = [left_resolver, right_resolver]
+
+    query = gsql.select(g.ListType(Left)(
+        g.key("value", Left.fields.value()),
+        g.key("right", Left.fields.right(
+            g.key("value", Right.fields.value()),
+        )),
     ))
+
     graph_definition = g.define_graph(resolvers)
-    graph = graph_definition.create_graph({
-        sqlalchemy.orm.Session: session,
-    })
+    graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
     result = graph.resolve(query)
 
     assert_that(result, contains_exactly(
-        has_attrs(initial="L"),
-        has_attrs(initial="P"),
+        has_attrs(
+            value="one",
+            right=has_attrs(
+                value="two",
+            ),
+        ),
+        has_attrs(
+            value="three",
+            right=has_attrs(
+                value="four",
+            ),
+        ),
     ))
 
 
-class TestTags(object):
-    def test_tag_can_be_used_to_distinguish_queries_on_same_graph_type(self):
+class TestRelationshipJoins(object):
+    @pytest.fixture(autouse=True)
+    def setup(self):
         Base = sqlalchemy.ext.declarative.declarative_base()
 
+        book_tag = sqlalchemy.Table(
+            "book_tag",
+            Base.metadata,
+            sqlalchemy.Column("c_book_id", sqlalchemy.Integer, sqlalchemy.ForeignKey("book.c_id")),
+            sqlalchemy.Column("c_tag_id", sqlalchemy.Integer, sqlalchemy.ForeignKey("tag.c_id")),
+        )
+
         class AuthorRow(Base):
             __tablename__ = "author"
 
             c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
             c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
 
-        class ReaderRow(Base):
-            __tablename__ = "reader"
+            books = sqlalchemy.orm.relationship("BookRow", back_populates="author", order_by="BookRow.c_title")
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+            c_author_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(AuthorRow.c_id), index=True)
+
+            author = sqlalchemy.orm.relationship(AuthorRow, back_populates="books")
+            reviews = sqlalchemy.orm.relationship("ReviewRow", order_by="ReviewRow.c_id")
+            tags = sqlalchemy.orm.relationship("TagRow", secondary=book_tag, order_by="TagRow.c_name")
+
+        class ReviewRow(Base):
+            __tablename__ = "review"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_body = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+            c_book_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(BookRow.c_id))
+
+        class TagRow(Base):
+            __tablename__ = "tag"
 
             c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
             c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
@@ -2091,104 +2504,750 @@ class TestTags(object):
         Base.metadata.create_all(engine)
 
         session = sqlalchemy.orm.Session(engine)
-        session.add(AuthorRow(c_name="PG Wodehouse"))
-        session.add(ReaderRow(c_name="Matilda"))
+        session.add(AuthorRow(c_id=1, c_name="PG Wodehouse"))
+        session.add(AuthorRow(c_id=2, c_name="William Shakespeare"))
+        session.add(BookRow(c_id=1, c_title="Right Ho, Jeeves", c_author_id=1))
+        session.add(BookRow(c_id=2, c_title="Leave it to Psmith", c_author_id=1))
+        session.add(BookRow(c_id=3, c_title="Pericles, Prince of Tyre", c_author_id=2))
+        session.add(ReviewRow(c_id=1, c_body="Spiffing", c_book_id=1))
+        session.add(ReviewRow(c_id=2, c_body="Topping", c_book_id=1))
+        session.add(ReviewRow(c_id=3, c_body="Tragical", c_book_id=3))
+        session.add(TagRow(c_id=1, c_name="comedy"))
+        session.add(TagRow(c_id=2, c_name="classic"))
+        session.commit()
+        session.execute(book_tag.insert(), [
+            {"c_book_id": 1, "c_tag_id": 1},
+            {"c_book_id": 1, "c_tag_id": 2},
+            {"c_book_id": 3, "c_tag_id": 2},
+        ])
         session.commit()
 
-        Person = g.ObjectType(
-            "Person",
+        Author = g.ObjectType(
+            "Author",
             fields=lambda: [
                 g.field("name", type=g.String),
+                g.field("books", type=g.ListType(Book)),
             ],
         )
 
-        author_resolver = gsql.sql_table_resolver(
-            (Person, "author"),
-            AuthorRow,
-            fields={
-                Person.fields.name: gsql.expression(AuthorRow.c_name),
-            },
+        Book = g.ObjectType(
+            "Book",
+            fields=lambda: [
+                g.field("title", type=g.String),
+                g.field("author", type=Author),
+                g.field("reviews", type=g.ListType(Review)),
+                g.field("tags", type=g.ListType(Tag)),
+            ],
         )
 
-        reader_resolver = gsql.sql_table_resolver(
-            (Person, "reader"),
-            ReaderRow,
-            fields={
-                Person.fields.name: gsql.expression(ReaderRow.c_name),
-            },
+        Review = g.ObjectType(
+            "Review",
+            fields=lambda: [
+                g.field("body", type=g.String),
+            ],
         )
 
-        resolvers = [author_resolver, reader_resolver]
+        Tag = g.ObjectType(
+            "Tag",
+            fields=lambda: [
+                g.field("name", type=g.String),
+            ],
+        )
+
+        self.session = session
+        self.AuthorRow = AuthorRow
+        self.BookRow = BookRow
+        self.ReviewRow = ReviewRow
+        self.TagRow = TagRow
+        self.Author = Author
+        self.Book = Book
+        self.Review = Review
+        self.Tag = Tag
+
+    def create_graph(self, *, book_fields):
+        resolvers = [
+            gsql.sql_table_resolver(
+                self.Author,
+                self.AuthorRow,
+                fields={
+                    self.Author.fields.name: gsql.expression(self.AuthorRow.c_name),
+                    self.Author.fields.books: gsql.relationship(self.AuthorRow.books),
+                },
+            ),
+            gsql.sql_table_resolver(
+                self.Book,
+                self.BookRow,
+                fields=book_fields,
+            ),
+            gsql.sql_table_resolver(
+                self.Review,
+                self.ReviewRow,
+                fields={
+                    self.Review.fields.body: gsql.expression(self.ReviewRow.c_body),
+                },
+            ),
+            gsql.sql_table_resolver(
+                self.Tag,
+                self.TagRow,
+                fields={
+                    self.Tag.fields.name: gsql.expression(self.TagRow.c_name),
+                },
+            ),
+        ]
 
         graph_definition = g.define_graph(resolvers)
-        graph = graph_definition.create_graph({
-            sqlalchemy.orm.Session: session,
+        return graph_definition.create_graph({sqlalchemy.orm.Session: self.session})
+
+    def test_many_to_one_relationship_is_resolved_using_keys_that_have_been_read(self):
+        Author = self.Author
+        Book = self.Book
+        graph = self.create_graph(book_fields={
+            Book.fields.title: gsql.expression(self.BookRow.c_title),
+            Book.fields.author: gsql.relationship(self.BookRow.author),
         })
 
-        authors = graph.resolve(
-            gsql.select(
-                g.ListType(Person)(
-                    g.key("name", Person.fields.name()),
-                ),
-                tag=(Person, "author"),
-            ),
-        )
+        query = gsql.select(g.ListType(Book)(
+            g.key("title", Book.fields.title()),
+            g.key("author", Book.fields.author(
+                g.key("name", Author.fields.name()),
+            )),
+        )).order_by(self.BookRow.c_id)
 
-        assert_that(authors, contains_exactly(
-            has_attrs(name="PG Wodehouse"),
+        with gsql.record_statements() as statements:
+            result = graph.resolve(query)
+
+        assert_that(result, contains_exactly(
+            has_attrs(title="Right Ho, Jeeves", author=has_attrs(name="PG Wodehouse")),
+            has_attrs(title="Leave it to Psmith", author=has_attrs(name="PG Wodehouse")),
+            has_attrs(title="Pericles, Prince of Tyre", author=has_attrs(name="William Shakespeare")),
+        ))
+        assert_that(statements, contains_exactly(
+            has_attrs(sql=starts_with("SELECT book.c_title")),
+            has_attrs(sql=contains_string("WHERE author.c_id IN (__[POSTCOMPILE")),
         ))
 
-        readers = graph.resolve(
-            gsql.select(
-                g.ListType(Person)(
-                    g.key("name", Person.fields.name()),
-                ),
-                tag=(Person, "reader"),
+    def test_one_to_many_relationship_on_indexed_foreign_key_uses_relationship_order(self):
+        Author = self.Author
+        Book = self.Book
+        graph = self.create_graph(book_fields={
+            Book.fields.title: gsql.expression(self.BookRow.c_title),
+        })
+
+        query = gsql.select(g.ListType(Author)(
+            g.key("name", Author.fields.name()),
+            g.key("books", Author.fields.books(
+                g.key("title", Book.fields.title()),
+            )),
+        )).order_by(self.AuthorRow.c_id)
+
+        with gsql.record_statements() as statements:
+            result = graph.resolve(query)
+
+        assert_that(result, contains_exactly(
+            has_attrs(name="PG Wodehouse", books=contains_exactly(
+                has_attrs(title="Leave it to Psmith"),
+                has_attrs(title="Right Ho, Jeeves"),
+            )),
+            has_attrs(name="William Shakespeare", books=contains_exactly(
+                has_attrs(title="Pericles, Prince of Tyre"),
+            )),
+        ))
+        assert_that(statements, contains_exactly(
+            has_attrs(sql=starts_with("SELECT author.c_name")),
+            has_attrs(sql=contains_string("WHERE book.c_author_id IN (__[POSTCOMPILE")),
+        ))
+
+    def test_one_to_many_relationship_on_unindexed_foreign_key_selects_keys_in_subquery(self):
+        Book = self.Book
+        Review = self.Review
+        graph = self.create_graph(book_fields={
+            Book.fields.title: gsql.expression(self.BookRow.c_title),
+            Book.fields.reviews: gsql.relationship(self.BookRow.reviews),
+        })
+
+        query = gsql.select(g.ListType(Book)(
+            g.key("title", Book.fields.title()),
+            g.key("reviews", Book.fields.reviews(
+                g.key("body", Review.fields.body()),
+            )),
+        )).order_by(self.BookRow.c_id)
+
+        with gsql.record_statements() as statements:
+            result = graph.resolve(query)
+
+        assert_that(result, contains_exactly(
+            has_attrs(title="Right Ho, Jeeves", reviews=contains_exactly(
+                has_attrs(body="Spiffing"),
+                has_attrs(body="Topping"),
+            )),
+            has_attrs(title="Leave it to Psmith", reviews=contains_exactly()),
+            has_attrs(title="Pericles, Prince of Tyre", reviews=contains_exactly(
+                has_attrs(body="Tragical"),
+            )),
+        ))
+        assert_that(statements, contains_exactly(
+            has_attrs(sql=starts_with("SELECT book.c_title")),
+            has_attrs(sql=contains_string("WHERE review.c_book_id IN (SELECT")),
+        ))
+
+    def test_many_to_many_relationship_is_joined_through_secondary_table_in_single_statement(self):
+        Book = self.Book
+        Tag = self.Tag
+        graph = self.create_graph(book_fields={
+            Book.fields.title: gsql.expression(self.BookRow.c_title),
+            Book.fields.tags: gsql.relationship(self.BookRow.tags),
+        })
+
+        query = gsql.select(g.ListType(Book)(
+            g.key("title", Book.fields.title()),
+            g.key("tags", Book.fields.tags(
+                g.key("name", Tag.fields.name()),
+            )),
+        )).order_by(self.BookRow.c_id)
+
+        with gsql.record_statements() as statements:
+            result = graph.resolve(query)
+
+        assert_that(result, contains_exactly(
+            has_attrs(title="Right Ho, Jeeves", tags=contains_exactly(
+                has_attrs(name="classic"),
+                has_attrs(name="comedy"),
+            )),
+            has_attrs(title="Leave it to Psmith", tags=contains_exactly()),
+            has_attrs(title="Pericles, Prince of Tyre", tags=contains_exactly(
+                has_attrs(name="classic"),
+            )),
+        ))
+        assert_that(statements, contains_exactly(
+            has_attrs(sql=starts_with("SELECT book.c_title")),
+            has_attrs(sql=contains_string("JOIN book_tag")),
+        ))
+
+    def test_when_relationships_is_true_then_fields_are_resolved_using_relationships_with_same_name(self):
+        Author = self.Author
+        Book = self.Book
+        Tag = self.Tag
+        resolvers = [
+            gsql.sql_table_resolver(
+                Author,
+                self.AuthorRow,
+                fields={
+                    Author.fields.name: gsql.expression(self.AuthorRow.c_name),
+                },
+                relationships=True,
             ),
-        )
+            gsql.sql_table_resolver(
+                Book,
+                self.BookRow,
+                fields={
+                    Book.fields.title: gsql.expression(self.BookRow.c_title),
+                },
+                relationships=True,
+            ),
+            gsql.sql_table_resolver(
+                Tag,
+                self.TagRow,
+                fields={
+                    Tag.fields.name: gsql.expression(self.TagRow.c_name),
+                },
+            ),
+        ]
+        graph = g.define_graph(resolvers).create_graph({sqlalchemy.orm.Session: self.session})
+
+        query = gsql.select(g.ListType(Author)(
+            g.key("books", Author.fields.books(
+                g.key("title", Book.fields.title()),
+                g.key("tags", Book.fields.tags(
+                    g.key("name", Tag.fields.name()),
+                )),
+            )),
+        )).order_by(self.AuthorRow.c_id)
 
-        assert_that(readers, contains_exactly(
-            has_attrs(name="Matilda"),
+        result = graph.resolve(query)
+
+        assert_that(result, contains_exactly(
+            has_attrs(books=contains_exactly(
+                has_attrs(title="Leave it to Psmith", tags=contains_exactly()),
+                has_attrs(title="Right Ho, Jeeves", tags=contains_exactly(
+                    has_attrs(name="classic"),
+                    has_attrs(name="comedy"),
+                )),
+            )),
+            has_attrs(books=contains_exactly(
+                has_attrs(title="Pericles, Prince of Tyre", tags=contains_exactly(
+                    has_attrs(name="classic"),
+                )),
+            )),
         ))
 
+    def test_when_relationship_join_is_not_column_equalities_then_error_is_raised(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
 
-def test_when_type_is_object_then_typename_field_is_resolved():
+        class AuthorRow(Base):
+            __tablename__ = "author"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_author_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(AuthorRow.c_id))
+            c_published = sqlalchemy.Column(sqlalchemy.Boolean)
+
+        AuthorRow.published_books = sqlalchemy.orm.relationship(
+            BookRow,
+            primaryjoin=sqlalchemy.and_(AuthorRow.c_id == BookRow.c_author_id, BookRow.c_published == True),
+        )
+
+        create_join = gsql.relationship(AuthorRow.published_books)
+
+        error = pytest.raises(ValueError, lambda: create_join(None, None))
+
+        assert_that(str(error.value), equal_to("relationship joins must be equalities between columns: AuthorRow.published_books"))
+
+
+def test_identical_expressions_are_selected_once():
     Base = sqlalchemy.ext.declarative.declarative_base()
 
+    class AuthorRow(Base):
+        __tablename__ = "author"
+
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
     class BookRow(Base):
         __tablename__ = "book"
 
         c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
         c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+        c_author_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(AuthorRow.c_id))
 
     engine = sqlalchemy.create_engine("sqlite:///:memory:")
 
     Base.metadata.create_all(engine)
 
     session = sqlalchemy.orm.Session(engine)
-    session.add(BookRow(c_title="Leave it to Psmith"))
+    session.add(AuthorRow(c_id=1, c_name="PG Wodehouse"))
+    session.add(BookRow(c_id=1, c_title="Leave it to Psmith", c_author_id=1))
+    session.add(BookRow(c_id=2, c_title="Right Ho, Jeeves", c_author_id=1))
+
     session.commit()
 
     Book = g.ObjectType(
         "Book",
         fields=lambda: [
+            g.field("author", type=Author),
+            g.field("label", type=g.String),
             g.field("title", type=g.String),
         ],
     )
 
+    Author = g.ObjectType(
+        "Author",
+        fields=lambda: [
+            g.field("name", type=g.String),
+        ],
+    )
+
     book_resolver = gsql.sql_table_resolver(
         Book,
         BookRow,
         fields={
+            Book.fields.author: lambda graph, field_query: gsql.join(
+                key=BookRow.c_author_id,
+                resolve=lambda author_ids: graph.resolve(
+                    gsql.select(field_query.type_query).by(AuthorRow.c_id, author_ids),
+                ),
+            ),
+            Book.fields.label: gsql.composite(
+                (BookRow.c_id, BookRow.c_title),
+                lambda book_id, title: "{}: {}".format(book_id, title),
+            ),
             Book.fields.title: gsql.expression(BookRow.c_title),
         },
     )
 
-    resolvers = [book_resolver]
+    author_resolver = gsql.sql_table_resolver(
+        Author,
+        AuthorRow,
+        fields={
+            Author.fields.name: gsql.expression(AuthorRow.c_name),
+        },
+    )
 
-    query = gsql.select(g.ListType(Book)(
+    query = gsql.select(Book(
         g.key("title", Book.fields.title()),
-        g.key("type", schema.typename_field()),
+        g.key("heading", Book.fields.title()),
+        g.key("label", Book.fields.label()),
+        g.key("author", Book.fields.author(
+            g.key("name", Author.fields.name()),
+        )),
+    )).by(BookRow.c_id, [1, 2])
+
+    graph_definition = g.define_graph([book_resolver, author_resolver])
+    graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
+
+    with gsql.record_statements() as statements:
+        result = graph.resolve(query)
+
+    assert_that(result, is_mapping({
+        1: has_attrs(
+            title="Leave it to Psmith",
+            heading="Leave it to Psmith",
+            label="1: Leave it to Psmith",
+            author=has_attrs(name="PG Wodehouse"),
+        ),
+        2: has_attrs(
+            title="Right Ho, Jeeves",
+            heading="Right Ho, Jeeves",
+            label="2: Right Ho, Jeeves",
+            author=has_attrs(name="PG Wodehouse"),
+        ),
+    }))
+    assert_that(statements[0], has_attrs(
+        sql=starts_with("SELECT book.c_title, book.c_id, book.c_author_id \nFROM book"),
+    ))
+
+
+def test_can_map_values_from_sql_expression():
+    Base = sqlalchemy.ext.declarative.declarative_base()
+
+    class BookRow(Base):
+        __tablename__ = "book"
+
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+    Base.metadata.create_all(engine)
+
+    session = sqlalchemy.orm.Session(engine)
+    session.add(BookRow(c_title="Leave it to Psmith"))
+    session.add(BookRow(c_title="Pericles, Prince of Tyre"))
+    session.commit()
+
+    Book = g.ObjectType(
+        "Book",
+        fields=lambda: [
+            g.field("initial", type=g.String),
+        ],
+    )
+
+    book_resolver = gsql.sql_table_resolver(
+        Book,
+        BookRow,
+        fields={
+            Book.fields.initial: gsql.expression(BookRow.c_title).map_value(lambda title: title[0]),
+        },
+    )
+
+    resolvers = [book_resolver]
+
+    query = gsql.select(g.ListType(Book)(
+        g.key("initial", Book.fields.initial()),
+    ))
+    graph_definition = g.define_graph(resolvers)
+    graph = graph_definition.create_graph({
+        sqlalchemy.orm.Session: session,
+    })
+    result = graph.resolve(query)
+
+    assert_that(result, contains_exactly(
+        has_attrs(initial="L"),
+        has_attrs(initial="P"),
+    ))
+
+
+class TestTags(object):
+    def test_tag_can_be_used_to_distinguish_queries_on_same_graph_type(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class AuthorRow(Base):
+            __tablename__ = "author"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        class ReaderRow(Base):
+            __tablename__ = "reader"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+        Base.metadata.create_all(engine)
+
+        session = sqlalchemy.orm.Session(engine)
+        session.add(AuthorRow(c_name="PG Wodehouse"))
+        session.add(ReaderRow(c_name="Matilda"))
+        session.commit()
+
+        Person = g.ObjectType(
+            "Person",
+            fields=lambda: [
+                g.field("name", type=g.String),
+            ],
+        )
+
+        author_resolver = gsql.sql_table_resolver(
+            (Person, "author"),
+            AuthorRow,
+            fields={
+                Person.fields.name: gsql.expression(AuthorRow.c_name),
+            },
+        )
+
+        reader_resolver = gsql.sql_table_resolver(
+            (Person, "reader"),
+            ReaderRow,
+            fields={
+                Person.fields.name: gsql.expression(ReaderRow.c_name),
+            },
+        )
+
+        resolvers = [author_resolver, reader_resolver]
+
+        graph_definition = g.define_graph(resolvers)
+        graph = graph_definition.create_graph({
+            sqlalchemy.orm.Session: session,
+        })
+
+        authors = graph.resolve(
+            gsql.select(
+                g.ListType(Person)(
+                    g.key("name", Person.fields.name()),
+                ),
+                tag=(Person, "author"),
+            ),
+        )
+
+        assert_that(authors, contains_exactly(
+            has_attrs(name="PG Wodehouse"),
+        ))
+
+        readers = graph.resolve(
+            gsql.select(
+                g.ListType(Person)(
+                    g.key("name", Person.fields.name()),
+                ),
+                tag=(Person, "reader"),
+            ),
+        )
+
+        assert_that(readers, contains_exactly(
+            has_attrs(name="Matilda"),
+        ))
+
+
+class TestPolymorphicTableResolver(object):
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class UserRow(Base):
+            __tablename__ = "user"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        class EventRow(Base):
+            __tablename__ = "event"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_type = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+            c_body = sqlalchemy.Column(sqlalchemy.Unicode)
+            c_user_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(UserRow.c_id))
+
+        engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+        Base.metadata.create_all(engine)
+
+        session = sqlalchemy.orm.Session(engine)
+        session.add(UserRow(c_id=1, c_name="Bob"))
+        session.add(UserRow(c_id=2, c_name="Jim"))
+        session.add(EventRow(c_id=1, c_type="comment", c_body="Nice", c_user_id=1))
+        session.add(EventRow(c_id=2, c_type="like", c_user_id=2))
+        session.add(EventRow(c_id=3, c_type="share", c_user_id=1))
+        session.add(EventRow(c_id=4, c_type="comment", c_body="Meh", c_user_id=2))
+        session.commit()
+
+        Event = g.InterfaceType(
+            "Event",
+            fields=lambda: [
+                g.field("id", type=g.Int),
+            ],
+        )
+
+        CommentEvent = g.ObjectType(
+            "CommentEvent",
+            fields=lambda: [
+                g.field("id", type=g.Int),
+                g.field("body", type=g.String),
+            ],
+            interfaces=lambda: (Event, ),
+        )
+
+        LikeEvent = g.ObjectType(
+            "LikeEvent",
+            fields=lambda: [
+                g.field("id", type=g.Int),
+                g.field("user", type=User),
+            ],
+            interfaces=lambda: (Event, ),
+        )
+
+        User = g.ObjectType(
+            "User",
+            fields=lambda: [
+                g.field("name", type=g.String),
+            ],
+        )
+
+        event_resolver = gsql.polymorphic_table_resolver(
+            Event,
+            EventRow,
+            discriminator=EventRow.c_type,
+            types={
+                "comment": (CommentEvent, {
+                    CommentEvent.fields.id: gsql.expression(EventRow.c_id),
+                    CommentEvent.fields.body: gsql.expression(EventRow.c_body),
+                }),
+                "like": (LikeEvent, {
+                    LikeEvent.fields.id: gsql.expression(EventRow.c_id),
+                    LikeEvent.fields.user: lambda graph, field_query: gsql.join(
+                        key=EventRow.c_user_id,
+                        resolve=lambda user_ids: graph.resolve(
+                            gsql.select(field_query.type_query).by(UserRow.c_id, user_ids),
+                        ),
+                    ),
+                }),
+            },
+        )
+
+        user_resolver = gsql.sql_table_resolver(
+            User,
+            UserRow,
+            fields={
+                User.fields.name: gsql.expression(UserRow.c_name),
+            },
+        )
+
+        graph_definition = g.define_graph([event_resolver, user_resolver])
+        self.graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
+        self.EventRow = EventRow
+        self.Event = Event
+        self.CommentEvent = CommentEvent
+        self.LikeEvent = LikeEvent
+        self.User = User
+
+    def test_objects_of_each_type_are_read_from_single_statement(self):
+        Event = self.Event
+        CommentEvent = self.CommentEvent
+
+        query = gsql.select(g.ListType(Event)(
+            g.key("id", Event.fields.id()),
+            g.key("type", schema.typename_field()),
+            g.key("body", CommentEvent.fields.body()),
+        )).order_by(self.EventRow.c_id)
+
+        with gsql.record_statements() as statements:
+            result = self.graph.resolve(query)
+
+        assert_that(result, contains_exactly(
+            has_attrs(id=1, type="CommentEvent", body="Nice"),
+            has_attrs(id=2, type="LikeEvent"),
+            has_attrs(id=4, type="CommentEvent", body="Meh"),
+        ))
+        assert_that(result[1], has_attrs(_values=equal_to({"id": 2, "type": "LikeEvent"})))
+        assert_that(statements, contains_exactly(
+            has_attrs(sql=equal_to(
+                "SELECT event.c_id, event.c_body, event.c_type \n"
+                "FROM event \n"
+                "WHERE event.c_type IN (__[POSTCOMPILE_c_type_1]) ORDER BY event.c_id"
+            )),
+        ))
+
+    def test_joins_of_type_are_resolved_using_rows_of_that_type(self):
+        Event = self.Event
+        LikeEvent = self.LikeEvent
+        User = self.User
+
+        query = gsql.select(g.ListType(Event)(
+            g.key("id", Event.fields.id()),
+            g.key("user", LikeEvent.fields.user(
+                g.key("name", User.fields.name()),
+            )),
+        )).order_by(self.EventRow.c_id)
+
+        with gsql.record_statements() as statements:
+            result = self.graph.resolve(query)
+
+        assert_that(result, contains_exactly(
+            has_attrs(id=1),
+            has_attrs(id=2, user=has_attrs(name="Jim")),
+            has_attrs(id=4),
+        ))
+        assert_that(statements, contains_exactly(
+            has_attrs(sql=starts_with("SELECT event.c_id, event.c_user_id, event.c_type")),
+            has_attrs(sql=contains_string("AND event.c_type = ?")),
+        ))
+
+    def test_can_select_objects_by_key(self):
+        Event = self.Event
+        CommentEvent = self.CommentEvent
+
+        query = gsql.select(Event(
+            g.key("body", CommentEvent.fields.body()),
+        )).by(self.EventRow.c_id, [1, 2, 3])
+
+        result = self.graph.resolve(query)
+
+        assert_that(result, is_mapping({
+            1: has_attrs(body="Nice"),
+            2: is_instance(g.Object),
+        }))
+
+
+def test_when_type_is_object_then_typename_field_is_resolved():
+    Base = sqlalchemy.ext.declarative.declarative_base()
+
+    class BookRow(Base):
+        __tablename__ = "book"
+
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+    Base.metadata.create_all(engine)
+
+    session = sqlalchemy.orm.Session(engine)
+    session.add(BookRow(c_title="Leave it to Psmith"))
+    session.commit()
+
+    Book = g.ObjectType(
+        "Book",
+        fields=lambda: [
+            g.field("title", type=g.String),
+        ],
+    )
+
+    book_resolver = gsql.sql_table_resolver(
+        Book,
+        BookRow,
+        fields={
+            Book.fields.title: gsql.expression(BookRow.c_title),
+        },
+    )
+
+    resolvers = [book_resolver]
+
+    query = gsql.select(g.ListType(Book)(
+        g.key("title", Book.fields.title()),
+        g.key("type", schema.typename_field()),
     ))
     graph_definition = g.define_graph(resolvers)
     graph = graph_definition.create_graph({
@@ -2339,6 +3398,2423 @@ def test_connection_uses_primary_key_to_order_objects():
     ))
 
 
+def test_fused_connection_fetches_cursors_and_nodes_in_single_statement():
+    Base = sqlalchemy.ext.declarative.declarative_base()
+
+    class BookRow(Base):
+        __tablename__ = "book"
+
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+    Base.metadata.create_all(engine)
+
+    session = sqlalchemy.orm.Session(engine)
+    session.add(BookRow(c_title="Leave it to Psmith"))
+    session.add(BookRow(c_title="The Gentleman's Guide to Vice and Virtue"))
+    session.add(BookRow(c_title="Catch-22"))
+    session.commit()
+
+    statements = []
+
+    @sqlalchemy.event.listens_for(engine, "before_cursor_execute")
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    Book = g.ObjectType(
+        "Book",
+        fields=lambda: [
+            g.field("id", type=g.Int),
+            g.field("title", type=g.String),
+        ],
+    )
+
+    book_resolver = gsql.sql_table_resolver(
+        Book,
+        BookRow,
+        fields={
+            Book.fields.id: gsql.expression(BookRow.c_id),
+            Book.fields.title: gsql.expression(BookRow.c_title),
+        },
+    )
+
+    books_connection = gsql.forward_connection(
+        connection_type_name="BooksConnection",
+        node_type=Book,
+        key=BookRow.c_id,
+        fused=True,
+    )
+    BooksConnection = books_connection.Connection
+    BookEdge = books_connection.Edge
+    PageInfo = graphlayer.connections.PageInfo
+
+    Query = g.ObjectType(
+        "Query",
+        fields=lambda: (
+            books_connection.field("books_connection"),
+        ),
+    )
+
+    resolve_query = g.root_object_resolver(Query)
+
+    @resolve_query.field(Query.fields.books_connection)
+    def resolve_query_field_books_connection(graph, query, args):
+        return graph.resolve(books_connection.select_field(query, args=args))
+
+    resolvers = (book_resolver, books_connection.resolvers, resolve_query)
+    graph_definition = g.define_graph(resolvers)
+    graph = graph_definition.create_graph({
+        sqlalchemy.orm.Session: session,
+    })
+
+    def fetch(*, after):
+        return graph.resolve(
+            Query(
+                g.key("books", Query.fields.books_connection(
+                    Query.fields.books_connection.params.first(2),
+                    Query.fields.books_connection.params.after(after),
+
+                    g.key("edges", BooksConnection.fields.edges(
+                        g.key("node", BookEdge.fields.node(
+                            g.key("id", Book.fields.id()),
+                        )),
+                    )),
+                    g.key("nodes", BooksConnection.fields.nodes(
+                        g.key("title", Book.fields.title()),
+                    )),
+                    g.key("page_info", BooksConnection.fields.page_info(
+                        g.key("end_cursor", PageInfo.fields.end_cursor()),
+                        g.key("has_next_page", PageInfo.fields.has_next_page()),
+                    )),
+                )),
+            )
+        )
+
+    result = fetch(after=None)
+
+    assert_that(result.books, has_attrs(
+        edges=contains_exactly(
+            has_attrs(node=has_attrs(id=1)),
+            has_attrs(node=has_attrs(id=2)),
+        ),
+        nodes=contains_exactly(
+            has_attrs(title="Leave it to Psmith"),
+            has_attrs(title="The Gentleman's Guide to Vice and Virtue"),
+        ),
+        page_info=has_attrs(has_next_page=True),
+    ))
+    assert_that(len(statements), equal_to(1))
+
+    result = fetch(after=result.books.page_info.end_cursor)
+
+    assert_that(result.books, has_attrs(
+        edges=contains_exactly(
+            has_attrs(node=has_attrs(id=3)),
+        ),
+        nodes=contains_exactly(
+            has_attrs(title="Catch-22"),
+        ),
+        page_info=has_attrs(has_next_page=False),
+    ))
+    assert_that(len(statements), equal_to(2))
+
+
+def test_connection_can_use_multi_column_key_to_order_objects():
+    Base = sqlalchemy.ext.declarative.declarative_base()
+
+    class BookRow(Base):
+        __tablename__ = "book"
+
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_published_at = sqlalchemy.Column(sqlalchemy.DateTime, nullable=False)
+        c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+    Base.metadata.create_all(engine)
+
+    session = sqlalchemy.orm.Session(engine)
+    session.add(BookRow(c_id=1, c_published_at=datetime.datetime(1961, 11, 10), c_title="Catch-22"))
+    session.add(BookRow(c_id=2, c_published_at=datetime.datetime(1923, 6, 30), c_title="Leave it to Psmith"))
+    session.add(BookRow(c_id=3, c_published_at=datetime.datetime(1961, 11, 10), c_title="The Prime of Miss Jean Brodie"))
+    session.add(BookRow(c_id=4, c_published_at=datetime.datetime(1923, 6, 30), c_title="Whose Body?"))
+    session.commit()
+
+    Book = g.ObjectType(
+        "Book",
+        fields=lambda: [
+            g.field("title", type=g.String),
+        ],
+    )
+
+    book_resolver = gsql.sql_table_resolver(
+        Book,
+        BookRow,
+        fields={
+            Book.fields.title: gsql.expression(BookRow.c_title),
+        },
+    )
+
+    key = (BookRow.c_published_at, BookRow.c_id)
+
+    books_connection = gsql.forward_connection(
+        connection_type_name="BooksConnection",
+        node_type=Book,
+        key=key,
+        select_by_key=lambda query, keys: gsql.select(query).by(key, keys),
+    )
+    BooksConnection = books_connection.Connection
+    PageInfo = graphlayer.connections.PageInfo
+
+    Query = g.ObjectType(
+        "Query",
+        fields=lambda: (
+            books_connection.field("books_connection"),
+        ),
+    )
+
+    resolve_query = g.root_object_resolver(Query)
+
+    @resolve_query.field(Query.fields.books_connection)
+    def resolve_query_field_books_connection(graph, query, args):
+        return graph.resolve(books_connection.select_field(query, args=args))
+
+    resolvers = (book_resolver, books_connection.resolvers, resolve_query)
+    graph_definition = g.define_graph(resolvers)
+    graph = graph_definition.create_graph({
+        sqlalchemy.orm.Session: session,
+    })
+
+    def fetch(*, after):
+        return graph.resolve(
+            Query(
+                g.key("books", Query.fields.books_connection(
+                    Query.fields.books_connection.params.first(3),
+                    Query.fields.books_connection.params.after(after),
+
+                    g.key("nodes", BooksConnection.fields.nodes(
+                        g.key("title", Book.fields.title()),
+                    )),
+                    g.key("page_info", BooksConnection.fields.page_info(
+                        g.key("end_cursor", PageInfo.fields.end_cursor()),
+                        g.key("has_next_page", PageInfo.fields.has_next_page()),
+                    )),
+                )),
+            )
+        )
+
+    result = fetch(after=None)
+
+    assert_that(result.books, has_attrs(
+        nodes=contains_exactly(
+            has_attrs(title="Leave it to Psmith"),
+            has_attrs(title="Whose Body?"),
+            has_attrs(title="Catch-22"),
+        ),
+        page_info=has_attrs(has_next_page=True),
+    ))
+
+    result = fetch(after=result.books.page_info.end_cursor)
+
+    assert_that(result.books, has_attrs(
+        nodes=contains_exactly(
+            has_attrs(title="The Prime of Miss Jean Brodie"),
+        ),
+        page_info=has_attrs(has_next_page=False),
+    ))
+
+
+@pytest.mark.parametrize("fused", [False, True])
+def test_bidirectional_connection_can_page_backwards_using_key(fused):
+    Base = sqlalchemy.ext.declarative.declarative_base()
+
+    class BookRow(Base):
+        __tablename__ = "book"
+
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+    Base.metadata.create_all(engine)
+
+    session = sqlalchemy.orm.Session(engine)
+    session.add(BookRow(c_title="Leave it to Psmith"))
+    session.add(BookRow(c_title="The Gentleman's Guide to Vice and Virtue"))
+    session.add(BookRow(c_title="Catch-22"))
+    session.commit()
+
+    Book = g.ObjectType(
+        "Book",
+        fields=lambda: [
+            g.field("title", type=g.String),
+        ],
+    )
+
+    book_resolver = gsql.sql_table_resolver(
+        Book,
+        BookRow,
+        fields={
+            Book.fields.title: gsql.expression(BookRow.c_title),
+        },
+    )
+
+    books_connection = gsql.bidirectional_connection(
+        connection_type_name="BooksConnection",
+        node_type=Book,
+        key=BookRow.c_id,
+        select_by_key=lambda query, keys: gsql.select(query).by(BookRow.c_id, keys),
+        fused=fused,
+    )
+    BooksConnection = books_connection.Connection
+    PageInfo = graphlayer.connections.PageInfo
+
+    Query = g.ObjectType(
+        "Query",
+        fields=lambda: (
+            books_connection.field("books_connection"),
+        ),
+    )
+
+    resolve_query = g.root_object_resolver(Query)
+
+    @resolve_query.field(Query.fields.books_connection)
+    def resolve_query_field_books_connection(graph, query, args):
+        return graph.resolve(books_connection.select_field(query, args=args))
+
+    resolvers = (book_resolver, books_connection.resolvers, resolve_query)
+    graph_definition = g.define_graph(resolvers)
+    graph = graph_definition.create_graph({
+        sqlalchemy.orm.Session: session,
+    })
+
+    def fetch(*, before):
+        return graph.resolve(
+            Query(
+                g.key("books", Query.fields.books_connection(
+                    Query.fields.books_connection.params.last(2),
+                    Query.fields.books_connection.params.before(before),
+
+                    g.key("nodes", BooksConnection.fields.nodes(
+                        g.key("title", Book.fields.title()),
+                    )),
+                    g.key("page_info", BooksConnection.fields.page_info(
+                        g.key("start_cursor", PageInfo.fields.start_cursor()),
+                        g.key("has_previous_page", PageInfo.fields.has_previous_page()),
+                    )),
+                )),
+            )
+        )
+
+    result = fetch(before=None)
+
+    assert_that(result.books, has_attrs(
+        nodes=contains_exactly(
+            has_attrs(title="The Gentleman's Guide to Vice and Virtue"),
+            has_attrs(title="Catch-22"),
+        ),
+        page_info=has_attrs(has_previous_page=True),
+    ))
+
+    result = fetch(before=result.books.page_info.start_cursor)
+
+    assert_that(result.books, has_attrs(
+        nodes=contains_exactly(
+            has_attrs(title="Leave it to Psmith"),
+        ),
+        page_info=has_attrs(has_previous_page=False),
+    ))
+
+
+class TestConnectionTotalCount(object):
+    def create_graph(self, *, total_count, fused):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+        Base.metadata.create_all(engine)
+
+        session = sqlalchemy.orm.Session(engine)
+        session.add(BookRow(c_title="Leave it to Psmith"))
+        session.add(BookRow(c_title="The Gentleman's Guide to Vice and Virtue"))
+        session.add(BookRow(c_title="Catch-22"))
+        session.commit()
+
+        self.statements = []
+
+        @sqlalchemy.event.listens_for(engine, "before_cursor_execute")
+        def record_statement(conn, cursor, statement, parameters, context, executemany):
+            self.statements.append(statement)
+
+        Book = g.ObjectType(
+            "Book",
+            fields=lambda: [
+                g.field("title", type=g.String),
+            ],
+        )
+
+        book_resolver = gsql.sql_table_resolver(
+            Book,
+            BookRow,
+            fields={
+                Book.fields.title: gsql.expression(BookRow.c_title),
+            },
+        )
+
+        books_connection = gsql.forward_connection(
+            connection_type_name="BooksConnection",
+            node_type=Book,
+            key=BookRow.c_id,
+            select_by_key=lambda query, keys: gsql.select(query).by(BookRow.c_id, keys),
+            fused=fused,
+            total_count=total_count,
+        )
+        BooksConnection = books_connection.Connection
+        PageInfo = graphlayer.connections.PageInfo
+
+        Query = g.ObjectType(
+            "Query",
+            fields=lambda: (
+                books_connection.field("books_connection"),
+            ),
+        )
+
+        resolve_query = g.root_object_resolver(Query)
+
+        @resolve_query.field(Query.fields.books_connection)
+        def resolve_query_field_books_connection(graph, query, args):
+            return graph.resolve(books_connection.select_field(query, args=args))
+
+        resolvers = (book_resolver, books_connection.resolvers, resolve_query)
+        graph_definition = g.define_graph(resolvers)
+        graph = graph_definition.create_graph({
+            sqlalchemy.orm.Session: session,
+        })
+
+        def fetch(*, after, total_count=True):
+            field_queries = [
+                Query.fields.books_connection.params.first(1),
+                Query.fields.books_connection.params.after(after),
+
+                g.key("nodes", BooksConnection.fields.nodes(
+                    g.key("title", Book.fields.title()),
+                )),
+                g.key("page_info", BooksConnection.fields.page_info(
+                    g.key("end_cursor", PageInfo.fields.end_cursor()),
+                )),
+            ]
+            if total_count:
+                field_queries.append(g.key("total_count", BooksConnection.fields.total_count()))
+
+            return graph.resolve(Query(
+                g.key("books", Query.fields.books_connection(*field_queries)),
+            )).books
+
+        return fetch
+
+    @pytest.mark.parametrize("fused", [False, True])
+    @pytest.mark.parametrize("total_count, expected_total_count", [
+        (gsql.exact_total_count(), 3),
+        (gsql.window_total_count(), 3),
+        (gsql.capped_total_count(2), "2+"),
+        (gsql.capped_total_count(3), "3"),
+        (gsql.cached_total_count(gsql.exact_total_count(), ttl=60), 3),
+    ])
+    def test_total_count_is_total_number_of_edges_regardless_of_page(self, total_count, expected_total_count, fused):
+        fetch = self.create_graph(total_count=total_count, fused=fused)
+
+        result = fetch(after=None)
+        assert_that(result, has_attrs(
+            nodes=contains_exactly(has_attrs(title="Leave it to Psmith")),
+            total_count=expected_total_count,
+        ))
+
+        result = fetch(after=result.page_info.end_cursor)
+        assert_that(result, has_attrs(
+            nodes=contains_exactly(has_attrs(title="The Gentleman's Guide to Vice and Virtue")),
+            total_count=expected_total_count,
+        ))
+
+    def test_total_count_is_not_computed_when_not_selected(self):
+        fetch = self.create_graph(total_count=gsql.exact_total_count(), fused=True)
+
+        fetch(after=None, total_count=False)
+
+        assert_that(self.statements, contains_exactly(is_instance(str)))
+
+    def test_window_total_count_is_computed_in_page_statement(self):
+        fetch = self.create_graph(total_count=gsql.window_total_count(), fused=True)
+
+        result = fetch(after=None)
+
+        assert_that(result, has_attrs(total_count=3))
+        assert_that(self.statements, contains_exactly(is_instance(str)))
+
+
+    def test_when_cached_window_total_count_is_fresh_then_page_statement_does_not_compute_count(self):
+        fetch = self.create_graph(total_count=gsql.cached_total_count(gsql.window_total_count(), ttl=60), fused=True)
+
+        result = fetch(after=None)
+        assert_that(self.statements, contains_exactly(contains_string("OVER")))
+
+        self.statements.clear()
+        result = fetch(after=None)
+
+        assert_that(result, has_attrs(total_count=3))
+        assert_that(self.statements, contains_exactly(not_(contains_string("OVER"))))
+
+class TestMutate(object):
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class AuthorRow(Base):
+            __tablename__ = "author"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+            c_author_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(AuthorRow.c_id))
+
+        self.BookRow = BookRow
+        self.Base = Base
+
+        self.Book = Book = g.ObjectType(
+            "Book",
+            fields=lambda: [
+                g.field("author", type=Author),
+                g.field("id", type=g.Int),
+                g.field("title", type=g.String),
+            ],
+        )
+
+        self.Author = Author = g.ObjectType(
+            "Author",
+            fields=lambda: [
+                g.field("name", type=g.String),
+            ],
+        )
+
+        book_resolver = gsql.sql_table_resolver(
+            Book,
+            BookRow,
+            fields={
+                Book.fields.author: lambda graph, field_query: gsql.join(
+                    key=BookRow.c_author_id,
+                    resolve=lambda author_ids: graph.resolve(
+                        gsql.select(field_query.type_query).by(AuthorRow.c_id, author_ids),
+                    ),
+                ),
+                Book.fields.id: gsql.expression(BookRow.c_id),
+                Book.fields.title: gsql.expression(BookRow.c_title),
+            },
+        )
+
+        author_resolver = gsql.sql_table_resolver(
+            Author,
+            AuthorRow,
+            fields={
+                Author.fields.name: gsql.expression(AuthorRow.c_name),
+            },
+        )
+
+        self.graph_definition = g.define_graph([book_resolver, author_resolver])
+        self.AuthorRow = AuthorRow
+
+    def test_selected_fields_of_inserted_rows_are_returned_from_write_statement(self):
+        engine = _create_returning_sqlite_engine()
+        self.Base.metadata.create_all(engine)
+        session = sqlalchemy.orm.Session(engine)
+        session.add(self.AuthorRow(c_id=1, c_name="PG Wodehouse"))
+        session.commit()
+
+        Author = self.Author
+        Book = self.Book
+        BookRow = self.BookRow
+
+        query = gsql.mutate(
+            sqlalchemy.insert(BookRow).values([
+                {"c_title": "Leave it to Psmith", "c_author_id": 1},
+                {"c_title": "Right Ho, Jeeves", "c_author_id": 1},
+            ]),
+            g.ListType(Book)(
+                g.key("id", Book.fields.id()),
+                g.key("title", Book.fields.title()),
+                g.key("author", Book.fields.author(
+                    g.key("name", Author.fields.name()),
+                )),
+            ),
+        )
+
+        graph = self.graph_definition.create_graph({sqlalchemy.orm.Session: session})
+
+        with gsql.record_statements() as statements:
+            result = graph.resolve(query)
+
+        assert_that(result, contains_exactly(
+            has_attrs(id=1, title="Leave it to Psmith", author=has_attrs(name="PG Wodehouse")),
+            has_attrs(id=2, title="Right Ho, Jeeves", author=has_attrs(name="PG Wodehouse")),
+        ))
+        assert_that(statements, contains_exactly(
+            has_attrs(type=Book, sql=contains_string("RETURNING book.c_id, book.c_title, book.c_author_id")),
+            has_attrs(type=Author, path=("author", )),
+        ))
+
+    def test_updated_rows_can_be_indexed_by_key(self):
+        engine = _create_returning_sqlite_engine()
+        self.Base.metadata.create_all(engine)
+        session = sqlalchemy.orm.Session(engine)
+        session.add(self.BookRow(c_id=1, c_title="Leave it to Psmith"))
+        session.add(self.BookRow(c_id=2, c_title="Right Ho, Jeeves"))
+        session.commit()
+
+        Book = self.Book
+        BookRow = self.BookRow
+
+        query = gsql.mutate(
+            sqlalchemy.update(BookRow).where(BookRow.c_id == 2).values(c_title="Right Ho, Jeeves!"),
+            Book(
+                g.key("title", Book.fields.title()),
+            ),
+        ).index_by(BookRow.c_id)
+
+        graph = self.graph_definition.create_graph({sqlalchemy.orm.Session: session})
+        result = graph.resolve(query)
+
+        assert_that(result, is_mapping({
+            2: has_attrs(title="Right Ho, Jeeves!"),
+        }))
+
+    def test_when_mutation_has_where_clause_then_error_is_raised_without_writing(self):
+        engine = _create_returning_sqlite_engine()
+        self.Base.metadata.create_all(engine)
+        session = sqlalchemy.orm.Session(engine)
+        session.add(self.BookRow(c_id=1, c_title="Leave it to Psmith"))
+        session.add(self.BookRow(c_id=2, c_title="Right Ho, Jeeves"))
+        session.commit()
+
+        Book = self.Book
+        BookRow = self.BookRow
+
+        query = gsql.mutate(
+            sqlalchemy.update(BookRow).values(c_title="Updated"),
+            Book(
+                g.key("title", Book.fields.title()),
+            ),
+        ).where(BookRow.c_id == 1)
+
+        graph = self.graph_definition.create_graph({sqlalchemy.orm.Session: session})
+        error = pytest.raises(g.GraphError, lambda: graph.resolve(query))
+
+        assert_that(str(error.value), starts_with("mutations can only be indexed"))
+        assert_that(
+            session.execute(sqlalchemy.select(BookRow.c_title).order_by(BookRow.c_id)).scalars().all(),
+            contains_exactly("Leave it to Psmith", "Right Ho, Jeeves"),
+        )
+
+    def test_when_dialect_does_not_support_returning_then_error_is_raised(self):
+        engine = sqlalchemy.create_engine("sqlite:///:memory:")
+        self.Base.metadata.create_all(engine)
+        session = sqlalchemy.orm.Session(engine)
+
+        Book = self.Book
+
+        query = gsql.mutate(
+            sqlalchemy.insert(self.BookRow).values(c_title="Leave it to Psmith"),
+            Book(
+                g.key("title", Book.fields.title()),
+            ),
+        )
+
+        graph = self.graph_definition.create_graph({sqlalchemy.orm.Session: session})
+        error = pytest.raises(g.GraphError, lambda: graph.resolve(query))
+
+        assert_that(str(error.value), equal_to("mutations require a dialect that supports RETURNING"))
+
+
+class TestBulkMutations(object):
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        self.Base = Base
+        self.BookRow = BookRow
+
+        self.BookInput = g.InputObjectType(
+            "BookInput",
+            fields=lambda: [
+                g.input_field("id", type=g.Int),
+                g.input_field("title", type=g.String),
+            ],
+        )
+
+    def create_session(self, engine):
+        self.Base.metadata.create_all(engine)
+        return sqlalchemy.orm.Session(engine)
+
+    def read_titles(self, session):
+        return session.execute(
+            sqlalchemy.select(self.BookRow.c_id, self.BookRow.c_title).order_by(self.BookRow.c_id),
+        ).all()
+
+    def test_when_keys_are_generated_and_dialect_does_not_support_returning_then_bulk_insert_raises_error(self):
+        session = self.create_session(sqlalchemy.create_engine("sqlite:///:memory:"))
+        BookInput = self.BookInput
+        BookRow = self.BookRow
+
+        error = pytest.raises(ValueError, lambda: gsql.bulk_insert(
+            session,
+            BookRow,
+            [BookInput(id=0, title="Leave it to Psmith"), BookInput(id=0, title="Right Ho, Jeeves")],
+            columns={BookInput.fields.title: BookRow.c_title},
+            key=BookRow.c_id,
+        ))
+
+        assert_that(str(error.value), equal_to("bulk inserts require key columns mapped from input fields or a dialect that supports RETURNING"))
+        assert_that(self.read_titles(session), contains_exactly())
+
+    def test_bulk_insert_with_mapped_keys_executes_one_statement_per_chunk(self):
+        session = self.create_session(sqlalchemy.create_engine("sqlite:///:memory:"))
+        BookInput = self.BookInput
+        BookRow = self.BookRow
+
+        with gsql.record_statements() as statements:
+            keys = gsql.bulk_insert(
+                session,
+                BookRow,
+                [BookInput(id=index, title="Book {}".format(index)) for index in range(1, 6)],
+                columns={BookInput.fields.id: BookRow.c_id, BookInput.fields.title: BookRow.c_title},
+                key=BookRow.c_id,
+                chunk_size=2,
+            )
+
+        assert_that(keys, contains_exactly(1, 2, 3, 4, 5))
+        assert_that(statements, contains_exactly(
+            has_attrs(row_count=2),
+            has_attrs(row_count=2),
+            has_attrs(row_count=1),
+        ))
+        assert_that(self.read_titles(session), contains_exactly(
+            (1, "Book 1"),
+            (2, "Book 2"),
+            (3, "Book 3"),
+            (4, "Book 4"),
+            (5, "Book 5"),
+        ))
+
+    def test_bulk_insert_returns_generated_keys_from_multi_row_values_when_dialect_supports_returning(self):
+        session = self.create_session(_create_returning_sqlite_engine())
+        BookInput = self.BookInput
+        BookRow = self.BookRow
+
+        with gsql.record_statements() as statements:
+            keys = gsql.bulk_insert(
+                session,
+                BookRow,
+                [BookInput(id=0, title="Book {}".format(index)) for index in range(3)],
+                columns={BookInput.fields.title: BookRow.c_title},
+                key=BookRow.c_id,
+                chunk_size=2,
+            )
+
+        assert_that(keys, contains_exactly(1, 2, 3))
+        assert_that(statements, contains_exactly(
+            has_attrs(row_count=2),
+            has_attrs(row_count=1),
+        ))
+
+    def test_bulk_update_updates_rows_by_key(self):
+        session = self.create_session(sqlalchemy.create_engine("sqlite:///:memory:"))
+        session.add(self.BookRow(c_id=1, c_title="Leave it to Psmith"))
+        session.add(self.BookRow(c_id=2, c_title="Right Ho, Jeeves"))
+        session.add(self.BookRow(c_id=3, c_title="Pericles, Prince of Tyre"))
+        session.commit()
+        BookInput = self.BookInput
+        BookRow = self.BookRow
+
+        with gsql.record_statements() as statements:
+            keys = gsql.bulk_update(
+                session,
+                BookRow,
+                [BookInput(id=3, title="Pericles"), BookInput(id=1, title="Psmith")],
+                columns={BookInput.fields.id: BookRow.c_id, BookInput.fields.title: BookRow.c_title},
+                key=BookRow.c_id,
+            )
+
+        assert_that(keys, contains_exactly(3, 1))
+        assert_that(statements, contains_exactly(has_attrs(row_count=2)))
+        assert_that(self.read_titles(session), contains_exactly(
+            (1, "Psmith"),
+            (2, "Right Ho, Jeeves"),
+            (3, "Pericles"),
+        ))
+
+    def test_bulk_upsert_inserts_new_rows_and_updates_existing_rows(self):
+        session = self.create_session(sqlalchemy.create_engine("sqlite:///:memory:"))
+        session.add(self.BookRow(c_id=1, c_title="Leave it to Psmith"))
+        session.commit()
+        BookInput = self.BookInput
+        BookRow = self.BookRow
+
+        keys = gsql.bulk_upsert(
+            session,
+            BookRow,
+            [BookInput(id=1, title="Psmith"), BookInput(id=2, title="Right Ho, Jeeves")],
+            columns={BookInput.fields.id: BookRow.c_id, BookInput.fields.title: BookRow.c_title},
+            key=BookRow.c_id,
+        )
+
+        assert_that(keys, contains_exactly(1, 2))
+        assert_that(self.read_titles(session), contains_exactly(
+            (1, "Psmith"),
+            (2, "Right Ho, Jeeves"),
+        ))
+
+    def test_when_key_is_not_mapped_then_bulk_update_raises_error(self):
+        session = self.create_session(sqlalchemy.create_engine("sqlite:///:memory:"))
+        BookInput = self.BookInput
+        BookRow = self.BookRow
+
+        error = pytest.raises(ValueError, lambda: gsql.bulk_update(
+            session,
+            BookRow,
+            [BookInput(id=1, title="Psmith")],
+            columns={BookInput.fields.title: BookRow.c_title},
+            key=BookRow.c_id,
+        ))
+
+        assert_that(str(error.value), equal_to("key columns must be mapped from input fields"))
+
+
+class TestDeadlines(object):
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+        Base.metadata.create_all(engine)
+
+        session = sqlalchemy.orm.Session(engine)
+        session.add(BookRow(c_id=1, c_title="Leave it to Psmith"))
+        session.commit()
+
+        counter = sqlalchemy.select(sqlalchemy.literal(1).label("n")).cte("counter", recursive=True)
+        counter = counter.union_all(sqlalchemy.select(counter.c.n + 1).where(counter.c.n < 1000000000))
+        slow_count = sqlalchemy.select(sqlalchemy.func.count()).select_from(counter).scalar_subquery()
+
+        Book = g.ObjectType(
+            "Book",
+            fields=lambda: [
+                g.field("title", type=g.String),
+                g.field("slow_count", type=g.Int),
+            ],
+        )
+
+        book_resolver = gsql.sql_table_resolver(
+            Book,
+            BookRow,
+            fields={
+                Book.fields.title: gsql.expression(BookRow.c_title),
+                Book.fields.slow_count: gsql.expression(slow_count),
+            },
+        )
+
+        graph_definition = g.define_graph([book_resolver])
+        self.graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
+        self.Book = Book
+
+    def test_statements_within_deadline_are_executed(self):
+        Book = self.Book
+
+        with g.deadline(10):
+            result = self.graph.resolve(gsql.select(g.ListType(Book)(
+                g.key("title", Book.fields.title()),
+            )))
+
+        assert_that(result, contains_exactly(has_attrs(title="Leave it to Psmith")))
+
+    def test_when_deadline_passes_during_statement_then_statement_is_interrupted(self):
+        Book = self.Book
+        query = gsql.select(g.ListType(Book)(
+            g.key("slow_count", Book.fields.slow_count()),
+        ))
+
+        start = time.monotonic()
+        with g.deadline(0.05):
+            error = pytest.raises(g.DeadlineExceededError, lambda: self.graph.resolve(query))
+
+        assert_that(str(error.value), equal_to("deadline exceeded"))
+        assert_that(time.monotonic() - start < 5, equal_to(True))
+
+    def test_when_deadline_has_passed_then_statement_is_not_executed(self):
+        Book = self.Book
+        query = gsql.select(g.ListType(Book)(
+            g.key("title", Book.fields.title()),
+        ))
+        now = [0]
+
+        with gsql.record_statements() as statements:
+            with g.deadline(1, clock=lambda: now[0]):
+                now[0] = 2
+                pytest.raises(g.DeadlineExceededError, lambda: self.graph.resolve(query))
+
+        assert_that(statements, contains_exactly())
+
+
+def _create_returning_sqlite_engine():
+    # SQLite supports RETURNING from 3.35, but the SQLAlchemy 1.4 dialect
+    # does not compile it, so borrow the PostgreSQL implementation.
+    class ReturningSQLiteCompiler(sqlalchemy.dialects.sqlite.base.SQLiteCompiler):
+        returning_clause = sqlalchemy.dialects.postgresql.base.PGCompiler.returning_clause
+
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+    engine.dialect.statement_compiler = ReturningSQLiteCompiler
+    engine.dialect.full_returning = True
+    engine.dialect.implicit_returning = False
+    return engine
+
+
+class TestSessionRouter(object):
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.primary_engine = sqlalchemy.create_engine("sqlite:///:memory:")
+        self.replica_engines = [
+            sqlalchemy.create_engine("sqlite:///:memory:"),
+            sqlalchemy.create_engine("sqlite:///:memory:"),
+        ]
+
+    def create_router(self, **kwargs):
+        return gsql.SessionRouter(
+            primary=sqlalchemy.orm.sessionmaker(bind=self.primary_engine),
+            replicas=[
+                sqlalchemy.orm.sessionmaker(bind=replica_engine)
+                for replica_engine in self.replica_engines
+            ],
+            **kwargs
+        )
+
+    def test_mutations_use_primary(self):
+        router = self.create_router()
+
+        with router.session("mutation") as session:
+            assert_that(session.get_bind(), equal_to(self.primary_engine))
+
+    def test_round_robin_strategy_cycles_queries_through_replicas(self):
+        router = self.create_router(strategy="round_robin")
+
+        binds = []
+        for _ in range(3):
+            with router.session("query") as session:
+                binds.append(session.get_bind())
+
+        assert_that(binds, contains_exactly(
+            self.replica_engines[0],
+            self.replica_engines[1],
+            self.replica_engines[0],
+        ))
+
+    def test_least_loaded_strategy_uses_replica_with_fewest_open_sessions(self):
+        router = self.create_router(strategy="least_loaded")
+
+        with router.session("query") as first_session:
+            with router.session("query") as second_session:
+                assert_that(first_session.get_bind(), equal_to(self.replica_engines[0]))
+                assert_that(second_session.get_bind(), equal_to(self.replica_engines[1]))
+
+            with router.session("query") as third_session:
+                assert_that(third_session.get_bind(), equal_to(self.replica_engines[1]))
+
+    def test_queries_use_primary_during_read_your_writes_window_of_same_client(self):
+        now = [0]
+        router = self.create_router(read_your_writes=5, clock=lambda: now[0])
+
+        with router.session("mutation", client_key="alice"):
+            pass
+
+        now[0] = 4
+        with router.session("query", client_key="alice") as session:
+            assert_that(session.get_bind(), equal_to(self.primary_engine))
+
+        with router.session("query", client_key="bob") as session:
+            assert_that(session.get_bind(), equal_to(self.replica_engines[0]))
+
+        with router.session("query") as session:
+            assert_that(session.get_bind(), equal_to(self.replica_engines[1]))
+
+        now[0] = 5
+        with router.session("query", client_key="alice") as session:
+            assert_that(session.get_bind(), equal_to(self.replica_engines[0]))
+
+    def test_failed_mutations_do_not_start_read_your_writes_window(self):
+        router = self.create_router(read_your_writes=5, clock=lambda: 0)
+
+        def mutate():
+            with router.session("mutation", client_key="alice"):
+                raise g.GraphError("failed")
+
+        pytest.raises(g.GraphError, mutate)
+
+        with router.session("query", client_key="alice") as session:
+            assert_that(session.get_bind(), equal_to(self.replica_engines[0]))
+
+    def test_when_strategy_is_unknown_then_error_is_raised(self):
+        error = pytest.raises(ValueError, lambda: self.create_router(strategy="random"))
+
+        assert_that(str(error.value), equal_to("unknown strategy: random"))
+
+
+class TestStatementRecording(object):
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class LeftRow(Base):
+            __tablename__ = "left"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_value = sqlalchemy.Column(sqlalchemy.Unicode)
+
+        class RightRow(Base):
+            __tablename__ = "right"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_value = sqlalchemy.Column(sqlalchemy.Unicode)
+
+        engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+        Base.metadata.create_all(engine)
+
+        session = sqlalchemy.orm.Session(engine)
+        session.add(LeftRow(c_id=1, c_value="one"))
+        session.add(RightRow(c_id=1, c_value="two"))
+        session.add(LeftRow(c_id=2, c_value="three"))
+        session.commit()
+
+        Left = g.ObjectType(
+            "Left",
+            fields=lambda: [
+                g.field("value", type=g.String),
+                g.field("right", type=g.NullableType(Right)),
+            ],
+        )
+        Right = g.ObjectType(
+            "Right",
+            fields=lambda: [
+                g.field("value", type=g.String),
+            ],
+        )
+
+        left_resolver = gsql.sql_table_resolver(
+            Left,
+            LeftRow,
+            fields={
+                Left.fields.value: gsql.expression(LeftRow.c_value),
+                Left.fields.right: lambda graph, field_query: gsql.join(
+                    key=LeftRow.c_id,
+                    resolve=lambda ids: graph.resolve(
+                        gsql.select(field_query.type_query).by(RightRow.c_id, ids),
+                    ),
+                ),
+            },
+        )
+
+        right_resolver = gsql.sql_table_resolver(
+            Right,
+            RightRow,
+            fields={
+                Right.fields.value: gsql.expression(RightRow.c_value),
+            },
+        )
+
+        graph_definition = g.define_graph([left_resolver, right_resolver])
+        self.graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
+        self.query = gsql.select(g.ListType(Left)(
+            g.key("value", Left.fields.value()),
+            g.key("right", Left.fields.right(
+                g.key("value", Right.fields.value()),
+            )),
+        ))
+        self.Left = Left
+        self.Right = Right
+
+    def test_statements_are_recorded_with_type_and_path(self):
+        with gsql.record_statements() as statements:
+            self.graph.resolve(self.query)
+
+        assert_that(statements, contains_exactly(
+            has_attrs(
+                type=self.Left,
+                path=(),
+                row_count=2,
+                sql=is_instance(str),
+                parameters=equal_to({}),
+                duration=is_instance(float),
+            ),
+            has_attrs(
+                type=self.Right,
+                path=("right", ),
+                row_count=1,
+            ),
+        ))
+
+    def test_statements_are_not_recorded_outside_of_record_statements(self):
+        with gsql.record_statements() as statements:
+            pass
+
+        self.graph.resolve(self.query)
+
+        assert_that(statements, contains_exactly())
+
+    def test_assert_max_statements_passes_when_statement_count_is_within_budget(self):
+        with gsql.assert_max_statements(2):
+            self.graph.resolve(self.query)
+
+    def test_assert_max_statements_fails_when_statement_count_exceeds_budget(self):
+        def resolve():
+            with gsql.assert_max_statements(1):
+                self.graph.resolve(self.query)
+
+        error = pytest.raises(AssertionError, resolve)
+
+        assert_that(str(error.value), starts_with("expected at most 1 statements but 2 were executed:\nLeft : SELECT"))
+
+
+class TestNestedQueries(object):
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class PublisherRow(Base):
+            __tablename__ = "publisher"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        class AuthorRow(Base):
+            __tablename__ = "author"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+            c_published_at = sqlalchemy.Column(sqlalchemy.DateTime, nullable=False)
+            c_author_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(AuthorRow.c_id))
+            c_publisher_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(PublisherRow.c_id))
+
+        engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+        Base.metadata.create_all(engine)
+
+        session = sqlalchemy.orm.Session(engine)
+        session.add(PublisherRow(c_id=1, c_name="Herbert Jenkins"))
+        session.add(PublisherRow(c_id=2, c_name="Secker & Warburg"))
+        session.add(AuthorRow(c_id=1, c_name="PG Wodehouse"))
+        session.add(AuthorRow(c_id=2, c_name="Louis de Bernières"))
+        session.add(AuthorRow(c_id=3, c_name="William Shakespeare"))
+        session.add(BookRow(c_id=1, c_title="Leave it to Psmith", c_published_at=datetime.datetime(1923, 11, 30), c_author_id=1, c_publisher_id=1))
+        session.add(BookRow(c_id=2, c_title="Right Ho, Jeeves", c_published_at=datetime.datetime(1934, 10, 15), c_author_id=1, c_publisher_id=1))
+        session.add(BookRow(c_id=3, c_title="Captain Corelli's Mandolin", c_published_at=datetime.datetime(1994, 1, 1), c_author_id=2, c_publisher_id=2))
+
+        session.commit()
+
+        self.Author = Author = g.ObjectType(
+            "Author",
+            fields=lambda: [
+                g.field("books", type=g.ListType(Book)),
+                g.field("name", type=g.String),
+            ],
+        )
+
+        self.Book = Book = g.ObjectType(
+            "Book",
+            fields=lambda: [
+                g.field("published_at", type=g.String),
+                g.field("publisher", type=Publisher),
+                g.field("title", type=g.String),
+            ],
+        )
+
+        self.Publisher = Publisher = g.ObjectType(
+            "Publisher",
+            fields=lambda: [
+                g.field("name", type=g.String),
+            ],
+        )
+
+        author_resolver = gsql.sql_table_resolver(
+            Author,
+            AuthorRow,
+            fields={
+                Author.fields.books: lambda graph, field_query: gsql.join(
+                    key=AuthorRow.c_id,
+                    resolve=lambda author_ids: graph.resolve(
+                        gsql.select(field_query.type_query).by(BookRow.c_author_id, author_ids).order_by(BookRow.c_title.desc()),
+                    ),
+                ),
+                Author.fields.name: gsql.expression(AuthorRow.c_name),
+            },
+        )
+
+        book_resolver = gsql.sql_table_resolver(
+            Book,
+            BookRow,
+            fields={
+                Book.fields.published_at: gsql.expression(BookRow.c_published_at).map_value(lambda value: value.isoformat()),
+                Book.fields.publisher: lambda graph, field_query: gsql.join(
+                    key=BookRow.c_publisher_id,
+                    resolve=lambda publisher_ids: graph.resolve(
+                        gsql.select(field_query.type_query).by(PublisherRow.c_id, publisher_ids),
+                    ),
+                ),
+                Book.fields.title: gsql.expression(BookRow.c_title),
+            },
+        )
+
+        publisher_resolver = gsql.sql_table_resolver(
+            Publisher,
+            PublisherRow,
+            fields={
+                Publisher.fields.name: gsql.expression(PublisherRow.c_name),
+            },
+        )
+
+        self.graph_definition = graph_definition = g.define_graph([author_resolver, book_resolver, publisher_resolver])
+        self.graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
+        self.AuthorRow = AuthorRow
+
+    def test_nested_query_is_fetched_in_single_statement(self):
+        Author = self.Author
+        Book = self.Book
+        Publisher = self.Publisher
+
+        query = gsql.select(g.ListType(Author)(
+            g.key("name", Author.fields.name()),
+            g.key("books", Author.fields.books(
+                g.key("title", Book.fields.title()),
+                g.key("publishedAt", Book.fields.published_at()),
+                g.key("publisher", Book.fields.publisher(
+                    g.key("name", Publisher.fields.name()),
+                )),
+            )),
+        )).order_by(self.AuthorRow.c_id).nested()
+
+        with gsql.record_statements() as statements:
+            result = self.graph.resolve(query)
+
+        assert_that(result, contains_exactly(
+            has_attrs(
+                name="PG Wodehouse",
+                books=is_sequence(
+                    has_attrs(
+                        title="Right Ho, Jeeves",
+                        publishedAt="1934-10-15T00:00:00",
+                        publisher=has_attrs(name="Herbert Jenkins"),
+                    ),
+                    has_attrs(
+                        title="Leave it to Psmith",
+                        publishedAt="1923-11-30T00:00:00",
+                        publisher=has_attrs(name="Herbert Jenkins"),
+                    ),
+                ),
+            ),
+            has_attrs(
+                name="Louis de Bernières",
+                books=is_sequence(
+                    has_attrs(
+                        title="Captain Corelli's Mandolin",
+                        publishedAt="1994-01-01T00:00:00",
+                        publisher=has_attrs(name="Secker & Warburg"),
+                    ),
+                ),
+            ),
+            has_attrs(
+                name="William Shakespeare",
+                books=is_sequence(),
+            ),
+        ))
+        assert_that(statements, contains_exactly(has_attrs(type=Author)))
+
+    def test_nested_join_can_resolve_single_object(self):
+        Book = self.Book
+        Publisher = self.Publisher
+
+        query = gsql.select(g.ListType(Book)(
+            g.key("publisher", Book.fields.publisher(
+                g.key("name", Publisher.fields.name()),
+            )),
+        )).nested()
+
+        result = self.graph.resolve(query)
+
+        assert_that(result, contains_exactly(
+            has_attrs(publisher=has_attrs(name="Herbert Jenkins")),
+            has_attrs(publisher=has_attrs(name="Herbert Jenkins")),
+            has_attrs(publisher=has_attrs(name="Secker & Warburg")),
+        ))
+
+
+    def test_when_dialect_is_not_sqlite_then_nested_query_raises_error(self):
+        Author = self.Author
+        Book = self.Book
+
+        session = sqlalchemy.orm.Session(sqlalchemy.create_mock_engine("postgresql://", None))
+        graph = self.graph_definition.create_graph({sqlalchemy.orm.Session: session})
+
+        query = gsql.select(g.ListType(Author)(
+            g.key("books", Author.fields.books(
+                g.key("title", Book.fields.title()),
+            )),
+        )).nested()
+
+        error = pytest.raises(g.GraphError, lambda: graph.resolve(query))
+
+        assert_that(str(error.value), equal_to("nested queries are not supported by dialect: postgresql"))
+
+class TestIdentityMap(object):
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class AuthorRow(Base):
+            __tablename__ = "author"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+            c_author_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(AuthorRow.c_id))
+            c_editor_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(AuthorRow.c_id))
+
+        self.AuthorRow = AuthorRow
+
+        engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+        Base.metadata.create_all(engine)
+
+        self.session = session = sqlalchemy.orm.Session(engine)
+        session.add(AuthorRow(c_id=1, c_name="PG Wodehouse"))
+        session.add(AuthorRow(c_id=2, c_name="William Shakespeare"))
+        session.add(AuthorRow(c_id=3, c_name="Louis de Bernières"))
+        session.add(BookRow(c_id=1, c_title="Leave it to Psmith", c_author_id=1, c_editor_id=2))
+        session.add(BookRow(c_id=2, c_title="Pericles, Prince of Tyre", c_author_id=2, c_editor_id=3))
+
+        session.commit()
+
+        self.Book = Book = g.ObjectType(
+            "Book",
+            fields=lambda: [
+                g.field("author", type=Author),
+                g.field("editor", type=Author),
+                g.field("title", type=g.String),
+            ],
+        )
+
+        self.Author = Author = g.ObjectType(
+            "Author",
+            fields=lambda: [
+                g.field("name", type=g.String),
+            ],
+        )
+
+        def join_author(key):
+            return lambda graph, field_query: gsql.join(
+                key=key,
+                resolve=lambda author_ids: graph.resolve(
+                    gsql.select(field_query.type_query).by(AuthorRow.c_id, author_ids),
+                ),
+            )
+
+        book_resolver = gsql.sql_table_resolver(
+            Book,
+            BookRow,
+            fields={
+                Book.fields.author: join_author(BookRow.c_author_id),
+                Book.fields.editor: join_author(BookRow.c_editor_id),
+                Book.fields.title: gsql.expression(BookRow.c_title),
+            },
+        )
+
+        author_resolver = gsql.sql_table_resolver(
+            Author,
+            AuthorRow,
+            fields={
+                Author.fields.name: gsql.expression(AuthorRow.c_name),
+            },
+            identity_map=True,
+        )
+
+        self.graph_definition = g.define_graph([book_resolver, author_resolver])
+
+    def test_only_keys_missing_from_identity_map_are_fetched(self):
+        Author = self.Author
+        Book = self.Book
+
+        query = gsql.select(g.ListType(Book)(
+            g.key("title", Book.fields.title()),
+            g.key("author", Book.fields.author(
+                g.key("name", Author.fields.name()),
+            )),
+            g.key("editor", Book.fields.editor(
+                g.key("name", Author.fields.name()),
+            )),
+        ))
+
+        graph = self.graph_definition.create_graph({
+            sqlalchemy.orm.Session: self.session,
+            gsql.IdentityMap: gsql.IdentityMap(),
+        })
+
+        with gsql.record_statements() as statements:
+            result = graph.resolve(query)
+
+        assert_that(result, contains_exactly(
+            has_attrs(
+                title="Leave it to Psmith",
+                author=has_attrs(name="PG Wodehouse"),
+                editor=has_attrs(name="William Shakespeare"),
+            ),
+            has_attrs(
+                title="Pericles, Prince of Tyre",
+                author=has_attrs(name="William Shakespeare"),
+                editor=has_attrs(name="Louis de Bernières"),
+            ),
+        ))
+        assert_that(statements, contains_exactly(
+            has_attrs(type=Book),
+            has_attrs(type=Author, path=("author", )),
+            has_attrs(type=Author, path=("editor", ), parameters=is_mapping({"c_id_1": [3]})),
+        ))
+
+    def test_when_all_keys_are_in_identity_map_then_no_statement_is_executed(self):
+        Author = self.Author
+
+        graph = self.graph_definition.create_graph({
+            sqlalchemy.orm.Session: self.session,
+            gsql.IdentityMap: gsql.IdentityMap(),
+        })
+
+        def resolve_authors(author_ids):
+            return graph.resolve(gsql.select(Author(
+                g.key("name", Author.fields.name()),
+            )).by(self.AuthorRow.c_id, author_ids))
+
+        with gsql.record_statements() as statements:
+            first_result = resolve_authors([1, 2])
+            second_result = resolve_authors([2, 1])
+
+        assert_that(first_result, is_mapping({
+            1: has_attrs(name="PG Wodehouse"),
+            2: has_attrs(name="William Shakespeare"),
+        }))
+        assert_that(second_result, is_mapping({
+            1: has_attrs(name="PG Wodehouse"),
+            2: has_attrs(name="William Shakespeare"),
+        }))
+        assert_that(second_result[1] is first_result[1], equal_to(True))
+        assert_that(statements, contains_exactly(has_attrs(type=Author)))
+
+    def test_entries_are_separate_for_different_field_sets(self):
+        Author = self.Author
+
+        graph = self.graph_definition.create_graph({
+            sqlalchemy.orm.Session: self.session,
+            gsql.IdentityMap: gsql.IdentityMap(),
+        })
+
+        with gsql.record_statements() as statements:
+            graph.resolve(gsql.select(Author(
+                g.key("name", Author.fields.name()),
+            )).by(self.AuthorRow.c_id, [1]))
+            result = graph.resolve(gsql.select(Author(
+                g.key("authorName", Author.fields.name()),
+            )).by(self.AuthorRow.c_id, [1]))
+
+        assert_that(result, is_mapping({
+            1: has_attrs(authorName="PG Wodehouse"),
+        }))
+        assert_that(statements, contains_exactly(
+            has_attrs(type=Author),
+            has_attrs(type=Author),
+        ))
+
+
+class TestEntityCache(object):
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class AuthorRow(Base):
+            __tablename__ = "author"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+            c_year = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+            c_author_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(AuthorRow.c_id))
+
+            author = sqlalchemy.orm.relationship(AuthorRow)
+
+        engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+        Base.metadata.create_all(engine)
+
+        session = sqlalchemy.orm.Session(engine)
+        session.add(AuthorRow(c_id=1, c_name="PG Wodehouse"))
+        session.add(BookRow(c_id=1, c_title="Right Ho, Jeeves", c_year=1934, c_author_id=1))
+        session.add(BookRow(c_id=2, c_title="Leave it to Psmith", c_year=1923, c_author_id=1))
+        session.add(BookRow(c_id=3, c_title="Code of the Woosters", c_year=1938, c_author_id=1))
+        session.commit()
+
+        Author = g.ObjectType(
+            "Author",
+            fields=lambda: [
+                g.field("name", type=g.String),
+            ],
+        )
+
+        Book = g.ObjectType(
+            "Book",
+            fields=lambda: [
+                g.field("title", type=g.String),
+                g.field("year", type=g.Int),
+                g.field("author", type=Author),
+            ],
+        )
+
+        self.now = 0
+        self.entity_cache = EntityCache(ttl=60, clock=lambda: self.now)
+
+        book_resolver = gsql.sql_table_resolver(
+            Book,
+            BookRow,
+            fields={
+                Book.fields.title: gsql.expression(BookRow.c_title),
+                Book.fields.year: gsql.expression(BookRow.c_year),
+                Book.fields.author: gsql.relationship(BookRow.author),
+            },
+            entity_cache=self.entity_cache,
+            entity_id=BookRow.c_id,
+        )
+
+        author_resolver = gsql.sql_table_resolver(
+            Author,
+            AuthorRow,
+            fields={
+                Author.fields.name: gsql.expression(AuthorRow.c_name),
+            },
+        )
+
+        graph_definition = g.define_graph([book_resolver, author_resolver])
+        self.session = session
+        self.book_resolver = book_resolver
+        self.graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
+        self.Author = Author
+        self.AuthorRow = AuthorRow
+        self.Book = Book
+        self.BookRow = BookRow
+
+    def resolve_books(self, ids, *field_queries):
+        with gsql.record_statements() as statements:
+            result = self.graph.resolve(gsql.select(self.Book(*field_queries)).by(self.BookRow.c_id, ids))
+
+        return result, statements
+
+    def test_when_all_fields_of_entities_are_cached_then_no_statements_are_executed(self):
+        Book = self.Book
+
+        self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        result, statements = self.resolve_books([2, 1], g.key("heading", Book.fields.title()))
+
+        assert_that(result, is_mapping({
+            1: has_attrs(heading="Right Ho, Jeeves"),
+            2: has_attrs(heading="Leave it to Psmith"),
+        }))
+        assert_that(statements, contains_exactly())
+
+    def test_only_entities_and_fields_missing_from_cache_are_fetched(self):
+        Book = self.Book
+
+        self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        result, statements = self.resolve_books(
+            [1, 3],
+            g.key("title", Book.fields.title()),
+            g.key("year", Book.fields.year()),
+        )
+
+        assert_that(result, is_mapping({
+            1: has_attrs(title="Right Ho, Jeeves", year=1934),
+            3: has_attrs(title="Code of the Woosters", year=1938),
+        }))
+        assert_that(statements, contains_exactly(
+            has_attrs(sql=starts_with("SELECT book.c_year, book.c_id \nFROM book")),
+            has_attrs(sql=starts_with("SELECT book.c_title, book.c_year, book.c_id \nFROM book")),
+        ))
+
+    def test_fields_selecting_objects_are_always_fetched(self):
+        Author = self.Author
+        Book = self.Book
+
+        self.resolve_books([1], g.key("title", Book.fields.title()))
+        result, statements = self.resolve_books(
+            [1],
+            g.key("title", Book.fields.title()),
+            g.key("author", Book.fields.author(
+                g.key("name", Author.fields.name()),
+            )),
+        )
+
+        assert_that(result, is_mapping({
+            1: has_attrs(title="Right Ho, Jeeves", author=has_attrs(name="PG Wodehouse")),
+        }))
+        assert_that(statements, contains_exactly(
+            has_attrs(sql=starts_with("SELECT book.c_author_id, book.c_id \nFROM book")),
+            has_attrs(sql=starts_with("SELECT author.c_name")),
+        ))
+
+    def test_entities_that_do_not_exist_are_not_returned(self):
+        Book = self.Book
+
+        result, _ = self.resolve_books([1, 4], g.key("title", Book.fields.title()))
+
+        assert_that(result, is_mapping({
+            1: has_attrs(title="Right Ho, Jeeves"),
+        }))
+
+    def test_entities_are_fetched_again_after_invalidation_or_expiry(self):
+        Book = self.Book
+
+        self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        self.session.execute(sqlalchemy.update(self.BookRow).values(c_title="Updated"))
+
+        _, statements = self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        assert_that(statements, contains_exactly())
+
+        self.entity_cache.invalidate(Book, 1)
+        result, statements = self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        assert_that(result, is_mapping({
+            1: has_attrs(title="Updated"),
+            2: has_attrs(title="Leave it to Psmith"),
+        }))
+        assert_that(len(statements), equal_to(1))
+
+        self.now = 61
+        result, _ = self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        assert_that(result, is_mapping({
+            1: has_attrs(title="Updated"),
+            2: has_attrs(title="Updated"),
+        }))
+
+    def test_when_query_has_other_conditions_then_cache_is_not_used(self):
+        Book = self.Book
+
+        self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+
+        with gsql.record_statements() as statements:
+            result = self.graph.resolve(
+                gsql.select(Book(g.key("title", Book.fields.title())))
+                    .by(self.BookRow.c_id, [1, 2])
+                    .where(self.BookRow.c_year > 1930),
+            )
+
+        assert_that(result, is_mapping({1: has_attrs(title="Right Ho, Jeeves")}))
+        assert_that(len(statements), equal_to(1))
+
+    def test_when_changes_to_objects_are_committed_then_changed_entities_are_evicted(self):
+        Book = self.Book
+        gsql.invalidate_entity_cache_on_commit(self.session, self.entity_cache, [self.book_resolver])
+
+        self.resolve_books([1, 2, 3], g.key("title", Book.fields.title()))
+        self.session.get(self.BookRow, 1).c_title = "Updated"
+        self.session.delete(self.session.get(self.BookRow, 3))
+        self.session.flush()
+        self.session.commit()
+
+        result, statements = self.resolve_books([1, 2, 3], g.key("title", Book.fields.title()))
+        assert_that(result, is_mapping({
+            1: has_attrs(title="Updated"),
+            2: has_attrs(title="Leave it to Psmith"),
+        }))
+        assert_that(len(statements), equal_to(1))
+
+    def test_entities_changed_by_uncommitted_writes_of_session_bypass_cache(self):
+        Book = self.Book
+        gsql.invalidate_entity_cache_on_commit(self.session, self.entity_cache, [self.book_resolver])
+
+        self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        self.session.get(self.BookRow, 1).c_title = "Updated"
+        self.session.flush()
+
+        result, statements = self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        assert_that(result, is_mapping({
+            1: has_attrs(title="Updated"),
+            2: has_attrs(title="Leave it to Psmith"),
+        }))
+        assert_that(len(statements), equal_to(1))
+
+        self.session.get(self.BookRow, 2).c_title = "Also updated"
+        result, _ = self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        assert_that(result, is_mapping({
+            1: has_attrs(title="Updated"),
+            2: has_attrs(title="Also updated"),
+        }))
+
+        self.session.rollback()
+
+        result, _ = self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        assert_that(result, is_mapping({
+            1: has_attrs(title="Right Ho, Jeeves"),
+            2: has_attrs(title="Leave it to Psmith"),
+        }))
+
+    def test_when_update_statements_are_uncommitted_then_type_bypasses_cache(self):
+        Book = self.Book
+        gsql.invalidate_entity_cache_on_commit(self.session, self.entity_cache, [self.book_resolver])
+
+        self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        self.session.execute(sqlalchemy.update(self.BookRow).where(self.BookRow.c_id == 2).values(c_title="Updated"))
+
+        result, _ = self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        assert_that(result, is_mapping({
+            1: has_attrs(title="Right Ho, Jeeves"),
+            2: has_attrs(title="Updated"),
+        }))
+
+    def test_when_id_of_object_is_changed_then_entity_is_evicted_under_previous_id(self):
+        Book = self.Book
+        gsql.invalidate_entity_cache_on_commit(self.session, self.entity_cache, [self.book_resolver])
+
+        self.resolve_books([3], g.key("title", Book.fields.title()))
+        self.session.get(self.BookRow, 3).c_id = 4
+        self.session.commit()
+
+        result, _ = self.resolve_books([3, 4], g.key("title", Book.fields.title()))
+        assert_that(result, is_mapping({
+            4: has_attrs(title="Code of the Woosters"),
+        }))
+
+    def test_when_changes_are_rolled_back_then_changed_entities_are_evicted(self):
+        Book = self.Book
+        gsql.invalidate_entity_cache_on_commit(self.session, self.entity_cache, [self.book_resolver])
+
+        self.session.get(self.BookRow, 1).c_title = "Updated"
+        self.session.flush()
+        self.resolve_books([1], g.key("title", Book.fields.title()))
+        self.session.rollback()
+
+        result, _ = self.resolve_books([1], g.key("title", Book.fields.title()))
+        assert_that(result, is_mapping({
+            1: has_attrs(title="Right Ho, Jeeves"),
+        }))
+
+    def test_when_update_statements_are_committed_then_type_is_evicted(self):
+        Book = self.Book
+        gsql.invalidate_entity_cache_on_commit(self.session, self.entity_cache, [self.book_resolver])
+
+        self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        self.session.execute(sqlalchemy.update(self.BookRow).where(self.BookRow.c_id == 1).values(c_title="Updated"))
+        BookInput = g.InputObjectType(
+            "BookInput",
+            fields=lambda: [
+                g.input_field("id", type=g.Int),
+                g.input_field("title", type=g.String),
+            ],
+        )
+        gsql.bulk_update(
+            self.session,
+            self.BookRow,
+            [BookInput(id=2, title="Also updated")],
+            columns={BookInput.fields.id: self.BookRow.c_id, BookInput.fields.title: self.BookRow.c_title},
+            key=self.BookRow.c_id,
+        )
+        self.session.commit()
+
+        result, _ = self.resolve_books([1, 2], g.key("title", Book.fields.title()))
+        assert_that(result, is_mapping({
+            1: has_attrs(title="Updated"),
+            2: has_attrs(title="Also updated"),
+        }))
+
+
+    def test_when_resolver_does_not_use_entity_cache_then_error_is_raised(self):
+        author_resolver = gsql.sql_table_resolver(self.Author, self.AuthorRow, fields={})
+
+        error = pytest.raises(ValueError, lambda: gsql.invalidate_entity_cache_on_commit(self.session, self.entity_cache, [author_resolver]))
+
+        assert_that(str(error.value), equal_to("resolvers must be SQL table resolvers using the entity cache"))
+
+def test_pending_changes_in_session_are_flushed_before_statements_are_executed():
+    Base = sqlalchemy.ext.declarative.declarative_base()
+
+    class BookRow(Base):
+        __tablename__ = "book"
+
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+    Base.metadata.create_all(engine)
+
+    session = sqlalchemy.orm.Session(engine)
+    session.add(BookRow(c_id=1, c_title="Leave it to Psmith"))
+
+    Book = g.ObjectType(
+        "Book",
+        fields=lambda: [
+            g.field("title", type=g.String),
+        ],
+    )
+
+    book_resolver = gsql.sql_table_resolver(
+        Book,
+        BookRow,
+        fields={
+            Book.fields.title: gsql.expression(BookRow.c_title),
+        },
+    )
+
+    query = gsql.select(g.ListType(Book)(
+        g.key("title", Book.fields.title()),
+    ))
+
+    graph_definition = g.define_graph([book_resolver])
+    graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
+    result = graph.resolve(query)
+
+    assert_that(result, contains_exactly(
+        has_attrs(title="Leave it to Psmith"),
+    ))
+
+
+
+def test_statements_are_executed_using_binds_of_session_for_models():
+    Base = sqlalchemy.ext.declarative.declarative_base()
+
+    class AuthorRow(Base):
+        __tablename__ = "author"
+
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+    class BookRow(Base):
+        __tablename__ = "book"
+
+        c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+        c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+        c_author_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(AuthorRow.c_id))
+
+        author = sqlalchemy.orm.relationship(AuthorRow)
+
+    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+    Base.metadata.create_all(engine)
+
+    session = sqlalchemy.orm.Session(binds={AuthorRow: engine, BookRow: engine})
+    session.add(AuthorRow(c_id=1, c_name="PG Wodehouse"))
+    session.commit()
+
+    BookInput = g.InputObjectType(
+        "BookInput",
+        fields=lambda: [
+            g.input_field("id", type=g.Int),
+            g.input_field("title", type=g.String),
+        ],
+    )
+
+    gsql.bulk_insert(
+        session,
+        BookRow,
+        [BookInput(id=1, title="Leave it to Psmith")],
+        columns={BookInput.fields.id: BookRow.c_id, BookInput.fields.title: BookRow.c_title},
+        key=BookRow.c_id,
+    )
+    session.execute(sqlalchemy.update(BookRow).values(c_author_id=1))
+
+    Author = g.ObjectType(
+        "Author",
+        fields=lambda: [
+            g.field("name", type=g.String),
+        ],
+    )
+
+    Book = g.ObjectType(
+        "Book",
+        fields=lambda: [
+            g.field("author", type=Author),
+            g.field("title", type=g.String),
+        ],
+    )
+
+    book_resolver = gsql.sql_table_resolver(
+        Book,
+        BookRow,
+        fields={
+            Book.fields.author: gsql.relationship(BookRow.author),
+            Book.fields.title: gsql.expression(BookRow.c_title),
+        },
+    )
+
+    author_resolver = gsql.sql_table_resolver(
+        Author,
+        AuthorRow,
+        fields={
+            Author.fields.name: gsql.expression(AuthorRow.c_name),
+        },
+    )
+
+    query = gsql.select(g.ListType(Book)(
+        g.key("author", Book.fields.author(
+            g.key("name", Author.fields.name()),
+        )),
+        g.key("title", Book.fields.title()),
+    ))
+
+    graph_definition = g.define_graph([book_resolver, author_resolver])
+    graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
+    result = graph.resolve(query)
+
+    assert_that(result, contains_exactly(
+        has_attrs(author=has_attrs(name="PG Wodehouse"), title="Leave it to Psmith"),
+    ))
+
+class TestStreaming(object):
+    def test_objects_are_read_in_batches_with_joins_resolved_per_batch(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class AuthorRow(Base):
+            __tablename__ = "author"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+            c_author_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(AuthorRow.c_id))
+
+        engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+        Base.metadata.create_all(engine)
+
+        session = sqlalchemy.orm.Session(engine)
+        session.add(AuthorRow(c_id=1, c_name="PG Wodehouse"))
+        session.add(AuthorRow(c_id=2, c_name="William Shakespeare"))
+        session.add(AuthorRow(c_id=3, c_name="Louis de Bernières"))
+        session.add(BookRow(c_id=1, c_title="Leave it to Psmith", c_author_id=1))
+        session.add(BookRow(c_id=2, c_title="Right Ho, Jeeves", c_author_id=1))
+        session.add(BookRow(c_id=3, c_title="Pericles, Prince of Tyre", c_author_id=2))
+        session.add(BookRow(c_id=4, c_title="Captain Corelli's Mandolin", c_author_id=3))
+        session.add(BookRow(c_id=5, c_title="Birds Without Wings", c_author_id=3))
+
+        session.commit()
+
+        Book = g.ObjectType(
+            "Book",
+            fields=lambda: [
+                g.field("author", type=Author),
+                g.field("title", type=g.String),
+            ],
+        )
+
+        Author = g.ObjectType(
+            "Author",
+            fields=lambda: [
+                g.field("name", type=g.String),
+            ],
+        )
+
+        author_ids_by_batch = []
+
+        def resolve_author(graph, field_query):
+            def resolve(author_ids):
+                author_ids_by_batch.append(author_ids)
+                return graph.resolve(gsql.select(field_query.type_query).by(AuthorRow.c_id, author_ids))
+
+            return gsql.join(key=BookRow.c_author_id, resolve=resolve)
+
+        book_resolver = gsql.sql_table_resolver(
+            Book,
+            BookRow,
+            fields={
+                Book.fields.title: gsql.expression(BookRow.c_title),
+                Book.fields.author: resolve_author,
+            },
+        )
+
+        author_resolver = gsql.sql_table_resolver(
+            Author,
+            AuthorRow,
+            fields={
+                Author.fields.name: gsql.expression(AuthorRow.c_name),
+            },
+        )
+
+        query = gsql.select(g.ListType(Book)(
+            g.key("author", Book.fields.author(
+                g.key("name", Author.fields.name()),
+            )),
+            g.key("title", Book.fields.title()),
+        )).order_by(BookRow.c_id).stream(batch_size=2)
+
+        graph_definition = g.define_graph([book_resolver, author_resolver])
+        graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
+
+        with gsql.record_statements() as statements:
+            result = graph.resolve(query)
+            assert_that(author_ids_by_batch, contains_exactly())
+
+            books = list(result)
+
+        assert_that(books, contains_exactly(
+            has_attrs(author=has_attrs(name="PG Wodehouse"), title="Leave it to Psmith"),
+            has_attrs(author=has_attrs(name="PG Wodehouse"), title="Right Ho, Jeeves"),
+            has_attrs(author=has_attrs(name="William Shakespeare"), title="Pericles, Prince of Tyre"),
+            has_attrs(author=has_attrs(name="Louis de Bernières"), title="Captain Corelli's Mandolin"),
+            has_attrs(author=has_attrs(name="Louis de Bernières"), title="Birds Without Wings"),
+        ))
+        assert_that(author_ids_by_batch, contains_exactly([1], [2, 3], [3]))
+        assert_that(statements, contains_exactly(
+            has_attrs(type=Author, path=("author", )),
+            has_attrs(type=Author, path=("author", )),
+            has_attrs(type=Author, path=("author", )),
+            has_attrs(type=Book, path=(), row_count=5),
+        ))
+
+    def test_when_query_is_not_for_list_then_error_is_raised(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        engine = sqlalchemy.create_engine("sqlite:///:memory:")
+
+        Base.metadata.create_all(engine)
+
+        session = sqlalchemy.orm.Session(engine)
+
+        Book = g.ObjectType(
+            "Book",
+            fields=lambda: [
+                g.field("title", type=g.String),
+            ],
+        )
+
+        book_resolver = gsql.sql_table_resolver(
+            Book,
+            BookRow,
+            fields={
+                Book.fields.title: gsql.expression(BookRow.c_title),
+            },
+        )
+
+        query = gsql.select(Book(
+            g.key("title", Book.fields.title()),
+        )).stream(batch_size=2)
+
+        graph_definition = g.define_graph([book_resolver])
+        graph = graph_definition.create_graph({sqlalchemy.orm.Session: session})
+
+        error = pytest.raises(g.GraphError, lambda: graph.resolve(query))
+
+        assert_that(str(error.value), equal_to("only lists can be streamed"))
+
+
+class TestAsyncSqlTableResolver(object):
+    def test_can_resolve_joins_using_async_session(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class AuthorRow(Base):
+            __tablename__ = "author"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+            c_author_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(AuthorRow.c_id))
+
+        Book = g.ObjectType(
+            "Book",
+            fields=lambda: [
+                g.field("author", type=Author),
+                g.field("title", type=g.String),
+            ],
+        )
+
+        Author = g.ObjectType(
+            "Author",
+            fields=lambda: [
+                g.field("name", type=g.String),
+            ],
+        )
+
+        book_resolver = gsql.async_sql_table_resolver(
+            Book,
+            BookRow,
+            fields={
+                Book.fields.title: gsql.expression(BookRow.c_title),
+                Book.fields.author: lambda graph, field_query: gsql.join(
+                    key=BookRow.c_author_id,
+                    resolve=lambda author_ids: graph.resolve(
+                        gsql.select(field_query.type_query).by(AuthorRow.c_id, author_ids),
+                    ),
+                ),
+            },
+        )
+
+        author_resolver = gsql.async_sql_table_resolver(
+            Author,
+            AuthorRow,
+            fields={
+                Author.fields.name: gsql.expression(AuthorRow.c_name),
+            },
+        )
+
+        query = gsql.select(g.ListType(Book)(
+            g.key("author", Book.fields.author(
+                g.key("name", Author.fields.name()),
+            )),
+            g.key("title", Book.fields.title()),
+        ))
+
+        async def run():
+            engine = self._create_engine()
+
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+
+            async with sqlalchemy.ext.asyncio.AsyncSession(engine) as session:
+                session.add(AuthorRow(c_id=1, c_name="PG Wodehouse"))
+                session.add(AuthorRow(c_id=2, c_name="William Shakespeare"))
+                session.add(BookRow(c_id=1, c_title="Leave it to Psmith", c_author_id=1))
+                session.add(BookRow(c_id=2, c_title="Pericles, Prince of Tyre", c_author_id=2))
+                await session.commit()
+
+                graph_definition = g.define_graph([book_resolver, author_resolver])
+                graph = graph_definition.create_graph({sqlalchemy.ext.asyncio.AsyncSession: session})
+
+                with gsql.record_statements() as statements:
+                    result = await graph.resolve(query)
+
+            return result, statements
+
+        result, statements = asyncio.run(run())
+
+        assert_that(result, contains_exactly(
+            has_attrs(
+                author=has_attrs(name="PG Wodehouse"),
+                title="Leave it to Psmith",
+            ),
+            has_attrs(
+                author=has_attrs(name="William Shakespeare"),
+                title="Pericles, Prince of Tyre",
+            ),
+        ))
+        assert_that(statements, contains_exactly(
+            has_attrs(type=Book, path=()),
+            has_attrs(type=Author, path=("author", )),
+        ))
+
+    def test_can_resolve_joins_through_association_table_using_async_session(self):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class LeftRow(Base):
+            __tablename__ = "left"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_value = sqlalchemy.Column(sqlalchemy.Unicode)
+
+        class AssociationRow(Base):
+            __tablename__ = "association"
+
+            c_left_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_right_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+
+        class RightRow(Base):
+            __tablename__ = "right"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_value = sqlalchemy.Column(sqlalchemy.Unicode)
+
+        Left = g.ObjectType(
+            "Left",
+            fields=lambda: [
+                g.field("value", type=g.String),
+                g.field("rights", type=g.ListType(Right)),
+            ],
+        )
+        Right = g.ObjectType(
+            "Right",
+            fields=lambda: [
+                g.field("value", type=g.String),
+            ],
+        )
+
+        left_resolver = gsql.async_sql_table_resolver(
+            Left,
+            LeftRow,
+            fields={
+                Left.fields.value: gsql.expression(LeftRow.c_value),
+                Left.fields.rights: lambda graph, field_query: gsql.join(
+                    key=LeftRow.c_id,
+                    association=gsql.association(
+                        AssociationRow,
+                        left_key=AssociationRow.c_left_id,
+                        right_key=AssociationRow.c_right_id,
+                    ),
+                    resolve=lambda right_ids: graph.resolve(
+                        gsql.select(field_query.type_query).by(RightRow.c_id, right_ids),
+                    ),
+                ),
+            },
+        )
+
+        right_resolver = gsql.async_sql_table_resolver(
+            Right,
+            RightRow,
+            fields={
+                Right.fields.value: gsql.expression(RightRow.c_value),
+            },
+        )
+
+        query = gsql.select(g.ListType(Left)(
+            g.key("value", Left.fields.value()),
+            g.key("rights", Left.fields.rights(
+                g.key("value", Right.fields.value()),
+            )),
+        ))
+
+        async def run():
+            engine = self._create_engine()
+
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+
+            async with sqlalchemy.ext.asyncio.AsyncSession(engine) as session:
+                session.add(LeftRow(c_id=1, c_value="left 1"))
+                session.add(RightRow(c_id=101, c_value="right 1a"))
+                session.add(RightRow(c_id=102, c_value="right 1b"))
+                session.add(AssociationRow(c_left_id=1, c_right_id=101))
+                session.add(AssociationRow(c_left_id=1, c_right_id=102))
+                session.add(LeftRow(c_id=2, c_value="left 2"))
+                await session.commit()
+
+                graph_definition = g.define_graph([left_resolver, right_resolver])
+                graph = graph_definition.create_graph({sqlalchemy.ext.asyncio.AsyncSession: session})
+
+                return await graph.resolve(query)
+
+        result = asyncio.run(run())
+
+        assert_that(result, contains_exactly(
+            has_attrs(
+                value="left 1",
+                rights=contains_exactly(
+                    has_attrs(value="right 1a"),
+                    has_attrs(value="right 1b"),
+                ),
+            ),
+            has_attrs(
+                value="left 2",
+                rights=contains_exactly(),
+            ),
+        ))
+
+    @pytest.mark.parametrize("concurrent_reads, max_concurrent_statements", [(False, 1), (True, 2)])
+    def test_join_queries_run_concurrently_only_when_concurrent_reads_are_enabled(self, tmp_path, concurrent_reads, max_concurrent_statements):
+        Base = sqlalchemy.ext.declarative.declarative_base()
+
+        class AuthorRow(Base):
+            __tablename__ = "author"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        class PublisherRow(Base):
+            __tablename__ = "publisher"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_name = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+
+        class BookRow(Base):
+            __tablename__ = "book"
+
+            c_id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+            c_title = sqlalchemy.Column(sqlalchemy.Unicode, nullable=False)
+            c_author_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(AuthorRow.c_id))
+            c_publisher_id = sqlalchemy.Column(sqlalchemy.Integer, sqlalchemy.ForeignKey(PublisherRow.c_id))
+
+        Book = g.ObjectType(
+            "Book",
+            fields=lambda: [
+                g.field("author", type=Author),
+                g.field("publisher", type=Publisher),
+                g.field("title", type=g.String),
+            ],
+        )
+
+        Author = g.ObjectType(
+            "Author",
+            fields=lambda: [
+                g.field("name", type=g.String),
+            ],
+        )
+
+        Publisher = g.ObjectType(
+            "Publisher",
+            fields=lambda: [
+                g.field("name", type=g.String),
+            ],
+        )
+
+        book_resolver = gsql.async_sql_table_resolver(
+            Book,
+            BookRow,
+            fields={
+                Book.fields.title: gsql.expression(BookRow.c_title),
+                Book.fields.author: lambda graph, field_query: gsql.join(
+                    key=BookRow.c_author_id,
+                    resolve=lambda author_ids: graph.resolve(
+                        gsql.select(field_query.type_query).by(AuthorRow.c_id, author_ids),
+                    ),
+                ),
+                Book.fields.publisher: lambda graph, field_query: gsql.join(
+                    key=BookRow.c_publisher_id,
+                    resolve=lambda publisher_ids: graph.resolve(
+                        gsql.select(field_query.type_query).by(PublisherRow.c_id, publisher_ids),
+                    ),
+                ),
+            },
+            concurrent_reads=concurrent_reads,
+        )
+
+        author_resolver = gsql.async_sql_table_resolver(
+            Author,
+            AuthorRow,
+            fields={
+                Author.fields.name: gsql.expression(AuthorRow.c_name),
+            },
+            concurrent_reads=concurrent_reads,
+        )
+
+        publisher_resolver = gsql.async_sql_table_resolver(
+            Publisher,
+            PublisherRow,
+            fields={
+                Publisher.fields.name: gsql.expression(PublisherRow.c_name),
+            },
+            concurrent_reads=concurrent_reads,
+        )
+
+        query = gsql.select(g.ListType(Book)(
+            g.key("author", Book.fields.author(
+                g.key("name", Author.fields.name()),
+            )),
+            g.key("publisher", Book.fields.publisher(
+                g.key("name", Publisher.fields.name()),
+            )),
+            g.key("title", Book.fields.title()),
+        ))
+
+        running_statements = []
+        concurrent_statements = []
+
+        async def run():
+            engine = sqlalchemy.ext.asyncio.create_async_engine("sqlite+aiosqlite:///{}".format(tmp_path / "books.db"))
+
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+
+            @sqlalchemy.event.listens_for(engine.sync_engine, "before_cursor_execute")
+            def before_cursor_execute(*args):
+                running_statements.append(None)
+                concurrent_statements.append(len(running_statements))
+
+            @sqlalchemy.event.listens_for(engine.sync_engine, "after_cursor_execute")
+            def after_cursor_execute(*args):
+                running_statements.pop()
+
+            async with sqlalchemy.ext.asyncio.AsyncSession(engine) as session:
+                session.add(AuthorRow(c_id=1, c_name="PG Wodehouse"))
+                session.add(PublisherRow(c_id=1, c_name="Herbert Jenkins"))
+                session.add(BookRow(c_id=1, c_title="Leave it to Psmith", c_author_id=1, c_publisher_id=1))
+                await session.commit()
+                concurrent_statements.clear()
+
+                graph_definition = g.define_graph([book_resolver, author_resolver, publisher_resolver])
+                graph = graph_definition.create_graph({sqlalchemy.ext.asyncio.AsyncSession: session})
+
+                result = await graph.resolve(query)
+
+            await engine.dispose()
+
+            return result
+
+        result = asyncio.run(run())
+
+        assert_that(result, contains_exactly(
+            has_attrs(
+                author=has_attrs(name="PG Wodehouse"),
+                publisher=has_attrs(name="Herbert Jenkins"),
+                title="Leave it to Psmith",
+            ),
+        ))
+        assert_that(max(concurrent_statements), equal_to(max_concurrent_statements))
+
+    def _create_engine(self):
+        return sqlalchemy.ext.asyncio.create_async_engine(
+            "sqlite+aiosqlite:///:memory:",
+            poolclass=sqlalchemy.pool.StaticPool,
+        )
+
+
 def test_sql_query_type_str():
     Book = g.ObjectType(
         "Book",